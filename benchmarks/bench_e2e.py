@@ -0,0 +1,141 @@
+"""
+Benchmark `adbe all` end to end against the local Airtable simulator.
+
+Serves synthetic tables from airtable_db_export.simulator, with optional
+per-request latency and Airtable's per-base rate limit, and times the whole
+pipeline: schema map, download, create and load.
+
+    python benchmarks/bench_e2e.py --tables 4 --rows 2000 --latency 0.05 --jobs 4
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+import typing as t
+from pathlib import Path
+
+from click.testing import CliRunner
+
+from airtable_db_export.main import cli
+from airtable_db_export.simulator import AirtableSimulator, generate_records
+from synthetic import FIELD_TYPES
+
+BASE_ID = "appBenchmark00001"
+
+CHOICES = {"choices": [{"id": "selOptionA0000001", "name": "Option A"}]}
+
+# field options the schema endpoint needs for these types
+FIELD_OPTIONS: dict[str, dict[str, t.Any]] = {
+    "singleSelect": CHOICES,
+    "multipleSelects": CHOICES,
+    "multipleRecordLinks": {
+        "linkedTableId": "tbl00000000000000",
+        "isReversed": False,
+        "prefersSingleRecordLink": False,
+    },
+}
+
+# computed types that need a real result schema to describe
+SKIPPED_TYPES = ("singleRecordLink", "multipleLookupValues", "formula", "count")
+
+
+def make_base(tables: int, rows: int, width: int) -> dict[str, t.Any]:
+    """
+    A fixture base with <tables> tables of <rows> records and <width> fields.
+    """
+    base: dict[str, t.Any] = {"id": BASE_ID, "name": "Benchmark", "tables": []}
+    for n in range(tables):
+        types = [a for a in FIELD_TYPES if a not in SKIPPED_TYPES]
+        fields = [
+            {
+                "id": f"fld{n:04d}{i:010d}",
+                "name": f"Field {i}",
+                "type": types[i % len(types)],
+                "options": FIELD_OPTIONS.get(types[i % len(types)]),
+            }
+            for i in range(width)
+        ]
+        # the primary field must be a plain value
+        fields[0]["type"] = "singleLineText"
+        table = {
+            "id": f"tbl{n:014d}",
+            "name": f"Bench{n}",
+            "primaryFieldId": fields[0]["id"],
+            "fields": fields,
+            "views": [],
+        }
+        table["records"] = generate_records(table, rows)
+        base["tables"].append(table)
+    return base
+
+
+def run(
+    tables: int, rows: int, width: int, latency: float, rate_limit: float, jobs: int
+) -> dict[str, float]:
+    base = make_base(tables, rows, width)
+    server = AirtableSimulator({BASE_ID: base}, latency=latency, rate_limit=rate_limit)
+    server.start()
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            config = Path(tmp) / "config.yml"
+            config.write_text(
+                json.dumps(
+                    {
+                        "base_dir": tmp,
+                        "tables": [
+                            {"base": BASE_ID, "airtable": table["name"]}
+                            for table in base["tables"]
+                        ],
+                    }
+                )
+            )
+            os.environ["AIRTABLE_ENDPOINT_URL"] = server.url
+            os.environ.setdefault("AIRTABLE_API_KEY", "simulated")
+
+            start = time.perf_counter()
+            result = CliRunner().invoke(
+                cli, ["-c", str(config), "all", "-j", str(jobs)]
+            )
+            secs = time.perf_counter() - start
+            if result.exit_code:
+                raise SystemExit(f"{result.output}\n{result.exception!r}")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    return {
+        "seconds": secs,
+        "records_per_sec": tables * rows / secs,
+        "requests": server.stats["requests"],
+        "rate_limited": server.stats["rate_limited"],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tables", type=int, default=4)
+    parser.add_argument("--rows", type=int, default=2_000)
+    parser.add_argument("--width", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=5.0)
+    parser.add_argument("--jobs", type=int, default=1)
+    args = parser.parse_args()
+
+    result = run(
+        args.tables, args.rows, args.width, args.latency, args.rate_limit, args.jobs
+    )
+    print(
+        f"{args.tables} tables x {args.rows} rows x {args.width} fields, "
+        f"latency {args.latency}s, jobs {args.jobs}"
+    )
+    print(f"  wall time:    {result['seconds']:>10.2f} s")
+    print(f"  throughput:   {result['records_per_sec']:>10,.0f} records/sec")
+    print(f"  requests:     {result['requests']:>10}")
+    print(f"  rate limited: {result['rate_limited']:>10}")
+
+
+if __name__ == "__main__":
+    main()
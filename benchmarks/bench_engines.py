@@ -0,0 +1,118 @@
+"""
+Benchmark the sync (pyairtable) and async (aio) fetch engines.
+
+Serves many small synthetic tables, spread over several bases, from
+airtable_db_export.simulator with per-request latency and Airtable's per-base
+rate limit, and times downloading all of them with each engine at the same
+concurrency. Requires httpx for the async engine.
+
+    python benchmarks/bench_engines.py --bases 20 --tables 10 --latency 0.05 --jobs 20
+"""
+
+import argparse
+import tempfile
+import time
+import typing as t
+from pathlib import Path
+
+from pyairtable import Api
+
+from airtable_db_export import at, utils
+from airtable_db_export.main import _download_data
+from airtable_db_export.simulator import AirtableSimulator
+from bench_e2e import make_base
+
+
+def make_bases(
+    bases: int, tables: int, rows: int, width: int
+) -> dict[str, dict[str, t.Any]]:
+    """
+    <bases> fixture bases, each with <tables> tables of <rows> records.
+    """
+    fixtures: dict[str, dict[str, t.Any]] = {}
+    for n in range(bases):
+        base = make_base(tables, rows, width)
+        base["id"] = f"appBenchmark{n:05d}"
+        fixtures[base["id"]] = base
+    return fixtures
+
+
+def run(
+    engine: str,
+    bases: int,
+    tables: int,
+    rows: int,
+    width: int,
+    latency: float,
+    rate_limit: float,
+    jobs: int,
+) -> dict[str, float]:
+    fixtures = make_bases(bases, tables, rows, width)
+    server = AirtableSimulator(fixtures, latency=latency, rate_limit=rate_limit)
+    server.start()
+
+    try:
+        api = Api("simulated", endpoint_url=server.url)
+        conf = {
+            "tables": [
+                {"base": base_id, "airtable": table["name"], "table": f"{base_id}_{i}"}
+                for base_id, base in fixtures.items()
+                for i, table in enumerate(base["tables"])
+            ]
+        }
+        with tempfile.TemporaryDirectory() as tmp:
+            schemas_file = Path(tmp) / "schemas.json"
+            at.make_schema_json(api, conf, schemas_file, engine=engine)
+            server.stats.clear()
+
+            start = time.perf_counter()
+            _download_data(api, schemas_file, tmp, [utils.JSONWriter], jobs, engine)
+            secs = time.perf_counter() - start
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    return {
+        "seconds": secs,
+        "records_per_sec": bases * tables * rows / secs,
+        "requests": server.stats["requests"],
+        "rate_limited": server.stats["rate_limited"],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--bases", type=int, default=20)
+    parser.add_argument("--tables", type=int, default=10)
+    parser.add_argument("--rows", type=int, default=150)
+    parser.add_argument("--width", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--rate-limit", type=float, default=5.0)
+    parser.add_argument("--jobs", type=int, default=20)
+    parser.add_argument("--engine", dest="engines", action="append", choices=at.ENGINES)
+    args = parser.parse_args()
+
+    print(
+        f"{args.bases} bases x {args.tables} tables x {args.rows} rows x "
+        f"{args.width} fields, latency {args.latency}s, jobs {args.jobs}"
+    )
+    print(f"{'engine':<8}{'seconds':>10}{'records/sec':>14}{'requests':>10}")
+    for engine in args.engines or at.ENGINES:
+        result = run(
+            engine,
+            args.bases,
+            args.tables,
+            args.rows,
+            args.width,
+            args.latency,
+            args.rate_limit,
+            args.jobs,
+        )
+        print(
+            f"{engine:<8}{result['seconds']:>10.2f}"
+            f"{result['records_per_sec']:>14,.0f}{result['requests']:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
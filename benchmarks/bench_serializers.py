@@ -0,0 +1,104 @@
+"""
+Benchmark the JSON serializers and data file formats.
+
+Writes a synthetic table with every installed serializer (utils.SERIALIZERS)
+as indented JSON and as compact NDJSON, optionally compressed, and reports
+write throughput, file size, and the time DuckDB takes to load the file.
+
+    python benchmarks/bench_serializers.py --rows 100000 --width 32
+"""
+
+import argparse
+import tempfile
+import time
+import typing as t
+from pathlib import Path
+
+from airtable_db_export import at, db, utils
+from airtable_db_export.fake import FakeApi
+from run import pages
+from synthetic import make_records, make_schema
+
+FORMATS: tuple[str, ...] = ("json", "ndjson")
+
+
+def available_serializers() -> list[str]:
+    names: list[str] = []
+    for name in utils.SERIALIZERS:
+        try:
+            utils.get_serializer(name)
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+def run(
+    rows: list[dict],
+    schema: dict[str, t.Any],
+    serializer: str,
+    fmt: str,
+    compression: str | None,
+    tmp: Path,
+) -> dict[str, float]:
+    writer_cls = utils.WRITERS[fmt]
+    start = time.perf_counter()
+    with writer_cls(
+        tmp / schema["sqltable"], schema, compression, serializer=serializer
+    ) as writer:
+        for page in pages(rows):
+            writer.write(page)
+    write_secs = time.perf_counter() - start
+
+    db_file = tmp / "bench.duckdb"
+    db_file.unlink(missing_ok=True)
+    with db.dbconn(db_file) as conn:
+        conn.sql(db.make_table_create(schema))
+    start = time.perf_counter()
+    db.load_db(db_file, [schema], tmp, fmt, compression)
+    load_secs = time.perf_counter() - start
+
+    return {
+        "rows_per_sec": len(rows) / write_secs,
+        "mb": Path(writer.path).stat().st_size / 1e6,
+        "load_secs": load_secs,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--width", type=int, default=16)
+    parser.add_argument(
+        "--compression",
+        dest="compressions",
+        action="append",
+        choices=list(utils.COMPRESSIONS),
+        help="Also write compressed files (may be repeated).",
+    )
+    args = parser.parse_args()
+
+    schema = make_schema(args.width)
+    api = FakeApi()
+    api.add_table(schema, make_records(schema, args.rows))
+    rows = at.load_airtable(api, schema)
+
+    print(f"{args.rows} rows x {args.width} columns")
+    print(
+        f"{'serializer':<11}{'format':<8}{'compression':<13}"
+        f"{'rows/sec':>12}{'MB':>9}{'load secs':>11}"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        for serializer in available_serializers():
+            for fmt in FORMATS:
+                for compression in [None, *(args.compressions or [])]:
+                    result = run(rows, schema, serializer, fmt, compression, Path(tmp))
+                    print(
+                        f"{serializer:<11}{fmt:<8}{compression or '-':<13}"
+                        f"{result['rows_per_sec']:>12,.0f}{result['mb']:>9.1f}"
+                        f"{result['load_secs']:>11.2f}"
+                    )
+
+
+if __name__ == "__main__":
+    main()
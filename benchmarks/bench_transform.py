@@ -0,0 +1,81 @@
+"""
+Benchmark the record transform in at.iter_airtable.
+
+Compares the original per-cell loop (kept here as `transform_loop`) with the
+compiled converters from at.compile_transform on a wide synthetic table.
+
+    python benchmarks/bench_transform.py --rows 100000 --width 60
+"""
+
+import argparse
+import time
+import typing as t
+
+from airtable_db_export import at
+from synthetic import make_records, make_schema
+
+
+def transform_loop(
+    row: dict[str, t.Any],
+    col_map: dict[str, t.Any],
+    types_map: dict[str, str],
+) -> dict[str, t.Any]:
+    """
+    The transform loop as it was before compile_transform.
+    """
+    new_row: dict[str, t.Any] = {}
+    for field, col_spec in col_map.items():
+        sqlcol = col_spec["sqlcolumn"]
+        multi_id_field = "_ids" in sqlcol
+        sqltype = col_spec["sqltype"]
+
+        if sqlcol == "id":
+            new_row["id"] = row["id"]
+        else:
+            _value: t.Any = row["fields"].get(field, None)
+            if multi_id_field:
+                new_row[sqlcol] = _value
+            else:
+                if types_map[field] in at.LIST_TYPES and not sqltype.endswith("[]"):
+                    if type(_value) is list and len(_value):
+                        _value = _value[0]
+                if sqltype == "BOOLEAN":
+                    _value = _value == "TRUE"
+                new_row[sqlcol] = _value
+    return new_row
+
+
+def run(rows: int, width: int) -> dict[str, float]:
+    schema = make_schema(width)
+    records = make_records(schema, rows)
+
+    types_map = {c["field"]: c["type"] for c in schema["columns"]}
+    col_map = {c["field"]: c for c in schema["columns"]}
+    start = time.perf_counter()
+    before = [transform_loop(r, col_map, types_map) for r in records]
+    loop_secs = time.perf_counter() - start
+
+    start = time.perf_counter()
+    transform = at.compile_transform(schema)
+    after = [transform(r) for r in records]
+    compiled_secs = time.perf_counter() - start
+
+    assert before == after, "compiled transform does not match the original loop"
+    return {"loop": rows / loop_secs, "compiled": rows / compiled_secs}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--width", type=int, default=60)
+    args = parser.parse_args()
+
+    result = run(args.rows, args.width)
+    print(f"{args.rows} rows x {args.width} columns")
+    print(f"  loop:     {result['loop']:>12,.0f} rows/sec")
+    print(f"  compiled: {result['compiled']:>12,.0f} rows/sec")
+    print(f"  speedup:  {result['compiled'] / result['loop']:>12.2f}x")
+
+
+if __name__ == "__main__":
+    main()
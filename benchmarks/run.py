@@ -0,0 +1,190 @@
+"""
+Benchmark the transform, write, and load stages on synthetic data.
+
+Every stage runs offline against a fake pyairtable.Api. Each stage is timed
+(rows/sec), then run again under tracemalloc for its peak memory. Results can
+be saved as a baseline and later runs compared against it.
+
+    python benchmarks/run.py --rows 100000 --width 32 --save-baseline
+    python benchmarks/run.py --rows 100000 --width 32
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+import typing as t
+from pathlib import Path
+
+from airtable_db_export import at, db, utils
+from airtable_db_export.fake import FakeApi
+from synthetic import make_records, make_schema
+
+DEFAULT_BASELINE = Path(__file__).parent / "baseline.json"
+
+PAGE_SIZE = 100
+
+
+def pages(rows: list[dict], size: int = PAGE_SIZE) -> t.Iterator[list[dict]]:
+    for i in range(0, len(rows), size):
+        yield rows[i : i + size]
+
+
+def stage_transform(ctx: dict) -> None:
+    for _ in at.iter_airtable(ctx["api"], ctx["schema"]):
+        pass
+
+
+def make_stage_write(fmt: str) -> t.Callable[[dict], None]:
+    def stage_write(ctx: dict) -> None:
+        writer_cls = utils.WRITERS[fmt]
+        with writer_cls(ctx["tmp"] / f"write_{fmt}", ctx["schema"]) as writer:
+            for page in pages(ctx["rows"]):
+                writer.write(page)
+
+    return stage_write
+
+
+def make_stage_load(db_name: str) -> t.Callable[[dict], None]:
+    def stage_load(ctx: dict) -> None:
+        db_file = ctx["tmp"] / db_name
+        db_file.unlink(missing_ok=True)
+        sql_dir = ctx["tmp"] / "sql"
+        sql_dir.mkdir(exist_ok=True)
+        db.make_create_files([ctx["schema"]], sql_dir)
+        db.bootstrap_db(db_file, [ctx["schema"]], sql_dir)
+        db.load_db(db_file, [ctx["schema"]], ctx["tmp"])
+
+    return stage_load
+
+
+def available_stages() -> dict[str, t.Callable[[dict], None]]:
+    stages: dict[str, t.Callable[[dict], None]] = {"transform": stage_transform}
+    for fmt in utils.WRITERS:
+        if fmt == "parquet":
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                continue
+        stages[f"write_{fmt}"] = make_stage_write(fmt)
+    stages["load"] = make_stage_load("bench.duckdb")
+    stages["load_sqlite"] = make_stage_load("bench.sqlite")
+    return stages
+
+
+def measure(func: t.Callable[[dict], None], ctx: dict, memory: bool) -> dict:
+    start = time.perf_counter()
+    func(ctx)
+    secs = time.perf_counter() - start
+    result = {"seconds": secs, "rows_per_sec": ctx["row_count"] / secs}
+
+    if memory:
+        tracemalloc.start()
+        func(ctx)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result["peak_mb"] = peak / 2**20
+
+    return result
+
+
+def run(rows: int, width: int, stages: list[str], memory: bool = True) -> dict:
+    schema = make_schema(width)
+    records = make_records(schema, rows)
+    api = FakeApi()
+    api.add_table(schema, records)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ctx = {
+            "api": api,
+            "schema": schema,
+            "row_count": rows,
+            "rows": at.load_airtable(api, schema),
+            "tmp": Path(tmp),
+        }
+        # the load stage reads the JSON written by the write stage
+        utils.save_table_json(ctx["rows"], str(ctx["tmp"] / schema["sqltable"]))
+
+        all_stages = available_stages()
+        results = {
+            name: measure(all_stages[name], ctx, memory)
+            for name in stages
+            if name in all_stages
+        }
+
+    return {"params": {"rows": rows, "width": width}, "stages": results}
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    Stages whose throughput dropped more than <tolerance> below the baseline.
+    """
+    regressions: list[str] = []
+    for name, stage in result["stages"].items():
+        base = baseline.get("stages", {}).get(name)
+        if not base:
+            continue
+        ratio = stage["rows_per_sec"] / base["rows_per_sec"]
+        if ratio < 1 - tolerance:
+            regressions.append(f"{name}: {ratio:.0%} of baseline throughput")
+    return regressions
+
+
+def report(result: dict, baseline: dict | None) -> None:
+    params = result["params"]
+    print(f"{params['rows']} rows x {params['width']} columns")
+    print(f"{'stage':<14}{'rows/sec':>14}{'peak MB':>10}{'vs baseline':>14}")
+    for name, stage in result["stages"].items():
+        peak = f"{stage['peak_mb']:.1f}" if "peak_mb" in stage else "-"
+        base = (baseline or {}).get("stages", {}).get(name)
+        delta = (
+            f"{stage['rows_per_sec'] / base['rows_per_sec'] - 1:+.1%}" if base else "-"
+        )
+        print(f"{name:<14}{stage['rows_per_sec']:>14,.0f}{peak:>10}{delta:>14}")
+
+
+def main() -> int:
+    stages = list(available_stages())
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--width", type=int, default=32)
+    parser.add_argument("--stage", dest="stages", action="append", choices=stages)
+    parser.add_argument("--no-memory", action="store_true")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Allowed drop in rows/sec before a stage counts as a regression.",
+    )
+    args = parser.parse_args()
+
+    result = run(args.rows, args.width, args.stages or stages, not args.no_memory)
+
+    baseline = None
+    if args.baseline.exists() and not args.save_baseline:
+        baseline = json.loads(args.baseline.read_text())
+        if baseline.get("params") != result["params"]:
+            print(f"warning: baseline was recorded with {baseline.get('params')}")
+
+    report(result, baseline)
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(result, indent=2))
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+
+    if baseline and (regressions := compare(result, baseline, args.tolerance)):
+        print("Regressions:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
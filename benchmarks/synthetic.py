@@ -0,0 +1,92 @@
+"""
+Synthetic Airtable tables for the benchmarks, served by
+airtable_db_export.fake.FakeApi.
+"""
+
+import typing as t
+
+from airtable_db_export import at
+from airtable_db_export.at import ATYPES
+
+# a representative cell value for every Airtable field type
+VALUES: dict[str, t.Any] = {
+    ATYPES.SINGLE_LINE_TEXT: "some text",
+    ATYPES.MULTI_LINE_TEXT: "some text\nover a few\nlines",
+    ATYPES.RICH_TEXT: "**bold** and _italic_ text",
+    ATYPES.SINGLE_SELECT: "Option A",
+    ATYPES.MULTI_SELECT: ["Option A", "Option B"],
+    ATYPES.MULTI_RECORD_LINK: ["recAAAAAAAAAAAAAA", "recBBBBBBBBBBBBBB"],
+    ATYPES.SINGLE_RECORD_LINK: ["recCCCCCCCCCCCCCC"],
+    ATYPES.MULTI_LOOKUP: ["looked up", "values"],
+    ATYPES.CHECKBOX: "TRUE",
+    ATYPES.DATE_TIME: "2024-01-01T12:30:00.000Z",
+    ATYPES.CURRENCY: 12.5,
+    ATYPES.NUMBER: 42,
+    ATYPES.AUTO_NUMBER: 1001,
+    ATYPES.EMAIL: "someone@example.com",
+    ATYPES.FORMULA: ["computed"],
+    ATYPES.COUNT: 3,
+}
+
+FIELD_TYPES: list[str] = list(VALUES)
+
+
+def make_column(i: int, atype: str) -> dict[str, t.Any]:
+    """
+    A schemas.json column def for field <i>, following make_sql_schema's naming.
+    """
+    sqlcol = f"field_{i}"
+    sqltype = at.TYPEMAP.get(at.ATYPES.ATYPE(atype), "VARCHAR")
+    if atype == ATYPES.RICH_TEXT:
+        sqlcol = f"{sqlcol}_md"
+    elif atype == ATYPES.MULTI_RECORD_LINK:
+        sqlcol = at.make_id(sqlcol, pl=True)
+    elif atype == ATYPES.SINGLE_RECORD_LINK:
+        sqlcol = at.make_id(sqlcol)
+
+    return {
+        "field": f"Field {i}",
+        "type": atype,
+        "sqlcolumn": sqlcol,
+        "sqltype": sqltype,
+    }
+
+
+def make_schema(width: int, table: str = "bench") -> dict[str, t.Any]:
+    """
+    A table schema with <width> columns cycling through every field type.
+    """
+    columns = [
+        {
+            "field": None,
+            "type": None,
+            "sqlcolumn": "id",
+            "sqltype": "varchar",
+            "extra": "primary key",
+        }
+    ]
+    for i in range(width):
+        columns.append(make_column(i, FIELD_TYPES[i % len(FIELD_TYPES)]))
+
+    return {
+        "base": "appBenchmark00000",
+        "basename": "Benchmark",
+        "airtable": table,
+        "sqltable": table,
+        "columns": columns,
+    }
+
+
+def make_records(schema: dict[str, t.Any], rows: int) -> list[dict[str, t.Any]]:
+    """
+    <rows> Airtable records with a value in every field of <schema>.
+    """
+    fields = {c["field"]: VALUES[c["type"]] for c in schema["columns"] if c["field"]}
+    return [
+        {
+            "id": f"rec{i:014d}",
+            "createdTime": "2024-01-01T00:00:00.000Z",
+            "fields": dict(fields),
+        }
+        for i in range(rows)
+    ]
@@ -0,0 +1,408 @@
+"""
+asyncio fetch engine for the Airtable Web API.
+
+All requests share one pooled HTTP client with keep-alive connections, so the
+page chains of many tables can be in flight together instead of each table
+paying for its own serial round trips. Requests are still scheduled through
+the per-base RateLimiter used by the sync engine.
+
+Requires httpx (pip install airtable-db-export[async]).
+"""
+
+import asyncio
+import heapq
+import logging
+import threading
+import typing as t
+from pathlib import Path
+from urllib.parse import quote
+
+from pyairtable.models.schema import BaseSchema
+
+from airtable_db_export import at, ratelimit, utils
+
+if t.TYPE_CHECKING:
+    import httpx
+    from pyairtable import Api as ATApi
+
+
+logger = logging.getLogger(__name__)
+
+
+# Airtable's largest page size
+PAGE_SIZE: int = 100
+
+
+def _import_httpx() -> t.Any:
+    try:
+        import httpx
+    except ImportError as e:
+        raise ImportError(
+            "The async engine requires httpx: pip install airtable-db-export[async]"
+        ) from e
+    return httpx
+
+
+def list_records_body(options: dict[str, t.Any]) -> dict[str, t.Any]:
+    """
+    Convert pyairtable list-records options (as built by at.row_options and
+    at.projection_options) into a listRecords request body.
+    """
+    body: dict[str, t.Any] = {"pageSize": PAGE_SIZE}
+    if "view" in options:
+        body["view"] = options["view"]
+    if "formula" in options:
+        body["filterByFormula"] = options["formula"]
+    if "max_records" in options:
+        body["maxRecords"] = options["max_records"]
+    if "fields" in options:
+        body["fields"] = list(options["fields"])
+    if options.get("use_field_ids"):
+        body["returnFieldsByFieldId"] = True
+    if "sort" in options:
+        body["sort"] = [
+            (
+                {"field": field[1:], "direction": "desc"}
+                if field.startswith("-")
+                else {"field": field, "direction": "asc"}
+            )
+            for field in options["sort"]
+        ]
+    return body
+
+
+class AsyncAirtable:
+    """
+    Async Airtable client with one pooled, keep-alive HTTP connection pool.
+
+    max_connections: connections kept open to the API at once
+    limiter: per-base rate limiter, shared with the sync client if it was
+        created with from_api
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        endpoint_url: str = "https://api.airtable.com",
+        max_connections: int = 20,
+        limiter: ratelimit.RateLimiter | None = None,
+        max_attempts: int = 5,
+        timeout: float = 60.0,
+    ):
+        httpx = _import_httpx()
+        self.limiter: ratelimit.RateLimiter = limiter or ratelimit.RateLimiter()
+        self.max_attempts: int = max_attempts
+        self.client: "httpx.AsyncClient" = httpx.AsyncClient(
+            base_url=endpoint_url,
+            headers={"Authorization": f"Bearer {api_key}"},
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+            timeout=timeout,
+        )
+
+    @classmethod
+    def from_api(cls, api_client: "ATApi", **kwargs: t.Any) -> "AsyncAirtable":
+        """
+        Make an async client with the same key, endpoint and rate limiter as
+        a pyairtable client.
+        """
+        kwargs.setdefault("limiter", ratelimit.rate_limit(api_client))
+        return cls(api_client.api_key, api_client.endpoint_url, **kwargs)
+
+    async def __aenter__(self) -> "AsyncAirtable":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        json: dict[str, t.Any] | None = None,
+    ) -> dict[str, t.Any]:
+        """
+        Make one API request, waiting for a token from the base's bucket and
+        retrying 429 responses after backing off. Returns the JSON body.
+        """
+        base_id = ratelimit.base_id_for_url(path)
+        bucket = self.limiter.bucket(base_id) if base_id else None
+        for attempt in range(1, self.max_attempts + 1):
+            if bucket is not None:
+                await bucket.acquire_async()
+            response = await self.client.request(method, path, json=json)
+            if response.status_code != 429 or bucket is None:
+                break
+            if attempt == self.max_attempts:
+                logger.warning(
+                    f"Rate limited on base {base_id}, "
+                    f"giving up after {attempt} attempts"
+                )
+                break
+
+            retry_after = ratelimit.parse_retry_after(
+                response.headers.get("Retry-After")
+            )
+            logger.warning(
+                f"Rate limited on base {base_id}, backing off {retry_after}s"
+            )
+            bucket.penalize(retry_after)
+
+        response.raise_for_status()
+        if bucket is not None:
+            bucket.reward()
+        return response.json()
+
+    async def base_schema(self, base_id: str) -> dict[str, t.Any]:
+        """
+        The base's schema as returned by the metadata API.
+        """
+        return await self.request("GET", f"/v0/meta/bases/{base_id}/tables")
+
+    async def iter_pages(
+        self,
+        base_id: str,
+        table: str,
+        **options: t.Any,
+    ) -> t.AsyncIterator[t.List[dict[str, t.Any]]]:
+        """
+        Page through a table's records, following the offset chain. Takes the
+        same options as pyairtable's Table.iterate (see list_records_body).
+        """
+        path = f"/v0/{base_id}/{quote(table, safe='')}/listRecords"
+        body = list_records_body(options)
+        while True:
+            data = await self.request("POST", path, json=body)
+            yield data.get("records", [])
+            if not (offset := data.get("offset")):
+                return
+            body["offset"] = offset
+
+
+async def iter_sharded(
+    client: AsyncAirtable,
+    base_id: str,
+    table: str,
+    shards: int,
+    page_size: int = PAGE_SIZE,
+    **options: t.Any,
+) -> t.AsyncIterator[t.List[dict[str, t.Any]]]:
+    """
+    Page through a table as <shards> partitions at the same time (see
+    at.shard_formulas), yielding pages of raw records merged on createdTime,
+    like at.iter_sharded.
+
+    Each partition is fetched by its own task, a couple of pages ahead of the
+    merge.
+    """
+    queues: list[asyncio.Queue] = [asyncio.Queue(maxsize=2) for _ in range(shards)]
+
+    async def fetch(queue: asyncio.Queue, formula: str) -> None:
+        try:
+            shard_options = at._merge_options(options, {"formula": formula})
+            async for page in client.iter_pages(base_id, table, **shard_options):
+                await queue.put(page)
+            await queue.put(None)
+        except Exception as e:
+            # hand the error to the merge
+            await queue.put(e)
+
+    async def records(queue: asyncio.Queue) -> t.AsyncIterator[dict[str, t.Any]]:
+        while (page := await queue.get()) is not None:
+            if isinstance(page, Exception):
+                raise page
+            for record in page:
+                yield record
+
+    tasks = [
+        asyncio.create_task(fetch(queue, formula))
+        for queue, formula in zip(queues, at.shard_formulas(shards))
+    ]
+    try:
+        partitions = [records(queue) for queue in queues]
+        # (createdTime, partition, record): ties keep partition order, as in
+        # heapq.merge
+        heap: list[tuple[str, int, dict[str, t.Any]]] = []
+        for i, partition in enumerate(partitions):
+            if (record := await anext(partition, None)) is not None:
+                heap.append((record["createdTime"], i, record))
+        heapq.heapify(heap)
+
+        page: list[dict[str, t.Any]] = []
+        while heap:
+            _, i, record = heap[0]
+            page.append(record)
+            if (record := await anext(partitions[i], None)) is None:
+                heapq.heappop(heap)
+            else:
+                heapq.heapreplace(heap, (record["createdTime"], i, record))
+            if len(page) >= page_size:
+                yield page
+                page = []
+        if page:
+            yield page
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def iter_airtable(
+    client: AsyncAirtable,
+    schema: t.Dict[str, t.Any],
+    **options: t.Any,
+) -> t.AsyncIterator[t.List[dict[str, t.Any]]]:
+    """
+    Stream Airtable data one page at a time, like at.iter_airtable, including
+    fetching tables with "shards" set as that many partitions at once.
+    """
+    kwargs: dict[str, t.Any] = at._merge_options(
+        {**at.row_options(schema), **at.projection_options(schema)}, options
+    )
+    transform = at.compile_transform(schema)
+
+    shards: int = schema.get("shards", 1)
+    if shards > 1 and any(key in kwargs for key in at.UNSHARDABLE_OPTIONS):
+        logger.warning(
+            f"Table {schema['airtable']} sets one of {at.UNSHARDABLE_OPTIONS}, "
+            "fetching it without shards"
+        )
+        shards = 1
+    if shards > 1:
+        pages = iter_sharded(
+            client, schema["base"], schema["airtable"], shards, **kwargs
+        )
+    else:
+        pages = client.iter_pages(schema["base"], schema["airtable"], **kwargs)
+
+    async for page in pages:
+        yield [transform(row) for row in page]
+
+
+async def _load_tables(
+    client: AsyncAirtable,
+    schemas: t.List[t.Dict[str, t.Any]],
+) -> dict[str, t.List[dict[str, t.Any]]]:
+    async def load(schema: t.Dict[str, t.Any]) -> t.List[dict[str, t.Any]]:
+        return [row async for page in iter_airtable(client, schema) for row in page]
+
+    tables = await asyncio.gather(*(load(schema) for schema in schemas))
+    return {schema["sqltable"]: rows for schema, rows in zip(schemas, tables)}
+
+
+def load_tables(
+    api_client: "ATApi",
+    schemas: t.List[t.Dict[str, t.Any]],
+    max_connections: int = 20,
+) -> dict[str, t.List[dict[str, t.Any]]]:
+    """
+    Load every table in <schemas> at the same time, keyed by sqltable.
+    """
+
+    async def run() -> dict[str, t.List[dict[str, t.Any]]]:
+        async with AsyncAirtable.from_api(
+            api_client, max_connections=max_connections
+        ) as client:
+            return await _load_tables(client, schemas)
+
+    return asyncio.run(run())
+
+
+def download_tables(
+    api_client: "ATApi",
+    schemas: t.List[t.Dict[str, t.Any]],
+    data_dir: Path | str,
+    writer_classes: t.Sequence[type[utils.TableWriter]],
+    jobs: int = at.ENGINE_JOBS["async"],
+    cancelled: threading.Event | None = None,
+    on_done: t.Callable[[dict, BaseException | None], None] | None = None,
+    compression: str | None = None,
+) -> None:
+    """
+    Download the tables in <schemas>, <jobs> at a time over as many pooled
+    connections, and save each in <data_dir> with <writer_classes>, page by
+    page, compressed with <compression> if given.
+
+    on_done is called with each table's schema, and its error if it failed,
+    as soon as it finishes. If any table fails, or <cancelled> is set, the
+    other downloads stop and their partial output is discarded. on_done is
+    called once for every table, even those that never started, so a caller
+    waiting on it always hears back.
+    """
+    # ids of the schemas on_done was called for
+    reported: set[int] = set()
+
+    def report(schema: t.Dict[str, t.Any], error: BaseException | None) -> None:
+        reported.add(id(schema))
+        if on_done is not None:
+            on_done(schema, error)
+
+    async def download(
+        client: AsyncAirtable,
+        limit: asyncio.Semaphore,
+        schema: t.Dict[str, t.Any],
+    ) -> None:
+        async with limit:
+            logger.info(
+                f"Loading data from Base: {schema['base']} Table: {schema['airtable']}"
+            )
+            path = f"{data_dir}/{schema['sqltable']}"
+            try:
+                with utils.FanOutWriter(
+                    path, writer_classes, schema, compression=compression
+                ) as writer:
+                    async for page in iter_airtable(client, schema):
+                        if cancelled is not None and cancelled.is_set():
+                            raise utils.DownloadCancelled(schema["sqltable"])
+                        # the writer blocks while its queues are full
+                        await asyncio.to_thread(writer.write, page)
+            except BaseException as e:
+                await asyncio.to_thread(report, schema, e)
+                raise
+            await asyncio.to_thread(report, schema, None)
+
+    async def run() -> None:
+        limit = asyncio.Semaphore(jobs)
+        async with AsyncAirtable.from_api(api_client, max_connections=jobs) as client:
+            async with asyncio.TaskGroup() as group:
+                for schema in schemas:
+                    group.create_task(download(client, limit, schema))
+
+    try:
+        asyncio.run(run())
+    except BaseException as e:
+        # report the first table that failed, not the ones cancelled after it
+        error = e.exceptions[0] if isinstance(e, BaseExceptionGroup) else e
+        for schema in schemas:
+            if id(schema) not in reported:
+                report(schema, error)
+        raise error
+
+
+def fetch_base_schemas(
+    api_client: "ATApi",
+    base_ids: t.Iterable[str],
+    max_connections: int = 20,
+) -> dict[str, BaseSchema]:
+    """
+    Fetch the schemas of <base_ids> at the same time, keyed by base ID.
+    """
+    base_ids = list(dict.fromkeys(base_ids))
+
+    async def run() -> list[dict[str, t.Any]]:
+        async with AsyncAirtable.from_api(
+            api_client, max_connections=max_connections
+        ) as client:
+            return await asyncio.gather(
+                *(client.base_schema(base_id) for base_id in base_ids)
+            )
+
+    return {
+        base_id: BaseSchema.from_api(data, api_client, context=api_client.base(base_id))
+        for base_id, data in zip(base_ids, asyncio.run(run()))
+    }
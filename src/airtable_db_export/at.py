@@ -1,22 +1,42 @@
+import heapq
 import json
 import logging
+import os
+import queue
 import re
+import textwrap
+import threading
+import time
 import typing as t
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
+import requests
 from pyairtable.models import schema as schemas
 
+from airtable_db_export import ratelimit, utils
+
 if t.TYPE_CHECKING:
     from pyairtable import Api as ATApi
-    from pyairtable.models.schema import FieldSchema
+    from pyairtable import Base
+    from pyairtable.models.schema import BaseSchema, FieldSchema
 
 
 logger = logging.getLogger(__name__)
 
 
 # Constants
+# fetch engines: pyairtable, or the asyncio engine in aio
+ENGINES: tuple[str, ...] = ("sync", "async")
+
+# tables each engine downloads at the same time unless told otherwise: threads
+# are costly, while the async engine's tasks share one connection pool
+ENGINE_JOBS: dict[str, int] = {"sync": 1, "async": 20}
+
+
 class EXPORTS:
     JSON = "json"
+    NDJSON = "ndjson"
     CSV = "csv"
 
 
@@ -95,18 +115,148 @@ def make_id(col: str, pl=False):
     return f"{col}{sfx}" if not col.endswith(sfx) else col
 
 
-def archive_schemas(api_client: "ATApi", filename: str) -> None:
+def iter_base_schemas(
+    api_client: "ATApi", bases: t.Iterable["Base"], jobs: int = 1
+) -> t.Iterator[tuple[str, dict[str, t.Any]]]:
+    """
+    Yield (base ID, schema dict) for each of <bases> as its schema arrives.
+
+    With <jobs> > 1, schemas are fetched concurrently, within each base's rate
+    limit, and yielded in the order they finish.
+    """
+    if jobs <= 1:
+        for base in bases:
+            yield base.id, base.schema().model_dump()
+        return
+
+    ratelimit.rate_limit(api_client, pool_size=jobs)
+    executor = ThreadPoolExecutor(max_workers=jobs)
+    try:
+        futures = {executor.submit(base.schema): base.id for base in bases}
+        for future in as_completed(futures):
+            yield futures[future], future.result().model_dump()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def archive_schemas(
+    api_client: "ATApi",
+    filename: Path | str,
+    jobs: int = 1,
+    per_base: bool = False,
+    max_age: float = 0,
+) -> None:
     """
     Archive the schemas of all Airtable bases to a JSON file.
+
+    Each schema is written as soon as it is fetched, so memory use does not grow
+    with the number of bases. The file is replaced only once every schema has
+    been written.
+
+    With <per_base>, <filename> is a directory with one {base_id}.json file per
+    base, rewritten only if the schema changed, and an index.json recording
+    when each base was last fetched. Bases fetched less than <max_age> seconds
+    ago are skipped.
+    """
+    bases = api_client.bases()
+
+    if per_base:
+        out_dir = Path(filename)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        index_file = out_dir / "index.json"
+        index: dict[str, t.Any] = utils.load_state(index_file)
+
+        now = time.time()
+        stale = [
+            base
+            for base in bases
+            if not (
+                base.id in index
+                and now - index[base.id]["fetched_at"] < max_age
+                and (out_dir / f"{base.id}.json").exists()
+            )
+        ]
+        try:
+            for base_id, schema in iter_base_schemas(api_client, stale, jobs):
+                path = out_dir / f"{base_id}.json"
+                content = json.dumps(schema, indent=2)
+                if not path.exists() or path.read_text(encoding="utf-8") != content:
+                    logger.info(f"Schema changed for base {base_id}")
+                    utils.save_text(path, content)
+                index[base_id] = {"fetched_at": now}
+        finally:
+            # keep track of the bases that were fetched, even after an error
+            utils.save_state(index_file, index)
+        return
+
+    tmp_path = f"{filename}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as ref_file:
+            ref_file.write("{")
+            for i, (base_id, schema) in enumerate(
+                iter_base_schemas(api_client, bases, jobs)
+            ):
+                entry = f"{json.dumps(base_id)}: {json.dumps(schema, indent=2)}"
+                ref_file.write(",\n" if i else "\n")
+                ref_file.write(textwrap.indent(entry, "  "))
+            ref_file.write("\n}" if bases else "}")
+        os.replace(tmp_path, filename)
+    except BaseException:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+
+
+def fetch_base_schemas(
+    api_client: "ATApi",
+    base_ids: t.Iterable[str],
+    cache_file: Path | str | None = None,
+    ttl: float = 0,
+    engine: str = "sync",
+) -> dict[str, "BaseSchema"]:
     """
-    import json
+    Fetch the full schema of each base once, keyed by base ID.
 
-    ref_schema: dict[str, dict] = {}
-    for base in api_client.bases():
-        ref_schema[base.id] = base.schema().model_dump()
+    With a <cache_file> and a <ttl> in seconds, schemas fetched less than <ttl>
+    seconds ago are read from the cache instead of the metadata API. Set ttl to
+    0 to always fetch, refreshing the cache.
 
-    with open(filename, "w") as ref_file:
-        json.dump(ref_schema, ref_file, indent=2)
+    With the "async" <engine>, the schemas that are not cached are fetched at
+    the same time (see aio.fetch_base_schemas).
+    """
+    cache: dict[str, t.Any] = utils.load_state(cache_file) if cache_file else {}
+    now = time.time()
+
+    base_schemas: dict[str, "BaseSchema"] = {}
+    stale: list[str] = []
+    for base_id in dict.fromkeys(base_ids):
+        cached = cache.get(base_id)
+        if cached and now - cached["fetched_at"] < ttl:
+            logger.info(f"Using cached schema for base {base_id}")
+            base_schemas[base_id] = schemas.BaseSchema.from_api(
+                cached["schema"], api_client, context=api_client.base(base_id)
+            )
+        else:
+            stale.append(base_id)
+
+    if engine == "async" and stale:
+        from airtable_db_export import aio
+
+        fetched = aio.fetch_base_schemas(api_client, stale)
+    else:
+        fetched = {base_id: api_client.base(base_id).schema() for base_id in stale}
+
+    for base_id, base_schema in fetched.items():
+        base_schemas[base_id] = base_schema
+        cache[base_id] = {
+            "fetched_at": now,
+            "schema": base_schema.model_dump(
+                mode="json", by_alias=True, exclude_unset=True
+            ),
+        }
+
+    if cache_file:
+        utils.save_state(cache_file, cache)
+    return base_schemas
 
 
 def get_sqlcol_and_type(
@@ -176,12 +326,17 @@ def get_sqlcol_and_type(
 
 
 def make_sql_schema(
-    api_client: "ATApi", tconf: t.Dict[str, t.Any], col_filters: list[str] | None = None
+    api_client: "ATApi",
+    tconf: t.Dict[str, t.Any],
+    col_filters: list[str] | None = None,
+    base_schema: "BaseSchema | None" = None,
 ) -> t.Dict:
     """
     Inspect the an Airtable base and table schema and use the configuration to
     build an intermediate structure that can be used to generate she SQL DDL to
     create tables and load data.
+
+    Pass the <base_schema> from fetch_base_schemas to avoid fetching it again.
     """
     col_filters = col_filters or []
 
@@ -200,13 +355,24 @@ def make_sql_schema(
     # will we use all reflected columns or just the one we
     # map out?
     all_columns: bool = tconf.get("all_columns", True)
+    table_schema["all_columns"] = all_columns
+    table_schema["use_field_ids"] = tconf.get("use_field_ids", False)
+
+    # server-side row selection
+    for key in ROW_OPTIONS:
+        if key in tconf:
+            table_schema[key] = tconf[key]
+    if "shards" in tconf:
+        table_schema["shards"] = tconf["shards"]
 
     # build defs for SQL table/csv
     ## get schema for table
     col_map: dict[str, t.Any] = tconf.get("columns", {})
 
     # get Airtable table schema
-    ts = base.table(atable).schema()
+    if base_schema is None:
+        base_schema = base.schema()
+    ts = base_schema.table(atable)
 
     # initialize with id primary key
     # when loading data we will put the recordId here
@@ -224,6 +390,7 @@ def make_sql_schema(
     field: "FieldSchema"
 
     fields_by_id = {f.id: f.name for f in ts.fields}
+    table_schema["primary_field"] = fields_by_id.get(ts.primary_field_id)
 
     for field in ts.fields:
         additional = {}
@@ -297,6 +464,7 @@ def make_sql_schema(
         # sqltype = TYPEMAP.get(atype, "VARCHAR")
         coldef: dict[str, str] = {
             "field": aname,
+            "field_id": field.id,
             "type": atype,
             "description": description,
             "sqlcolumn": sqlcol,
@@ -315,6 +483,9 @@ def make_schema_json(
     api_client: "ATApi",
     conf: dict,
     path: Path | str = "schemas.json",
+    cache_file: Path | str | None = None,
+    ttl: float = 0,
+    engine: str = "sync",
 ) -> None:
     """
     Inspects the Airtable base schema and, for the tables listed in the config, generates the
@@ -328,6 +499,7 @@ def make_schema_json(
             "columns": [
                 {
                     "field": "Indicator",
+                    "field_id": "fldXXXXXXXXXXXXXX",
                     "type": "singleRecordLink",
                     "sqlcolumn": "indicator_id",
                     "sqltype": "VARCHAR"
@@ -347,78 +519,434 @@ def make_schema_json(
 
     See at.ATYPES and at.TYPEMAP for more detail.
 
+    Each base's schema is fetched once, or read from <cache_file> if it is
+    younger than <ttl> seconds (see fetch_base_schemas), with the sync or
+    async <engine>. The file is only rewritten if the mappings changed.
     """
     all_schemas: list[dict[str, dict]] = []
     col_filters: list[str] = conf.get("column_filters", [])
     table_confs: list[dict] = conf.get("tables", [])
 
+    base_schemas = fetch_base_schemas(
+        api_client, [tconf["base"] for tconf in table_confs], cache_file, ttl, engine
+    )
     for tconf in table_confs:
-        tschema: dict[str, dict] = make_sql_schema(api_client, tconf, col_filters)
+        tschema: dict[str, dict] = make_sql_schema(
+            api_client, tconf, col_filters, base_schemas[tconf["base"]]
+        )
         all_schemas.append(tschema)
 
-    with open(path, "w") as schema_file:
-        json.dump(all_schemas, schema_file, indent=2)
+    content = json.dumps(all_schemas, indent=2)
+    if Path(path).exists() and Path(path).read_text(encoding="utf-8") == content:
+        logger.info(f"Schema mappings unchanged in {path}")
+        return
 
+    with open(path, "w", encoding="utf-8") as schema_file:
+        schema_file.write(content)
 
-def load_airtable(
+
+# Sentinel for the column that holds the Airtable record ID
+RECORD_ID = object()
+
+
+def _first(value: t.Any) -> t.Any:
+    # reduce a list value to its first entry
+    if type(value) is list and len(value):
+        return value[0]
+    return value
+
+
+def _boolean(value: t.Any) -> bool:
+    return value == "TRUE"
+
+
+def _first_boolean(value: t.Any) -> bool:
+    return _first(value) == "TRUE"
+
+
+def compile_converters(
+    schema: t.Dict[str, t.Any],
+) -> t.List[tuple[str, t.Any, t.Callable[[t.Any], t.Any] | None]]:
+    """
+    Compile the schema's columns into (sqlcol, field, converter) tuples.
+
+    All per-column decisions (ID column, list reduction, boolean conversion)
+    are made here once, so transforming a row only applies the converters.
+    field is RECORD_ID for the id column, and the field ID instead of its name
+    if the schema sets use_field_ids; converter is None when the value is kept
+    as is.
+    """
+    list_types = set(LIST_TYPES)
+    field_key: str = "field_id" if schema.get("use_field_ids") else "field"
+    converters: t.List[tuple[str, t.Any, t.Callable[[t.Any], t.Any] | None]] = []
+    for col_spec in schema["columns"]:
+        field = col_spec.get(field_key)
+        sqlcol: str = col_spec["sqlcolumn"]
+        sqltype: str = col_spec["sqltype"]
+
+        if sqlcol == "id":
+            converters.append((sqlcol, RECORD_ID, None))
+            continue
+
+        # if it's an id field, keep as a list
+        if "_ids" in sqlcol:
+            converters.append((sqlcol, field, None))
+            continue
+
+        # if it's a scalar field, reduce to first entry
+        reduce_list = col_spec["type"] in list_types and not sqltype.endswith("[]")
+        # if it's a boolean field, convert to boolean
+        boolean = sqltype == "BOOLEAN"
+
+        if reduce_list and boolean:
+            converter = _first_boolean
+        elif reduce_list:
+            converter = _first
+        elif boolean:
+            converter = _boolean
+        else:
+            converter = None
+        converters.append((sqlcol, field, converter))
+
+    return converters
+
+
+def compile_transform(
+    schema: t.Dict[str, t.Any],
+) -> t.Callable[[dict[str, t.Any]], dict[str, t.Any]]:
+    """
+    Compile the schema into a function that transforms one Airtable record
+    ({"id": ..., "fields": {...}}) into a row keyed by SQL column.
+    """
+    converters = compile_converters(schema)
+
+    def transform(row: dict[str, t.Any]) -> dict[str, t.Any]:
+        get = row["fields"].get
+        return {
+            sqlcol: (
+                row["id"]
+                if field is RECORD_ID
+                else get(field)
+                if convert is None
+                else convert(get(field))
+            )
+            for sqlcol, field, convert in converters
+        }
+
+    return transform
+
+
+# table config keys that select rows, and the pyairtable option for each
+ROW_OPTIONS: dict[str, str] = {
+    "view": "view",
+    "filter": "formula",
+    "sort": "sort",
+    "max_records": "max_records",
+}
+
+
+def row_options(schema: t.Dict[str, t.Any]) -> dict[str, t.Any]:
+    """
+    pyairtable list-records options that select the schema's rows: its view,
+    filter formula, sort and max_records, all applied by Airtable.
+    """
+    return {
+        option: schema[key]
+        for key, option in ROW_OPTIONS.items()
+        if schema.get(key) is not None
+    }
+
+
+def _merge_options(
+    base: dict[str, t.Any], options: dict[str, t.Any]
+) -> dict[str, t.Any]:
+    """
+    Add <options> to <base> options. Formulas in both must both match.
+    """
+    merged = {**base, **options}
+    if "formula" in base and "formula" in options:
+        merged["formula"] = f"AND({base['formula']}, {options['formula']})"
+    return merged
+
+
+def projection_options(schema: t.Dict[str, t.Any]) -> dict[str, t.Any]:
+    """
+    pyairtable list-records options that ask only for the schema's fields.
+
+    Fields are only projected when the table config sets all_columns: false,
+    so Airtable does not send fields that would be dropped anyway. With
+    use_field_ids, fields are requested and returned by ID, which keeps
+    working if a field is renamed in Airtable.
+    """
+    options: dict[str, t.Any] = {}
+    by_id: bool = schema.get("use_field_ids", False)
+    if by_id:
+        options["use_field_ids"] = True
+    if not schema.get("all_columns", True):
+        key = "field_id" if by_id else "field"
+        options["fields"] = [col[key] for col in schema["columns"] if col["field"]]
+    return options
+
+
+def iter_airtable(
     at_client: "ATApi",
     schema: t.Dict[str, t.Any],
-) -> t.List[dict[str, t.Any]]:
+    **options: t.Any,
+) -> t.Iterator[t.List[dict[str, t.Any]]]:
     """
-    Load Airtable data
+    Stream Airtable data one page at a time
 
     at_client: Airtable client
-    table_name: name of the table in the airtable Base
+    schema: table schema from schemas.json
+    options: extra pyairtable list-records options (e.g. formula); a formula
+        is combined with the table's configured filter
 
-    Returns a list of dictionaries with the data from the table
+    Yields a list of transformed rows for each page returned by the API, so
+    callers can write each page out before the next one is requested.
     """
-    kwargs: dict[str, t.Any] = {}
+    kwargs: dict[str, t.Any] = _merge_options(
+        {**row_options(schema), **projection_options(schema)}, options
+    )
     base: str = schema["base"]
     table = schema["airtable"]
-    if view := schema.get("view"):
-        kwargs["view"] = view
 
     # load table
     table = at_client.table(base, table)
 
-    # get all records
-    # will use a view if specified in the config
-    results = table.all(**kwargs)
+    transform = compile_transform(schema)
 
-    types_map: dict[str, str] = {c["field"]: c["type"] for c in schema["columns"]}
-    col_map: dict[str, t.Any] = {c["field"]: c for c in schema["columns"]}
+    shards: int = schema.get("shards", 1)
+    if shards > 1 and any(key in kwargs for key in UNSHARDABLE_OPTIONS):
+        logger.warning(
+            f"Table {schema['airtable']} sets one of {UNSHARDABLE_OPTIONS}, "
+            "fetching it without shards"
+        )
+        shards = 1
+    if shards > 1:
+        ratelimit.rate_limit(at_client, pool_size=shards)
+        pages = iter_sharded(table, shards, **kwargs)
+    else:
+        pages = table.iterate(**kwargs)
 
-    table_data: t.List[dict] = []
+    # iterate pages of records
+    # will use a view, filter, etc. if specified in the config
+    for page in pages:
+        yield [transform(row) for row in page]
+
+
+class OffsetExpired(Exception):
+    """
+    Raised when Airtable no longer accepts a saved pagination offset.
+    """
 
-    # for each row, get the airtable value for each specified column
-    # create a new row with values for just those columns
-    # if needed, convert the value to a new datatype?
-    for row in results:
-        new_row: dict[str, t.Any] = {}
-        for field, col_spec in col_map.items():
-            sqlcol = col_spec["sqlcolumn"]
-            multi_id_field = "_ids" in sqlcol
-            sqltype = col_spec["sqltype"]
-
-            if sqlcol == "id":
-                new_row["id"] = row["id"]
-            else:
-                _value: t.Any = row["fields"].get(field, None)
-
-                # if it's an id field, keep as a list
-                if multi_id_field:
-                    new_row[sqlcol] = _value
-                else:
-                    # if it's a scalar field, reduce to first entry
-                    if types_map[field] in LIST_TYPES and not sqltype.endswith("[]"):
-                        if type(_value) is list and len(_value):
-                            _value = _value[0]
-                    # if it's a boolean field, convert to boolean
-                    if sqltype == "BOOLEAN":
-                        _value = _value == "TRUE"
-
-                    new_row[sqlcol] = _value
-        table_data.append(new_row)
+
+def iter_airtable_offsets(
+    at_client: "ATApi",
+    schema: t.Dict[str, t.Any],
+    offset: str | None = None,
+    **options: t.Any,
+) -> t.Iterator[tuple[t.List[dict[str, t.Any]], str | None]]:
+    """
+    Stream Airtable data one page at a time, like iter_airtable, starting
+    from a pagination <offset> returned by an earlier listing.
+
+    Yields (rows, offset) for each page, where offset continues the listing
+    after that page, or is None after the last page. Raises OffsetExpired if
+    Airtable rejects <offset>, which it does some time after it was issued.
+    """
+    kwargs: dict[str, t.Any] = _merge_options(
+        {**row_options(schema), **projection_options(schema)}, options
+    )
+    if offset:
+        kwargs["offset"] = offset
+    table = at_client.table(schema["base"], schema["airtable"])
+    transform = compile_transform(schema)
+
+    responses = at_client.iterate_requests(
+        method="get",
+        url=table.urls.records,
+        fallback=("post", table.urls.records_post),
+        options=kwargs,
+    )
+    try:
+        for response in responses:
+            rows = [transform(row) for row in response.get("records", [])]
+            yield rows, response.get("offset")
+    except requests.HTTPError as e:
+        if offset and "LIST_RECORDS_ITERATOR_NOT_AVAILABLE" in e.response.text:
+            raise OffsetExpired(offset) from e
+        raise
+
+
+# characters Airtable record IDs are made of
+RECORD_ID_CHARS: str = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+
+# list-records options that sharding would change the meaning of: shards are
+# merged back in creation order, and max_records would apply to each shard
+UNSHARDABLE_OPTIONS: tuple[str, ...] = ("view", "sort", "max_records")
+
+
+def shard_formulas(shards: int) -> list[str]:
+    """
+    filterByFormula expressions that split a table into <shards> disjoint
+    partitions covering every record, by the last character of the record ID.
+    """
+    return [
+        f"FIND(RIGHT(RECORD_ID(), 1), '{RECORD_ID_CHARS[i::shards]}') > 0"
+        for i in range(shards)
+    ]
+
+
+class _Shard(threading.Thread):
+    """
+    Page through one partition of a table on its own thread, handing records
+    to the merge through a bounded queue of pages.
+    """
+
+    _DONE = object()
+
+    def __init__(
+        self,
+        table: t.Any,
+        stopped: threading.Event,
+        max_pages: int = 4,
+        **options: t.Any,
+    ):
+        super().__init__(daemon=True)
+        self.table = table
+        self.options: dict[str, t.Any] = options
+        self.stopped: threading.Event = stopped
+        self.pages: queue.Queue = queue.Queue(maxsize=max_pages)
+
+    def _put(self, item: t.Any) -> bool:
+        # give up once the merge has stopped, rather than block forever
+        while not self.stopped.is_set():
+            try:
+                self.pages.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def run(self) -> None:
+        try:
+            for page in self.table.iterate(**self.options):
+                if not self._put(page):
+                    return
+        except BaseException as e:
+            self._put(e)
+            return
+        self._put(self._DONE)
+
+    def records(self) -> t.Iterator[dict[str, t.Any]]:
+        while (page := self.pages.get()) is not self._DONE:
+            if isinstance(page, BaseException):
+                raise page
+            yield from page
+
+
+def iter_sharded(
+    table: t.Any,
+    shards: int,
+    page_size: int = 100,
+    **options: t.Any,
+) -> t.Iterator[t.List[dict[str, t.Any]]]:
+    """
+    Page through a pyairtable table as <shards> partitions at the same time
+    (see shard_formulas), yielding pages of raw records.
+
+    Each partition comes back in Airtable's default order, by creation time,
+    so the partitions are merged on createdTime to give the same order as an
+    unsharded listing. Records created in the same millisecond keep their
+    order within a partition. Requests still go through the client's per-base
+    rate limiter.
+    """
+    stopped = threading.Event()
+    threads = [
+        _Shard(table, stopped, **_merge_options(options, {"formula": formula}))
+        for formula in shard_formulas(shards)
+    ]
+    for thread in threads:
+        thread.start()
+
+    try:
+        merged = heapq.merge(
+            *(thread.records() for thread in threads),
+            key=lambda record: record["createdTime"],
+        )
+        page: list[dict[str, t.Any]] = []
+        for record in merged:
+            page.append(record)
+            if len(page) >= page_size:
+                yield page
+                page = []
+        if page:
+            yield page
+    finally:
+        stopped.set()
+        for thread in threads:
+            thread.join()
+
+
+def iter_record_ids(
+    at_client: "ATApi",
+    schema: t.Dict[str, t.Any],
+) -> t.Iterator[t.List[str]]:
+    """
+    Stream just the record IDs of a table, one page at a time
+
+    Airtable returns every field when no projection is given, so the request
+    is projected onto a single field (the primary field, if known) to keep
+    pages small. The table's view, filter, sort and max_records apply, so
+    records outside them are treated as missing.
+    """
+    kwargs: dict[str, t.Any] = row_options(schema)
+
+    field: str | None = schema.get("primary_field")
+    if field is None:
+        field = next((c["field"] for c in schema["columns"] if c["field"]), None)
+    if field is not None:
+        kwargs["fields"] = [field]
+
+    table = at_client.table(schema["base"], schema["airtable"])
+    for page in table.iterate(**kwargs):
+        yield [row["id"] for row in page]
+
+
+def modified_since_formula(since: str) -> str:
+    """
+    Build a filterByFormula expression matching records modified after <since>,
+    an ISO 8601 timestamp.
+
+    Note that LAST_MODIFIED_TIME() only changes when a user-editable field
+    changes; formula and lookup values that change on their own are not seen.
+    """
+    return f"IS_AFTER(LAST_MODIFIED_TIME(), DATETIME_PARSE('{since}'))"
+
+
+def load_airtable(
+    at_client: "ATApi",
+    schema: t.Dict[str, t.Any],
+    engine: str = "sync",
+) -> t.List[dict[str, t.Any]]:
+    """
+    Load Airtable data
+
+    at_client: Airtable client
+    schema: table schema from schemas.json
+    engine: "sync" for pyairtable, or "async" for the asyncio engine in aio
+
+    Returns a list of dictionaries with the data from the table. Use
+    iter_airtable to process large tables without holding every row in memory.
+    """
+    if engine == "async":
+        from airtable_db_export import aio
+
+        return aio.load_tables(at_client, [schema])[schema["sqltable"]]
+
+    table_data: t.List[dict] = []
+    for page in iter_airtable(at_client, schema):
+        table_data.extend(page)
 
     return table_data
 
@@ -426,33 +954,24 @@ def load_airtable(
 def save_table_json(
     data: t.List[dict],
     path: str,
+    compression: str | None = None,
 ) -> None:
     """
     Save table data to JSON file
 
-    data: list of dictionaries with the data
-    f: file object
+    Kept for backwards compatibility, see utils.save_table_json.
     """
-    import json
-
-    with open(path, "w") as f:
-        json.dump(data, f, indent=2)
+    utils.save_table_json(data, path, compression)
 
 
 def save_table_csv(
     data: t.List[dict],
     path: str,
+    compression: str | None = None,
 ) -> None:
     """
     Save table data to CSV file
 
-    data: list of dictionaries with the data
-    f: file object
+    Kept for backwards compatibility, see utils.save_table_csv.
     """
-    import csv
-
-    with open(path, "w") as f:
-        writer = csv.DictWriter(f, fieldnames=data[0].keys())
-        writer.writeheader()
-        for row in data:
-            writer.writerow(row)
+    utils.save_table_csv(data, path, compression)
@@ -1,5 +1,10 @@
+import functools
+import sqlite3
 import typing as t
 import duckdb
+import pandas as pd
+
+from airtable_db_export import sqlite, utils
 from contextlib import contextmanager
 from pathlib import Path
 
@@ -14,8 +19,48 @@ def clean_name(name: str):
     return name
 
 
+# database backend of each database file extension; anything else is DuckDB
+BACKENDS: dict[str, str] = {
+    ".sqlite": "sqlite",
+    ".sqlite3": "sqlite",
+}
+
+# module implementing the connection-level functions below (those decorated
+# with _backend) for each other backend's connection type
+BACKEND_MODULES: dict[type, t.Any] = {
+    sqlite3.Connection: sqlite,
+}
+
+
+def backend_name(dbfile: Path | str) -> str:
+    """
+    The database backend for <dbfile>, from its extension (see BACKENDS).
+    """
+    return BACKENDS.get(Path(dbfile).suffix.lower(), "duckdb")
+
+
+def _backend(func: t.Callable) -> t.Callable:
+    """
+    Run the backend module's function of the same name on connections to
+    other backends (see BACKEND_MODULES), and <func> on DuckDB connections.
+    """
+
+    @functools.wraps(func)
+    def dispatch(conn, *args, **kwargs):
+        module = BACKEND_MODULES.get(type(conn))
+        if module is not None:
+            return getattr(module, func.__name__)(conn, *args, **kwargs)
+        return func(conn, *args, **kwargs)
+
+    return dispatch
+
+
 @contextmanager
 def dbconn(dbfile: Path | str):
+    if backend_name(dbfile) == "sqlite":
+        with sqlite.dbconn(dbfile) as conn:
+            yield conn
+        return
     conn = duckdb.connect(dbfile)
     yield conn
     conn.close()
@@ -31,19 +76,40 @@ def bootstrap_db(
     """
     with dbconn(dbfile) as conn:
         for schema in schemas:
-            with open(f"{data_dir}/create_{schema['sqltable']}.sql", "r") as f:
-                conn.sql(f.read())
+            create_table(conn, schema, data_dir)
+
+
+@_backend
+def create_table(
+    conn: duckdb.DuckDBPyConnection,
+    schema: t.Dict[str, t.Any],
+    sql_dir: Path | str = "sql",
+) -> None:
+    """
+    Run the schema's create table file.
+    """
+    with open(f"{sql_dir}/create_{schema['sqltable']}.sql", "r", encoding="utf-8") as f:
+        conn.sql(f.read())
 
 
-def make_table_create(schema: t.Dict[str, t.Any]) -> str:
+def make_table_create(
+    schema: t.Dict[str, t.Any],
+    table: str | None = None,
+    replace: bool = False,
+) -> str:
     """
     Make SQL create table statement from schema
 
     schema: schema dictionary
+    table: table name to create instead of the schema's sqltable
+    replace: use CREATE OR REPLACE instead of CREATE IF NOT EXISTS
     """
-    table: dict[str, t.Any] = schema["sqltable"]
+    table = table or schema["sqltable"]
 
-    stmt: str = f"CREATE TABLE IF NOT EXISTS {table}\n"
+    if replace:
+        stmt: str = f"CREATE OR REPLACE TABLE {table}\n"
+    else:
+        stmt: str = f"CREATE TABLE IF NOT EXISTS {table}\n"
     coldefs: list[str] = []
     for col in schema["columns"]:
         if "sqlcolumn" in col:
@@ -62,23 +128,442 @@ def make_create_files(
     """
     for create_schema in schemas:
         create_sql: str = make_table_create(create_schema)
-        with open(f"{sql_dir}/create_{create_schema['sqltable']}.sql", "w") as sqlfile:
+        with open(
+            f"{sql_dir}/create_{create_schema['sqltable']}.sql", "w", encoding="utf-8"
+        ) as sqlfile:
             sqlfile.write(create_sql)
 
 
+def _column_key(col: t.Dict[str, t.Any], by_id: bool) -> str:
+    """
+    Identify a column across schema versions: by Airtable field ID or by
+    Airtable field name. The id column has no field.
+    """
+    if not col["field"]:
+        return col["sqlcolumn"]
+    return col["field_id"] if by_id else col["field"]
+
+
+def make_table_migration(
+    old: t.Dict[str, t.Any],
+    new: t.Dict[str, t.Any],
+) -> t.List[str]:
+    """
+    Make the ALTER TABLE statements that change a table created from <old>
+    into one matching <new>, keeping its data.
+
+    Columns are matched by Airtable field ID where both schemas have one, so a
+    renamed field renames its column rather than dropping and re-adding it.
+    """
+    table: str = old["sqltable"]
+    stmts: list[str] = []
+    if new["sqltable"] != table:
+        stmts.append(f"ALTER TABLE {table} RENAME TO {new['sqltable']};")
+        table = new["sqltable"]
+
+    # schemas.json files written before field IDs were recorded only have names
+    by_id: bool = all(
+        col.get("field_id") for col in old["columns"] + new["columns"] if col["field"]
+    )
+    old_cols = {_column_key(col, by_id): col for col in old["columns"]}
+    new_cols = {_column_key(col, by_id): col for col in new["columns"]}
+
+    for key, col in old_cols.items():
+        if key not in new_cols:
+            stmts.append(f'ALTER TABLE {table} DROP COLUMN "{col["sqlcolumn"]}";')
+
+    for key, col in new_cols.items():
+        sqlcol: str = col["sqlcolumn"]
+        if key not in old_cols:
+            stmts.append(f'ALTER TABLE {table} ADD COLUMN "{sqlcol}" {col["sqltype"]};')
+            continue
+
+        prev = old_cols[key]
+        if prev["sqlcolumn"] != sqlcol:
+            stmts.append(
+                f'ALTER TABLE {table} RENAME COLUMN "{prev["sqlcolumn"]}" TO "{sqlcol}";'
+            )
+        if prev["sqltype"].upper() != col["sqltype"].upper():
+            stmts.append(
+                f'ALTER TABLE {table} ALTER COLUMN "{sqlcol}" TYPE {col["sqltype"]};'
+            )
+
+    return stmts
+
+
+def _schema_key(schema: t.Dict[str, t.Any]) -> tuple[str, str]:
+    return schema["base"], schema["airtable"]
+
+
+def match_schemas(
+    old_schemas: t.List[dict],
+    new_schemas: t.List[dict],
+) -> t.List[tuple[dict, dict]]:
+    """
+    Pair each schema in <new_schemas> with the one in <old_schemas> its table
+    was created from.
+
+    Tables are matched by sqltable first. Several SQL tables can be built from
+    one Airtable table (e.g. with different views or filters), so a table is
+    only matched to a differently named one, and renamed, when it is the only
+    unmatched table from that Airtable base and table on both sides.
+    """
+    new_tables = {schema["sqltable"] for schema in new_schemas}
+    old_by_table = {schema["sqltable"]: schema for schema in old_schemas}
+    pairs: list[tuple[dict, dict]] = []
+    unmatched_new: dict[tuple[str, str], list[dict]] = {}
+    for schema in new_schemas:
+        old = old_by_table.get(schema["sqltable"])
+        if old is not None and _schema_key(old) == _schema_key(schema):
+            pairs.append((old, schema))
+        elif old is None:
+            unmatched_new.setdefault(_schema_key(schema), []).append(schema)
+
+    unmatched_old: dict[tuple[str, str], list[dict]] = {}
+    for schema in old_schemas:
+        if schema["sqltable"] not in new_tables:
+            unmatched_old.setdefault(_schema_key(schema), []).append(schema)
+
+    for key, news in unmatched_new.items():
+        olds = unmatched_old.get(key, [])
+        if len(news) == 1 and len(olds) == 1:
+            pairs.append((olds[0], news[0]))
+    return pairs
+
+
+def migrate_db(
+    dbfile: Path | str,
+    old_schemas: t.List[dict],
+    new_schemas: t.List[dict],
+    dry_run: bool = False,
+) -> t.List[str]:
+    """
+    Bring tables created from <old_schemas> in line with <new_schemas> with
+    ALTER TABLE statements, in one transaction, instead of rebuilding them.
+
+    Tables are paired by match_schemas. Tables new in <new_schemas> are left
+    for bootstrap_db to create, and tables no longer in it are left in place.
+    With <dry_run>, nothing is executed.
+
+    Returns the statements, or with a database run, the statements it ran.
+    """
+    stmts: list[str] = []
+    for old, schema in match_schemas(old_schemas, new_schemas):
+        stmts.extend(make_table_migration(old, schema))
+
+    if dry_run or not stmts:
+        return stmts
+
+    with dbconn(dbfile) as conn:
+        return run_migration(conn, stmts)
+
+
+@_backend
+def run_migration(conn: duckdb.DuckDBPyConnection, stmts: t.List[str]) -> t.List[str]:
+    """
+    Run migration statements in one transaction. Returns the statements run.
+    """
+    conn.begin()
+    try:
+        for stmt in stmts:
+            conn.sql(stmt)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return stmts
+
+
+# DuckDB table functions used to read each downloaded data format
+READERS: dict[str, str] = {
+    "json": "read_json",
+    "ndjson": "read_json",
+    "parquet": "read_parquet",
+}
+
+# read_json format option for each JSON data format
+JSON_FORMATS: dict[str, str] = {
+    "json": "array",
+    "ndjson": "newline_delimited",
+}
+
+
+def make_table_read(
+    schema: t.Dict[str, t.Any],
+    path: Path | str,
+    fmt: str = "json",
+) -> str:
+    """
+    Make the DuckDB table function call that reads a data file for <schema>.
+
+    JSON readers are given the column names and types from the schema, so
+    DuckDB does not have to sample the file to infer them.
+    """
+    reader: str = READERS[fmt]
+    if fmt not in JSON_FORMATS:
+        return f"{reader}('{path}')"
+
+    columns: str = ", ".join(
+        f"\"{col['sqlcolumn']}\": '{col['sqltype']}'" for col in schema["columns"]
+    )
+    return f"{reader}('{path}', format='{JSON_FORMATS[fmt]}', columns={{{columns}}})"
+
+
+def make_table_insert(
+    schema: t.Dict[str, t.Any],
+    path: Path | str,
+    fmt: str = "json",
+    replace: bool = False,
+) -> str:
+    """
+    Make the INSERT statement that loads a data file into the schema's table.
+
+    Columns are matched by name rather than position. With <replace>, rows
+    with an existing id are replaced.
+    """
+    columns: str = ", ".join(f'"{col["sqlcolumn"]}"' for col in schema["columns"])
+    verb: str = "INSERT OR REPLACE" if replace else "INSERT"
+    return (
+        f"{verb} INTO {schema['sqltable']} ({columns})\n"
+        f"SELECT {columns}\n"
+        f"FROM {make_table_read(schema, path, fmt)};"
+    )
+
+
 def load_db(
     dbfile: Path | str,
     schemas: t.List[dict],
     data_dir: Path | str = "data",
+    fmt: str = "json",
+    compression: str | None = None,
 ) -> None:
+    """
+    Load downloaded data files in <fmt> format into the database tables.
+
+    Files written with <compression> are read as they are, and decompressed
+    while reading.
+    """
     with dbconn(dbfile) as conn:
         for schema in schemas:
-            print(
-                f"Loading table {schema['sqltable']} from {data_dir}/{schema['sqltable']}.json"
-            )
-            sql: str = (
-                f"INSERT INTO {schema['sqltable']}\n"
-                f"SELECT * "
-                f"FROM read_json('{data_dir}/{schema['sqltable']}.json');"
-            )
-            conn.sql(sql)
+            path = utils.data_file(data_dir, schema["sqltable"], fmt, compression)
+            load_table(conn, schema, path, fmt)
+
+
+@_backend
+def load_table(
+    conn: duckdb.DuckDBPyConnection,
+    schema: t.Dict[str, t.Any],
+    path: Path | str,
+    fmt: str = "json",
+    replace: bool = False,
+) -> None:
+    """
+    Load one data file in <fmt> format into the schema's table. With
+    <replace>, rows with an existing id are replaced.
+    """
+    print(f"Loading table {schema['sqltable']} from {path}")
+    conn.sql(make_table_insert(schema, path, fmt, replace))
+
+
+def table_counts(dbfile: Path | str, tables: t.Iterable[str]) -> dict[str, int | None]:
+    """
+    Row count of each of <tables>, or None for tables that do not exist.
+    """
+    with dbconn(dbfile) as conn:
+        return {table: table_count(conn, table) for table in tables}
+
+
+@_backend
+def table_count(conn: duckdb.DuckDBPyConnection, table: str) -> int | None:
+    """
+    Row count of <table>, or None if it does not exist.
+    """
+    existing = {row[0] for row in conn.sql("SHOW TABLES").fetchall()}
+    if table not in existing:
+        return None
+    return conn.sql(f"SELECT count(*) FROM {table}").fetchone()[0]
+
+
+# suffix of the tables that refresh_db loads before swapping them in
+STAGING_SUFFIX: str = "__adbe_staging"
+
+
+@_backend
+def stage_table(
+    conn: duckdb.DuckDBPyConnection,
+    schema: t.Dict[str, t.Any],
+    path: Path | str,
+    fmt: str = "json",
+) -> str:
+    """
+    Load a data file into a new staging table next to the schema's table, to
+    be swapped in by swap_tables. Returns the staging table name.
+    """
+    staging: str = f"{schema['sqltable']}{STAGING_SUFFIX}"
+    print(f"Loading table {staging} from {path}")
+    conn.sql(make_table_create(schema, table=staging, replace=True))
+    conn.sql(make_table_insert({**schema, "sqltable": staging}, path, fmt))
+    return staging
+
+
+@_backend
+def swap_tables(
+    conn: duckdb.DuckDBPyConnection,
+    staged: t.List[tuple[str, str]],
+) -> None:
+    """
+    Replace each (table, staging) table with its staging table, all in one
+    transaction.
+    """
+    print("Swapping in refreshed tables")
+    conn.begin()
+    try:
+        for table, staging in staged:
+            conn.sql(f"DROP TABLE IF EXISTS {table};")
+            conn.sql(f"ALTER TABLE {staging} RENAME TO {table};")
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+@_backend
+def drop_staging(
+    conn: duckdb.DuckDBPyConnection,
+    staged: t.List[tuple[str, str]],
+) -> None:
+    """
+    Drop the staging tables of a failed refresh.
+    """
+    for _, staging in staged:
+        conn.sql(f"DROP TABLE IF EXISTS {staging};")
+
+
+def refresh_db(
+    dbfile: Path | str,
+    schemas: t.List[dict],
+    data_dir: Path | str = "data",
+    fmt: str = "json",
+    compression: str | None = None,
+) -> None:
+    """
+    Reload every table without disturbing readers of the current data.
+
+    Each table is loaded into a staging table next to it. Only when every
+    table has loaded are they swapped in, all in one transaction. If any load
+    fails, the staging tables are dropped and the live tables are untouched.
+    """
+    with dbconn(dbfile) as conn:
+        staged: list[tuple[str, str]] = []
+        try:
+            for schema in schemas:
+                table: str = schema["sqltable"]
+                # record the staging table before loading, so a failed load is
+                # cleaned up too
+                staged.append((table, f"{table}{STAGING_SUFFIX}"))
+                path = utils.data_file(data_dir, table, fmt, compression)
+                stage_table(conn, schema, path, fmt)
+            swap_tables(conn, staged)
+
+        except BaseException:
+            drop_staging(conn, staged)
+            raise
+
+
+@_backend
+def load_table_pages(
+    conn: duckdb.DuckDBPyConnection,
+    schema: t.Dict[str, t.Any],
+    pages: t.Iterable[t.List[dict]],
+    batch_rows: int = 10_000,
+) -> int:
+    """
+    Insert pages of transformed rows straight into the schema's table, without
+    writing a data file.
+
+    Pages are converted to Arrow record batches of about <batch_rows> rows and
+    streamed into DuckDB, so memory stays bounded. Requires pyarrow.
+
+    Returns the number of rows inserted.
+    """
+    import pyarrow as pa
+
+    arrow_schema = utils.arrow_schema(schema)
+    inserted: int = 0
+
+    def batches() -> t.Iterator[pa.RecordBatch]:
+        nonlocal inserted
+        rows: list[dict] = []
+        for page in pages:
+            rows.extend(page)
+            if len(rows) >= batch_rows:
+                inserted += len(rows)
+                yield from utils.arrow_table(rows, arrow_schema).to_batches()
+                rows = []
+        if rows:
+            inserted += len(rows)
+            yield from utils.arrow_table(rows, arrow_schema).to_batches()
+
+    reader = pa.RecordBatchReader.from_batches(arrow_schema, batches())
+    columns: str = ", ".join(f'"{col["sqlcolumn"]}"' for col in schema["columns"])
+    conn.register("adbe_batches", reader)
+    try:
+        conn.sql(
+            f"INSERT INTO {schema['sqltable']} ({columns})\n"
+            f"SELECT {columns} FROM adbe_batches;"
+        )
+    finally:
+        conn.unregister("adbe_batches")
+
+    return inserted
+
+
+def upsert_table(
+    dbfile: Path | str,
+    schema: t.Dict[str, t.Any],
+    path: Path | str,
+    fmt: str = "json",
+) -> None:
+    """
+    Insert or replace the rows in the data file at <path> into the schema's
+    table, matching existing rows on the id primary key.
+    """
+    with dbconn(dbfile) as conn:
+        load_table(conn, schema, path, fmt, replace=True)
+
+
+def delete_missing(
+    dbfile: Path | str,
+    schema: t.Dict[str, t.Any],
+    ids: t.Iterable[str],
+) -> int:
+    """
+    Delete rows whose id is not in <ids> from the schema's table, as one
+    set operation inside the database.
+
+    Returns the number of rows deleted.
+    """
+    with dbconn(dbfile) as conn:
+        return delete_missing_ids(conn, schema, ids)
+
+
+@_backend
+def delete_missing_ids(
+    conn: duckdb.DuckDBPyConnection,
+    schema: t.Dict[str, t.Any],
+    ids: t.Iterable[str],
+) -> int:
+    """
+    Delete rows whose id is not in <ids> from the schema's table.
+
+    Returns the number of rows deleted.
+    """
+    seen_ids = pd.DataFrame({"id": pd.Series(list(ids), dtype="string")})
+    conn.register("seen_ids", seen_ids)
+    sql: str = (
+        f"DELETE FROM {schema['sqltable']}\nWHERE id NOT IN (SELECT id FROM seen_ids);"
+    )
+    deleted = conn.execute(sql).fetchone()
+    conn.unregister("seen_ids")
+
+    return deleted[0] if deleted else 0
@@ -0,0 +1,48 @@
+"""
+In-process stand-in for pyairtable.Api, for tests and benchmarks.
+
+Unlike the simulator, nothing goes over HTTP: FakeApi serves records straight
+from lists, in pages, through the pyairtable.Table.iterate and all methods
+ADBE uses.
+"""
+
+import typing as t
+
+import requests
+
+
+class FakeTable:
+    """
+    Minimal stand-in for pyairtable.Table that serves records in pages.
+    """
+
+    def __init__(self, records: list[dict], page_size: int = 100):
+        self.records = records
+        self.page_size = page_size
+        self.calls: list[dict] = []
+
+    def iterate(self, **options) -> t.Iterator[list[dict]]:
+        self.calls.append(options)
+        for i in range(0, len(self.records), self.page_size):
+            yield self.records[i : i + self.page_size]
+
+    def all(self, **options) -> list[dict]:
+        return [r for page in self.iterate(**options) for r in page]
+
+
+class FakeApi:
+    """
+    Minimal stand-in for pyairtable.Api, keyed by (base, table).
+    """
+
+    def __init__(self, tables: dict[tuple[str, str], FakeTable] | None = None):
+        self.tables = tables or {}
+        self.session = requests.Session()
+
+    def add_table(self, schema: dict[str, t.Any], records: list[dict]) -> FakeTable:
+        table = FakeTable(records)
+        self.tables[(schema["base"], schema["airtable"])] = table
+        return table
+
+    def table(self, base_id: str, table_name: str) -> FakeTable:
+        return self.tables[(base_id, table_name)]
@@ -1,12 +1,18 @@
+import itertools
+import json
 import os
+import queue
+import threading
 import typing as t
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
 import click
 from dotenv import find_dotenv, load_dotenv
 from pyairtable import Api as ATApi
 
-from airtable_db_export import at, db, utils
+from airtable_db_export import at, db, ratelimit, utils
 
 # find the local env file in the CWD,
 # not the library local path
@@ -163,7 +169,8 @@ def cli(
 
     ######################################
     # setup location for the database file
-    # TODO: handle sqlite as well as duckdb formats
+    # the backend follows the file extension: .sqlite or .sqlite3 for SQLite,
+    # anything else for DuckDB (see db.BACKENDS)
     # TODO: handle connection urls for postgres, mysql, etc
     if not db_file:
         db_file = config.get("db_file", "airtable.duckdb")
@@ -173,7 +180,9 @@ def cli(
     api_key: str | None = os.getenv("AIRTABLE_API_KEY")
     if not api_key:
         raise ValueError("AIRTABLE_API_KEY environment variable is not set.")
-    api_client: ATApi = ATApi(api_key)
+    # e.g. a local airtable_db_export.simulator for end-to-end testing
+    endpoint_url: str = os.getenv("AIRTABLE_ENDPOINT_URL", "https://api.airtable.com")
+    api_client: ATApi = ATApi(api_key, endpoint_url=endpoint_url)
 
     #################################
     # create the context for commands
@@ -192,13 +201,31 @@ def _generate_schema_map(
     api_client: ATApi,
     config: dict,
     schemas_file: Path | str,
+    base_dir: Path | str = "",
+    refresh_schemas: bool = False,
+    engine: str = "sync",
 ) -> None:
     """
     Generate the intermediate mappings from Airtable tables to SQL tables based
     on the config.
+
+    If the config sets schema_cache_ttl, base schemas are cached in its
+    schema_cache_file for that many seconds; refresh_schemas fetches them
+    regardless. Uncached schemas are fetched with the sync or async <engine>.
     """
     click.echo(f"Generating schema mappings to file: {schemas_file}")
-    at.make_schema_json(api_client, config, schemas_file)
+
+    ttl: float = config.get("schema_cache_ttl", 0)
+    cache_file: Path | None = None
+    if ttl:
+        cache_file = ensure_path(
+            config.get("schema_cache_file", "schema_cache.json"),
+            parents_only=True,
+            base_dir=base_dir,
+        )
+    if refresh_schemas:
+        ttl = 0
+    at.make_schema_json(api_client, config, schemas_file, cache_file, ttl, engine)
 
 
 @cli.command("reference-schemas")
@@ -206,12 +233,38 @@ def _generate_schema_map(
     "filename",
     default="reference_schemas.json",
 )
+@click.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=1,
+    help="Number of base schemas to fetch at the same time.",
+)
+@click.option(
+    "--per-base",
+    is_flag=True,
+    default=False,
+    help="""
+Write one file per base into the directory FILENAME (without its extension),
+rewriting only the bases whose schema changed.
+""",
+)
+@click.option(
+    "--max-age",
+    type=click.FloatRange(min=0),
+    default=0,
+    help="With --per-base, skip bases fetched less than this many seconds ago.",
+)
 @click.pass_context
-def archive_schemas(ctx, filename: str = None):
+def archive_schemas(
+    ctx, filename: str = None, jobs: int = 1, per_base: bool = False, max_age=0
+):
     print("ref schemas")
     api_client = ctx.obj["client"]
 
-    at.archive_schemas(api_client, filename)
+    if per_base:
+        filename = Path(filename).with_suffix("")
+    at.archive_schemas(api_client, filename, jobs, per_base, max_age)
 
 
 @cli.command(
@@ -220,7 +273,7 @@ def archive_schemas(ctx, filename: str = None):
 )
 @click.argument("filename")
 def create_config(filename):
-    with open(filename, "w") as f:
+    with open(filename, "w", encoding="utf-8") as f:
         f.write("""
 # EXAMPLE Airtable DB Export config
 
@@ -279,8 +332,23 @@ tables:
 the information needed to map the selected Airtable fields to SQL tables and columns
 """,
 )
+@click.option(
+    "--refresh-schemas",
+    is_flag=True,
+    default=False,
+    help="Fetch base schemas from Airtable even if the schema cache is fresh.",
+)
+@click.option(
+    "--engine",
+    type=click.Choice(at.ENGINES),
+    default="sync",
+    help="""
+Fetch with pyairtable (sync), or with the asyncio engine (async), which keeps
+many requests in flight over pooled connections. async requires httpx.
+""",
+)
 @click.pass_context
-def generate_schema_map(ctx):
+def generate_schema_map(ctx, refresh_schemas: bool, engine: str):
     config = ctx.obj["config"]
 
     base_dir = ctx.obj["base_dir"]
@@ -288,28 +356,268 @@ def generate_schema_map(ctx):
     schemas_file = ensure_path(schemas_file, base_dir=base_dir)
 
     api_client = ctx.obj["client"]
-    _generate_schema_map(api_client, config, schemas_file)
+    _generate_schema_map(
+        api_client, config, schemas_file, base_dir, refresh_schemas, engine
+    )
+
+
+def _iter_spooled(
+    api_client: ATApi,
+    schema: dict[str, t.Any],
+    spool: utils.PageSpool,
+) -> t.Iterator[t.List[dict]]:
+    """
+    Pages of a table, each saved to <spool> before it is passed on.
+
+    Pages saved by an earlier attempt are passed on first, then the listing
+    continues from the saved offset. If Airtable no longer accepts that
+    offset, the spool is emptied and the table is fetched from the start.
+    """
+    table: str = schema["sqltable"]
+    pages: t.Iterator[tuple[list[dict], str | None]] = iter(())
+    if not spool.complete:
+        pages = at.iter_airtable_offsets(api_client, schema, spool.offset)
+        try:
+            # request the next page before replaying, in case the offset expired
+            first = next(pages, None)
+        except at.OffsetExpired:
+            click.echo(f"Saved offset for {table} expired, downloading it again")
+            spool.reset()
+            pages = at.iter_airtable_offsets(api_client, schema)
+            first = next(pages, None)
+        if first is not None:
+            pages = itertools.chain([first], pages)
+
+    if spool.pages:
+        click.echo(f"Resuming {table} after {spool.pages} saved pages")
+    yield from spool
+    for rows, offset in pages:
+        spool.add(rows, offset)
+        yield rows
+
+
+def _download_table(
+    api_client: ATApi,
+    schema: dict[str, t.Any],
+    data_dir: Path | str,
+    writer_classes: t.Sequence[type[utils.TableWriter]],
+    cancelled: threading.Event | None = None,
+    spool_dir: Path | str | None = None,
+    compression: str | None = None,
+) -> None:
+    """
+    Download one table and save it in <data_dir> with each of <writer_classes>,
+    compressed with <compression> if given.
+
+    The table is fetched once; every page is handed to all of the writers.
+
+    If <cancelled> is set while the table is downloading, the download stops
+    and the partial output is discarded.
+
+    With a <spool_dir>, every page is also saved to <spool_dir>/<table> as it
+    arrives, so a failed download continues from its last saved page when it
+    is run again. The spool is deleted once the table's files are written.
+    Sharded tables always start over.
+    """
+    click.echo(
+        f"Loading data from Base: {schema['base']} Table: {schema['airtable']}..."
+    )
+    click.echo(f"Saving data to {schema['sqltable']}...")
+    path = f"{data_dir}/{schema['sqltable']}"
+
+    spool: utils.PageSpool | None = None
+    if spool_dir is not None and schema.get("shards", 1) <= 1:
+        spool = utils.PageSpool(Path(spool_dir) / schema["sqltable"])
+    try:
+        with utils.FanOutWriter(
+            path, writer_classes, schema, compression=compression
+        ) as writer:
+            if spool is not None:
+                pages = _iter_spooled(api_client, schema, spool)
+            else:
+                pages = at.iter_airtable(api_client, schema)
+            for page in pages:
+                if cancelled is not None and cancelled.is_set():
+                    raise utils.DownloadCancelled(schema["sqltable"])
+                writer.write(page)
+    finally:
+        if spool is not None:
+            spool.close()
+    if spool is not None:
+        spool.clear()
+
+
+# directory in <data_dir> where resumable downloads save their pages
+SPOOL_DIR: str = ".spool"
+
+
+class DownloadRun:
+    """
+    The tables finished so far in a resumable download run, kept in
+    <spool_dir>/run.json until every table has been downloaded, so a rerun
+    after a failure skips them.
+    """
+
+    def __init__(self, spool_dir: Path | str):
+        self.spool_dir: Path = Path(spool_dir)
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        self.state_file: Path = self.spool_dir / "run.json"
+        self.finished: list[str] = utils.load_state(self.state_file).get("finished", [])
+        self._lock = threading.Lock()
+
+    def is_finished(
+        self,
+        table: str,
+        data_dir: Path | str,
+        writer_classes: t.Sequence[type[utils.TableWriter]],
+        compression: str | None = None,
+    ) -> bool:
+        """
+        Whether <table> was finished earlier in the run and its files are
+        still there.
+        """
+        return table in self.finished and all(
+            Path(writer_cls.output_path(f"{data_dir}/{table}", compression)).exists()
+            for writer_cls in writer_classes
+        )
+
+    def finish(self, table: str) -> None:
+        with self._lock:
+            self.finished.append(table)
+            utils.save_state(self.state_file, {"finished": self.finished})
+
+    def complete(self) -> None:
+        """
+        End the run, so the next one downloads every table again.
+        """
+        self.state_file.unlink(missing_ok=True)
+
+
+def _download_resumable(
+    api_client: ATApi,
+    schema: dict[str, t.Any],
+    data_dir: Path | str,
+    writer_classes: t.Sequence[type[utils.TableWriter]],
+    run: DownloadRun | None = None,
+    cancelled: threading.Event | None = None,
+    compression: str | None = None,
+) -> None:
+    """
+    _download_table, skipping tables already finished in the <run> and
+    recording the ones that finish now.
+    """
+    if run is None:
+        _download_table(
+            api_client,
+            schema,
+            data_dir,
+            writer_classes,
+            cancelled,
+            compression=compression,
+        )
+        return
+
+    table: str = schema["sqltable"]
+    if run.is_finished(table, data_dir, writer_classes, compression):
+        click.echo(f"Table {table} already downloaded in this run, skipping")
+        return
+    _download_table(
+        api_client,
+        schema,
+        data_dir,
+        writer_classes,
+        cancelled,
+        run.spool_dir,
+        compression,
+    )
+    run.finish(table)
 
 
 def _download_data(
     api_client: ATApi,
     schemas_file: Path | str,
     data_dir: Path | str,
-    save_func: t.Callable,
+    writer_classes: t.Sequence[type[utils.TableWriter]],
+    jobs: int = 1,
+    engine: str = "sync",
+    spool_dir: Path | str | None = None,
+    compression: str | None = None,
 ) -> None:
     """
     Download data from the tables in Airtable defined in <schemas_file> and save
-    in <date_dir> using <save_func>.
+    in <date_dir> using each of <writer_classes>, compressed with <compression>
+    if given.
+
+    Records are written page by page as they arrive, so memory use does not grow
+    with the size of the table.
+
+    With <jobs> > 1, tables are downloaded concurrently. Requests are scheduled
+    per base so each base stays within Airtable's rate limit. With the "async"
+    <engine>, the <jobs> tables share one event loop and connection pool
+    instead of a thread each.
+
+    With a <spool_dir>, the download is resumable: pages are checkpointed
+    there (see _download_table), and a rerun after a failure skips the tables
+    that finished. Not supported by the async engine.
     """
 
     schemas: list[dict[str, t.Any]] = utils.load_schemas(schemas_file)
-    for schema in schemas:
-        click.echo(
-            f"Loading data from Base: {schema['base']} Table: {schema['airtable']}..."
+    if engine == "async":
+        from airtable_db_export import aio
+
+        aio.download_tables(
+            api_client,
+            schemas,
+            data_dir,
+            writer_classes,
+            jobs,
+            compression=compression,
         )
-        data: list[dict[str, t.Any]] = at.load_airtable(api_client, schema)
-        click.echo(f"Saving data to {schema['sqltable']}...")
-        save_func(data, f"{data_dir}/{schema['sqltable']}")
+        return
+
+    run = DownloadRun(spool_dir) if spool_dir is not None else None
+    if jobs <= 1:
+        for schema in schemas:
+            _download_resumable(
+                api_client,
+                schema,
+                data_dir,
+                writer_classes,
+                run,
+                compression=compression,
+            )
+        if run is not None:
+            run.complete()
+        return
+
+    ratelimit.rate_limit(api_client, pool_size=jobs)
+    cancelled = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=jobs)
+    try:
+        futures = [
+            executor.submit(
+                _download_resumable,
+                api_client,
+                schema,
+                data_dir,
+                writer_classes,
+                run,
+                cancelled,
+                compression,
+            )
+            for schema in schemas
+        ]
+        for future in as_completed(futures):
+            # re-raise any download errors
+            future.result()
+    except BaseException:
+        # stop queued tables and abandon the ones in progress
+        cancelled.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+        raise
+    executor.shutdown()
+    if run is not None:
+        run.complete()
 
 
 @cli.command(
@@ -322,15 +630,60 @@ Download Airtable data. Files will be stored in <data_dir>.
     "-f",
     "--format",
     "formats",
-    type=click.Choice(["json", "csv"]),
+    type=click.Choice(list(utils.WRITERS)),
     default=["json"],
     multiple=True,
     help="Formats to export downloaded data as.",
 )
+@click.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=None,
+    help="""
+Number of tables to download at the same time. Defaults to 1, or 20 with
+--engine async.
+""",
+)
+@click.option(
+    "--engine",
+    type=click.Choice(at.ENGINES),
+    default="sync",
+    help="""
+Fetch with pyairtable (sync), or with the asyncio engine (async), which keeps
+many requests in flight over pooled connections. async requires httpx.
+""",
+)
+@click.option(
+    "--resumable",
+    is_flag=True,
+    default=False,
+    help="""
+Save each page to <data_dir>/.spool as it arrives. If the download fails,
+running it again with --resumable skips the tables that finished and continues
+the others from their last saved page. Not supported with --engine async.
+""",
+)
+@click.option(
+    "--compression",
+    type=click.Choice(list(utils.COMPRESSIONS)),
+    default=None,
+    help="""
+Compress JSON, NDJSON and CSV data files as they are written. zstd requires
+zstandard. Parquet files are always compressed.
+""",
+)
 @click.pass_context
-def download_data(ctx, formats: list):
+def download_data(
+    ctx,
+    formats: list,
+    jobs: int,
+    engine: str,
+    resumable: bool,
+    compression: str | None,
+):
     """
-    Download data from Airtable and save as JSON or CSV
+    Download data from Airtable and save as JSON, NDJSON or CSV
     for archive or import into another tool.
     """
     api_client = ctx.obj["client"]
@@ -339,21 +692,30 @@ def download_data(ctx, formats: list):
 
     schemas_file = ctx.obj["schemas_file"]
 
-    fmt_funcmap: dict = {
-        "json": utils.save_table_json,
-        "csv": utils.save_table_csv,
-    }
-
     # fail if schema mapping file has not been created
     schemas_file = ensure_path(schemas_file, base_dir=base_dir, must_exist=True)
 
     data_dir = ctx.obj["data_dir"]
     data_dir = ensure_path(data_dir, base_dir=base_dir)
 
+    if resumable and engine == "async":
+        raise click.UsageError("--resumable cannot be used with --engine async")
+    jobs = jobs or at.ENGINE_JOBS[engine]
+    spool_dir = Path(data_dir) / SPOOL_DIR if resumable else None
+
     click.echo("Downloading data from Airtable...")
-    for fmt in formats:
-        save_func = fmt_funcmap[fmt]
-        _download_data(api_client, schemas_file, data_dir, save_func)
+    # fetch each table once and write every format from the same pages
+    writer_classes = [utils.WRITERS[fmt] for fmt in dict.fromkeys(formats)]
+    _download_data(
+        api_client,
+        schemas_file,
+        data_dir,
+        writer_classes,
+        jobs,
+        engine,
+        spool_dir,
+        compression,
+    )
     click.echo("Downloading data complete")
 
 
@@ -386,16 +748,52 @@ def create_sql(ctx):
     _create_sql(schemas_file, sql_dir)
 
 
+def _applied_schemas_file(db_file: Path | str) -> Path:
+    """
+    Where the schemas the database's tables were last built from are kept.
+    """
+    return Path(f"{db_file}.schemas.json")
+
+
+def _migrate_db(
+    schemas_file: Path | str,
+    db_file: Path | str,
+    previous: Path | str | None = None,
+    dry_run: bool = False,
+) -> list[str]:
+    """
+    ALTER the tables in <db_file> to match <schemas_file>, diffing it against
+    the schemas they were built from (or <previous>). Returns the statements.
+    """
+    previous = previous or _applied_schemas_file(db_file)
+    if not Path(db_file).exists() or not Path(previous).exists():
+        return []
+
+    old_schemas = utils.load_schemas(previous)
+    new_schemas = utils.load_schemas(schemas_file)
+    return db.migrate_db(db_file, old_schemas, new_schemas, dry_run)
+
+
 def _create_db(
     schemas_file: Path | str,
     db_file: Path | str,
     sql_dir: Path | str,
+    previous: Path | str | None = None,
 ) -> None:
-    """ """
+    """
+    Create any missing tables, after migrating existing tables to the current
+    schemas, and record the schemas the database now matches.
+    """
     click.echo(f"Create database in {db_file}")
 
+    if stmts := _migrate_db(schemas_file, db_file, previous):
+        for stmt in stmts:
+            click.echo(stmt)
+        click.echo(f"Migrated existing tables with {len(stmts)} ALTER statements")
+
     schemas = utils.load_schemas(schemas_file)
     db.bootstrap_db(db_file, schemas, sql_dir)
+    utils.save_text(_applied_schemas_file(db_file), json.dumps(schemas, indent=2))
 
 
 @cli.command(
@@ -421,12 +819,110 @@ def create_db(ctx):
     _create_db(schemas_file, db_file, sql_dir)
 
 
-def _load_db(db_file: Path | str, schemas_file: Path | str, data_dir: Path | str):
+@cli.command(
+    "migrate-db",
+    help="""
+Change existing tables to match schemas.json with ALTER TABLE statements,
+keeping their data. Compares against the schemas the database was last
+created or migrated from, or --previous. create-db and all do this
+automatically.
+""",
+)
+@click.option(
+    "--previous",
+    type=click.Path(exists=True, dir_okay=False),
+    help="Previous schemas.json to compare against.",
+)
+@click.option(
+    "--dry-run",
+    is_flag=True,
+    default=False,
+    help="Print the ALTER statements without running them.",
+)
+@click.pass_context
+def migrate_db(ctx, previous: str | None, dry_run: bool):
     """ """
+    base_dir = ctx.obj["base_dir"]
+    schemas_file = ensure_path(
+        ctx.obj["schemas_file"], base_dir=base_dir, must_exist=True
+    )
+    sql_dir = ensure_path(ctx.obj["sql_dir"], base_dir=base_dir, must_exist=True)
+    db_file = ensure_path(ctx.obj["db_file"], parents_only=True, base_dir=base_dir)
+
+    if dry_run:
+        for stmt in _migrate_db(schemas_file, db_file, previous, dry_run=True):
+            click.echo(stmt)
+        return
+
+    _create_db(schemas_file, db_file, sql_dir, previous)
+
+
+def _table_inputs(
+    schema: dict[str, t.Any],
+    sql_dir: Path | str,
+    data_dir: Path | str,
+    fmt: str = "json",
+    compression: str | None = None,
+) -> dict[str, str | None]:
+    """
+    Content hashes of the files a table is loaded from, for the run manifest.
+    """
+    table = schema["sqltable"]
+    return {
+        "create_sql": utils.file_hash(f"{sql_dir}/create_{table}.sql"),
+        "data": utils.file_hash(utils.data_file(data_dir, table, fmt, compression)),
+    }
+
+
+def _load_db(
+    db_file: Path | str,
+    schemas_file: Path | str,
+    data_dir: Path | str,
+    fmt: str = "json",
+    refresh: bool = False,
+    manifest: dict[str, t.Any] | None = None,
+    sql_dir: Path | str = "",
+    compression: str | None = None,
+):
+    """
+    Load the data files in <fmt> format, compressed with <compression> if
+    given, into the database.
+
+    With a run <manifest>, tables whose CREATE DDL and data file hashes match
+    the last successful load, and whose row count is unchanged since, are not
+    loaded again. The manifest is updated with the tables that were loaded.
+    """
     schemas = utils.load_schemas(schemas_file)
+
+    if manifest is not None:
+        loaded: dict[str, t.Any] = manifest.setdefault("tables", {})
+        inputs = {
+            s["sqltable"]: _table_inputs(s, sql_dir, data_dir, fmt, compression)
+            for s in schemas
+        }
+        counts = db.table_counts(db_file, inputs)
+        unchanged = {
+            table
+            for table in inputs
+            if loaded.get(table) == {**inputs[table], "rows": counts[table]}
+        }
+        for table in unchanged:
+            click.echo(f"Table {table} unchanged, skipping load")
+        schemas = [s for s in schemas if s["sqltable"] not in unchanged]
+        if not schemas:
+            return
+
     # load create tables
     click.echo("Load database")
-    db.load_db(db_file, schemas, data_dir)
+    if refresh:
+        db.refresh_db(db_file, schemas, data_dir, fmt, compression)
+    else:
+        db.load_db(db_file, schemas, data_dir, fmt, compression)
+
+    if manifest is not None:
+        counts = db.table_counts(db_file, [s["sqltable"] for s in schemas])
+        for table, rows in counts.items():
+            loaded[table] = {**inputs[table], "rows": rows}
 
 
 @cli.command(
@@ -435,8 +931,33 @@ def _load_db(db_file: Path | str, schemas_file: Path | str, data_dir: Path | str
 Load JSON data from Airtable into the database.
 """,
 )
+@click.option(
+    "-f",
+    "--format",
+    "fmt",
+    type=click.Choice(list(db.READERS)),
+    default="json",
+    help="Format of the downloaded data files to load.",
+)
+@click.option(
+    "--refresh",
+    is_flag=True,
+    default=False,
+    help="""
+Replace the data in existing tables: load into staging tables, then swap them
+in together in one transaction. A failed load leaves the current data as is.
+""",
+)
+@click.option(
+    "--compression",
+    type=click.Choice(list(utils.COMPRESSIONS)),
+    default=None,
+    help="""
+Compression of the JSON, NDJSON and CSV data files to load.
+""",
+)
 @click.pass_context
-def load_db(ctx):
+def load_db(ctx, fmt: str, refresh: bool, compression: str | None):
     """ """
     base_dir = ctx.obj["base_dir"]
 
@@ -451,13 +972,421 @@ def load_db(ctx):
         db_file, parents_only=True, base_dir=base_dir, must_exist=True
     )
 
-    _load_db(db_file, schemas_file, data_dir)
+    _load_db(db_file, schemas_file, data_dir, fmt, refresh, compression=compression)
+
+
+# re-fetch a little before the last watermark to allow for clock skew
+SYNC_OVERLAP = timedelta(minutes=1)
+
+
+def _sync(
+    api_client: ATApi,
+    schemas_file: Path | str,
+    data_dir: Path | str,
+    db_file: Path | str,
+    state_file: Path | str,
+    full: bool = False,
+) -> None:
+    """
+    Fetch records modified since each table's last sync and upsert them into
+    the database. Watermarks are kept per table in <state_file>.
+    """
+    schemas: list[dict[str, t.Any]] = utils.load_schemas(schemas_file)
+    state: dict[str, t.Any] = {} if full else utils.load_state(state_file)
+
+    for schema in schemas:
+        table: str = schema["sqltable"]
+        started = datetime.now(timezone.utc) - SYNC_OVERLAP
+
+        options: dict[str, t.Any] = {}
+        if since := state.get(table, {}).get("watermark"):
+            click.echo(f"Syncing {table}: records modified since {since}...")
+            options["formula"] = at.modified_since_formula(since)
+        else:
+            click.echo(f"Syncing {table}: all records...")
+
+        with utils.JSONWriter(f"{data_dir}/{table}.sync") as writer:
+            for page in at.iter_airtable(api_client, schema, **options):
+                writer.write(page)
+
+        if writer.rows_written:
+            click.echo(f"Upserting {writer.rows_written} records into {table}")
+            db.upsert_table(db_file, schema, writer.path)
+        Path(writer.path).unlink()
+
+        # only advance the watermark once the rows are in the database
+        state[table] = {
+            "watermark": started.isoformat(timespec="seconds").replace("+00:00", "Z")
+        }
+        utils.save_state(state_file, state)
+
+
+def _delete_missing(
+    api_client: ATApi,
+    schemas_file: Path | str,
+    db_file: Path | str,
+) -> None:
+    """
+    Remove rows from the database whose records were deleted in Airtable.
+
+    Only record IDs are fetched, then compared against each table's id column.
+    """
+    schemas: list[dict[str, t.Any]] = utils.load_schemas(schemas_file)
+    for schema in schemas:
+        table: str = schema["sqltable"]
+        click.echo(f"Checking {table} for deleted records...")
+        ids: list[str] = []
+        for page in at.iter_record_ids(api_client, schema):
+            ids.extend(page)
+
+        if not ids:
+            # never empty a table because of an empty or failed listing
+            click.echo(f"No records found in Airtable for {table}, skipping")
+            continue
+
+        deleted = db.delete_missing(db_file, schema, ids)
+        click.echo(f"Deleted {deleted} records from {table}")
+
+
+@cli.command(
+    "sync",
+    help="""
+Incrementally update the database with records modified in Airtable since the
+last sync. The first sync of a table fetches every record.
+""",
+)
+@click.option(
+    "--state-file",
+    default="",
+    help="""
+File that stores the last sync time of each table. Defaults to the config's
+<state_file>, or sync_state.json. Relative to <base_dir>.
+""",
+)
+@click.option(
+    "--full",
+    is_flag=True,
+    default=False,
+    help="Ignore saved sync state and upsert every record.",
+)
+@click.option(
+    "--deletes",
+    is_flag=True,
+    default=False,
+    help="Also delete rows whose records no longer exist in Airtable.",
+)
+@click.pass_context
+def sync(ctx, state_file: str, full: bool, deletes: bool):
+    """ """
+    config = ctx.obj["config"]
+    base_dir = ctx.obj["base_dir"]
+    api_client = ctx.obj["client"]
+
+    schemas_file = ensure_path(
+        ctx.obj["schemas_file"], base_dir=base_dir, must_exist=True
+    )
+    sql_dir = ensure_path(ctx.obj["sql_dir"], base_dir=base_dir, must_exist=True)
+    data_dir = ensure_path(ctx.obj["data_dir"], base_dir=base_dir)
+    db_file = ensure_path(ctx.obj["db_file"], parents_only=True, base_dir=base_dir)
+
+    if not state_file:
+        state_file = config.get("state_file", "sync_state.json")
+    state_file = ensure_path(state_file, parents_only=True, base_dir=base_dir)
+
+    # make sure the tables exist before upserting into them
+    _create_db(schemas_file, db_file, sql_dir)
+    _sync(api_client, schemas_file, data_dir, db_file, state_file, full)
+    if deletes:
+        _delete_missing(api_client, schemas_file, db_file)
 
 
-@cli.command()
+def _load_direct(
+    api_client: ATApi,
+    schemas_file: Path | str,
+    db_file: Path | str,
+    data_dir: Path | str,
+    archive_classes: t.Sequence[type[utils.TableWriter]] = (),
+    compression: str | None = None,
+) -> None:
+    """
+    Stream each table from Airtable straight into the database, without the
+    JSON file round trip. If <archive_classes> are given, the same pages are
+    also saved to <data_dir> in those formats, compressed with <compression>
+    if given.
+    """
+    schemas: list[dict[str, t.Any]] = utils.load_schemas(schemas_file)
+    with db.dbconn(db_file) as conn:
+        for schema in schemas:
+            table: str = schema["sqltable"]
+            click.echo(
+                f"Loading {table} from Base: {schema['base']} "
+                f"Table: {schema['airtable']}..."
+            )
+            pages = at.iter_airtable(api_client, schema)
+            if archive_classes:
+                path = f"{data_dir}/{table}"
+                with utils.FanOutWriter(
+                    path, archive_classes, schema, compression=compression
+                ) as writer:
+                    rows = db.load_table_pages(
+                        conn, schema, utils.tee_pages(pages, writer)
+                    )
+            else:
+                rows = db.load_table_pages(conn, schema, pages)
+            click.echo(f"Loaded {rows} records into {table}")
+
+
+def _pipeline_all(
+    api_client: ATApi,
+    schemas_file: Path | str,
+    data_dir: Path | str,
+    sql_dir: Path | str,
+    db_file: Path | str,
+    jobs: int = 1,
+    refresh: bool = False,
+    manifest: dict[str, t.Any] | None = None,
+    max_pending: int = 2,
+    engine: str = "sync",
+    spool_dir: Path | str | None = None,
+    compression: str | None = None,
+    fmt: str = "json",
+) -> None:
+    """
+    Download, create and load every table in <schemas_file>, one table at a
+    time through each stage, so tables are loaded while others download.
+
+    Up to <jobs> tables are fetched at once, on threads or, with the "async"
+    <engine>, on one event loop; each is transformed and written to
+    <data_dir> page by page (see _download_table). As each table's file is
+    complete it is handed to the database stage, which creates and loads it on
+    a single connection. At most <max_pending> downloaded tables wait to be
+    loaded; downloads pause while the database stage catches up.
+
+    Existing tables are migrated before the pipeline starts. With <refresh>,
+    tables are loaded into staging tables and swapped in together once all of
+    them have loaded. With a run <manifest>, unchanged tables are skipped as in
+    _load_db. With a <spool_dir>, downloads are resumable as in _download_data.
+    The data files are written in <fmt> format, with <compression> if given.
+    """
+    schemas: list[dict[str, t.Any]] = utils.load_schemas(schemas_file)
+    writer_classes = [utils.WRITERS[fmt]]
+
+    click.echo(f"Create database in {db_file}")
+    if stmts := _migrate_db(schemas_file, db_file):
+        for stmt in stmts:
+            click.echo(stmt)
+        click.echo(f"Migrated existing tables with {len(stmts)} ALTER statements")
+
+    if jobs > 1:
+        ratelimit.rate_limit(api_client, pool_size=jobs)
+    cancelled = threading.Event()
+    # (schema, error) for each table whose download finished
+    ready: queue.Queue = queue.Queue(maxsize=max_pending)
+    run = DownloadRun(spool_dir) if spool_dir is not None else None
+
+    def fetch(schema: dict[str, t.Any]) -> None:
+        try:
+            _download_resumable(
+                api_client,
+                schema,
+                data_dir,
+                writer_classes,
+                run,
+                cancelled,
+                compression,
+            )
+        except BaseException as e:
+            ready.put((schema, e))
+            raise
+        ready.put((schema, None))
+
+    loaded: dict[str, t.Any] = {}
+    if manifest is not None:
+        loaded = manifest.setdefault("tables", {})
+
+    # open the database first, so a locked database fails before any download
+    with db.dbconn(db_file) as conn:
+        executor = ThreadPoolExecutor(max_workers=jobs)
+        if engine == "async":
+            from airtable_db_export import aio
+
+            futures = [
+                executor.submit(
+                    aio.download_tables,
+                    api_client,
+                    schemas,
+                    data_dir,
+                    writer_classes,
+                    jobs,
+                    cancelled,
+                    lambda schema, error: ready.put((schema, error)),
+                    compression,
+                )
+            ]
+        else:
+            futures = [executor.submit(fetch, schema) for schema in schemas]
+        staged: list[tuple[str, str]] = []
+        try:
+            for _ in schemas:
+                schema, error = ready.get()
+                if error is not None:
+                    raise error
+
+                table: str = schema["sqltable"]
+                inputs = _table_inputs(schema, sql_dir, data_dir, fmt, compression)
+                db.create_table(conn, schema, sql_dir)
+                if manifest is not None and loaded.get(table) == {
+                    **inputs,
+                    "rows": db.table_count(conn, table),
+                }:
+                    click.echo(f"Table {table} unchanged, skipping load")
+                    continue
+
+                path = utils.data_file(data_dir, table, fmt, compression)
+                if refresh:
+                    staged.append((table, f"{table}{db.STAGING_SUFFIX}"))
+                    db.stage_table(conn, schema, path, fmt)
+                else:
+                    db.load_table(conn, schema, path, fmt)
+                loaded[table] = inputs
+
+            if staged:
+                db.swap_tables(conn, staged)
+            # record row counts once the loaded tables are live
+            for table, inputs in loaded.items():
+                if manifest is not None and "rows" not in inputs:
+                    loaded[table] = {**inputs, "rows": db.table_count(conn, table)}
+
+        except BaseException:
+            db.drop_staging(conn, staged)
+            # stop queued tables, then let running downloads hand over and exit
+            cancelled.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+            while not all(future.done() for future in futures):
+                try:
+                    ready.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            raise
+        finally:
+            executor.shutdown()
+
+    if run is not None:
+        run.complete()
+    utils.save_text(_applied_schemas_file(db_file), json.dumps(schemas, indent=2))
+
+
+@cli.command("all")
+@click.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=None,
+    help="""
+Number of tables to download at the same time. Defaults to 1, or 20 with
+--engine async.
+""",
+)
+@click.option(
+    "-f",
+    "--format",
+    "fmt",
+    type=click.Choice(list(db.READERS)),
+    default="json",
+    help="""
+Format of the data files to download and load. ndjson is compact and faster
+to write and load than json's indented array.
+""",
+)
+@click.option(
+    "--direct",
+    is_flag=True,
+    default=False,
+    help="""
+Load records straight into the database without writing data files first.
+Requires pyarrow for DuckDB databases. --jobs is not used in this mode.
+""",
+)
+@click.option(
+    "-a",
+    "--archive",
+    "archive_formats",
+    type=click.Choice(list(utils.WRITERS)),
+    multiple=True,
+    help="With --direct, also save the downloaded data in these formats.",
+)
+@click.option(
+    "--refresh",
+    is_flag=True,
+    default=False,
+    help="""
+Replace the data in existing tables: load into staging tables, then swap them
+in together in one transaction. A failed load leaves the current data as is.
+""",
+)
+@click.option(
+    "--refresh-schemas",
+    is_flag=True,
+    default=False,
+    help="Fetch base schemas from Airtable even if the schema cache is fresh.",
+)
+@click.option(
+    "--engine",
+    type=click.Choice(at.ENGINES),
+    default="sync",
+    help="""
+Fetch with pyairtable (sync), or with the asyncio engine (async), which keeps
+many requests in flight over pooled connections. async requires httpx.
+--direct always uses the sync engine.
+""",
+)
+@click.option(
+    "--resumable",
+    is_flag=True,
+    default=False,
+    help="""
+Save each page to <data_dir>/.spool as it arrives. If the download fails,
+running it again with --resumable skips the tables that finished and continues
+the others from their last saved page. Not supported with --engine async.
+""",
+)
+@click.option(
+    "--compression",
+    type=click.Choice(list(utils.COMPRESSIONS)),
+    default=None,
+    help="""
+Compress the downloaded data files (and --archive files) as they are written.
+zstd requires zstandard. Parquet files are always compressed.
+""",
+)
+@click.option(
+    "--force",
+    is_flag=True,
+    default=False,
+    help="Run every phase for every table, ignoring the run manifest.",
+)
 @click.pass_context
-def all(ctx):
+def all_cmd(
+    ctx,
+    jobs: int,
+    fmt: str,
+    direct: bool,
+    archive_formats: list,
+    refresh: bool,
+    refresh_schemas: bool,
+    engine: str,
+    resumable: bool,
+    compression: str | None,
+    force: bool,
+):
     """ """
+    if direct and refresh:
+        raise click.UsageError("--refresh cannot be used with --direct")
+    if direct and resumable:
+        raise click.UsageError("--resumable cannot be used with --direct")
+    if resumable and engine == "async":
+        raise click.UsageError("--resumable cannot be used with --engine async")
+
     config = ctx.obj["config"]
 
     db_file = ctx.obj["db_file"]
@@ -476,16 +1405,57 @@ def all(ctx):
     sql_dir = ensure_path(sql_dir, base_dir=base_dir)
     db_file = ensure_path(db_file, parents_only=True, base_dir=base_dir)
 
+    # hashes of each phase's inputs at the last successful run
+    manifest_file = ensure_path(
+        config.get("manifest_file", "manifest.json"),
+        parents_only=True,
+        base_dir=base_dir,
+    )
+    manifest: dict[str, t.Any] = {} if force else utils.load_state(manifest_file)
+
     # update airtable schema
-    _generate_schema_map(api_client, config, schemas_file)
+    _generate_schema_map(
+        api_client, config, schemas_file, base_dir, refresh_schemas, engine
+    )
     # generate sql schemas
-    _create_sql(schemas_file, sql_dir)
-    # fetch airtable data
-    _download_data(api_client, schemas_file, data_dir, utils.save_table_json)
-    # build db
-    _create_db(schemas_file, db_file, sql_dir)
-    # load db
-    _load_db(db_file, schemas_file, data_dir)
+    schemas_hash = utils.file_hash(schemas_file)
+    missing_sql = [
+        s["sqltable"]
+        for s in utils.load_schemas(schemas_file)
+        if not (Path(sql_dir) / f"create_{s['sqltable']}.sql").exists()
+    ]
+    if schemas_hash == manifest.get("schemas") and not missing_sql:
+        click.echo("Schema mappings unchanged, skipping CREATE DDL")
+    else:
+        _create_sql(schemas_file, sql_dir)
+
+    if direct:
+        _create_db(schemas_file, db_file, sql_dir)
+        archive_classes = [utils.WRITERS[fmt] for fmt in dict.fromkeys(archive_formats)]
+        _load_direct(
+            api_client, schemas_file, db_file, data_dir, archive_classes, compression
+        )
+        return
+
+    jobs = jobs or at.ENGINE_JOBS[engine]
+    # fetch airtable data, and create and load each table as it arrives
+    _pipeline_all(
+        api_client,
+        schemas_file,
+        data_dir,
+        sql_dir,
+        db_file,
+        jobs,
+        refresh=refresh,
+        manifest=manifest,
+        engine=engine,
+        spool_dir=Path(data_dir) / SPOOL_DIR if resumable else None,
+        compression=compression,
+        fmt=fmt,
+    )
+
+    manifest["schemas"] = schemas_hash
+    utils.save_state(manifest_file, manifest)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,228 @@
+import asyncio
+import logging
+import re
+import threading
+import time
+import typing as t
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+from requests.adapters import HTTPAdapter
+
+if t.TYPE_CHECKING:
+    from pyairtable import Api as ATApi
+    from requests import PreparedRequest, Response
+
+
+logger = logging.getLogger(__name__)
+
+
+# Airtable allows 5 requests per second, per base
+AIRTABLE_RATE_LIMIT: float = 5.0
+
+# Airtable asks clients to wait 30 seconds after a 429
+AIRTABLE_RETRY_AFTER: float = 30.0
+
+BASE_ID_RE = re.compile(r"/(app[A-Za-z0-9]+)")
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket with adaptive (AIMD) rate.
+
+    Each acquire() takes one token, blocking until one is available. On a 429,
+    penalize() halves the rate and pauses the bucket; each success afterwards
+    adds a little rate back until max_rate is reached again.
+    """
+
+    def __init__(
+        self,
+        rate: float = AIRTABLE_RATE_LIMIT,
+        capacity: float = 1.0,
+        min_rate: float = 0.5,
+        increase: float = 0.1,
+        clock: t.Callable[[], float] = time.monotonic,
+        sleep: t.Callable[[float], None] = time.sleep,
+    ):
+        self.max_rate: float = rate
+        self.rate: float = rate
+        self.min_rate: float = min_rate
+        self.increase: float = increase
+        self.capacity: float = capacity
+        self.tokens: float = capacity
+        self.paused_until: float = 0.0
+
+        self._clock = clock
+        self._sleep = sleep
+        self._updated: float = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = max(0.0, now - self._updated)
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self._updated = now
+
+    def _take(self) -> float:
+        """
+        Take a token if one is available. Returns 0, or how long to wait
+        before trying again.
+        """
+        with self._lock:
+            now = self._clock()
+            wait = self.paused_until - now
+            if wait > 0:
+                return wait
+            self._refill(now)
+            # allow for float error in the refill arithmetic
+            if self.tokens >= 1 - 1e-9:
+                self.tokens = max(0.0, self.tokens - 1)
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self) -> None:
+        """
+        Take a token, sleeping until one is available.
+        """
+        while wait := self._take():
+            self._sleep(wait)
+
+    async def acquire_async(self) -> None:
+        """
+        Take a token, yielding to the event loop until one is available.
+        """
+        while wait := self._take():
+            await asyncio.sleep(wait)
+
+    def penalize(self, retry_after: float = AIRTABLE_RETRY_AFTER) -> None:
+        """
+        Back off after a 429: halve the rate and pause for <retry_after> seconds.
+        """
+        with self._lock:
+            now = self._clock()
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.paused_until = max(self.paused_until, now + retry_after)
+            self.tokens = 0
+            self._updated = self.paused_until
+
+    def reward(self) -> None:
+        """
+        Record a successful request, recovering rate after a backoff.
+        """
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+
+class RateLimiter:
+    """
+    Scheduler that shares one TokenBucket per Airtable base between threads.
+    """
+
+    def __init__(self, rate: float = AIRTABLE_RATE_LIMIT, **bucket_kwargs):
+        self.rate: float = rate
+        self.bucket_kwargs: dict[str, t.Any] = bucket_kwargs
+        self.buckets: dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, base_id: str) -> TokenBucket:
+        with self._lock:
+            if base_id not in self.buckets:
+                self.buckets[base_id] = TokenBucket(self.rate, **self.bucket_kwargs)
+            return self.buckets[base_id]
+
+
+def base_id_for_url(url: str) -> str | None:
+    """
+    Find the base ID in an Airtable API URL, if there is one.
+    """
+    match = BASE_ID_RE.search(urlparse(url).path)
+    return match.group(1) if match else None
+
+
+def parse_retry_after(value: str | None) -> float:
+    """
+    Seconds to wait from a Retry-After header, in either its delta-seconds or
+    HTTP-date form. Falls back to AIRTABLE_RETRY_AFTER if missing or invalid.
+    """
+    if not value:
+        return AIRTABLE_RETRY_AFTER
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return AIRTABLE_RETRY_AFTER
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    """
+    requests adapter that waits for a token from the base's bucket before each
+    request, and retries 429 responses after backing off.
+    """
+
+    def __init__(self, limiter: RateLimiter, max_attempts: int = 5, **kwargs):
+        self.limiter: RateLimiter = limiter
+        self.max_attempts: int = max_attempts
+        super().__init__(**kwargs)
+
+    def send(self, request: "PreparedRequest", **kwargs) -> "Response":
+        base_id = base_id_for_url(request.url or "")
+        if base_id is None:
+            return super().send(request, **kwargs)
+
+        bucket = self.limiter.bucket(base_id)
+        for attempt in range(1, self.max_attempts + 1):
+            bucket.acquire()
+            response = super().send(request, **kwargs)
+            if response.status_code != 429:
+                bucket.reward()
+                return response
+
+            if attempt == self.max_attempts:
+                logger.warning(
+                    f"Rate limited on base {base_id}, giving up after {attempt} attempts"
+                )
+                break
+
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            logger.warning(
+                f"Rate limited on base {base_id}, backing off {retry_after}s"
+            )
+            bucket.penalize(retry_after)
+
+        return response
+
+
+def rate_limit(
+    api_client: "ATApi",
+    limiter: RateLimiter | None = None,
+    pool_size: int = 10,
+) -> RateLimiter:
+    """
+    Route all requests made by <api_client> through a shared RateLimiter.
+
+    The limiter's adapter replaces pyairtable's retrying adapter, so 429s are
+    handled by the per-base scheduler instead of a fixed backoff. If the client
+    is already rate limited, the mounted limiter is reused so its backoff state
+    carries over between calls.
+    """
+    mounted = api_client.session.adapters.get("https://")
+    if isinstance(mounted, RateLimitedAdapter) and limiter in (None, mounted.limiter):
+        return mounted.limiter
+
+    limiter = limiter or RateLimiter()
+    adapter = RateLimitedAdapter(
+        limiter, pool_connections=pool_size, pool_maxsize=pool_size
+    )
+    for prefix in ("https://", "http://"):
+        if old := api_client.session.adapters.get(prefix):
+            old.close()
+        api_client.session.mount(prefix, adapter)
+    return limiter
@@ -0,0 +1,397 @@
+"""
+Local stand-in for the Airtable Web API, for end-to-end and throughput testing.
+
+Serves the base list, base schema and list records endpoints from fixture
+bases, with offset pagination, per-request latency and per-base 429 rate
+limiting. Point ADBE at it with the AIRTABLE_ENDPOINT_URL environment variable:
+
+    python -m airtable_db_export.simulator tests/sample_bases --port 8765
+    AIRTABLE_ENDPOINT_URL=http://127.0.0.1:8765 adbe all
+
+A fixture base is a JSON file:
+
+    {
+        "id": "appSimulated00001",
+        "name": "Simulated",
+        "tables": [
+            {
+                "id": "tblContacts000001",
+                "name": "Contacts",
+                "primaryFieldId": "fldName0000000001",
+                "fields": [ ... Airtable field schemas ... ],
+                "views": [{"id": "viw...", "name": "Grid view", "type": "grid"}],
+                "records": [ ... Airtable records ... ],
+                "generate": 1000
+            }
+        ]
+    }
+
+"records" and "generate" are both optional; "generate" adds that many
+synthetic records with a value for every field. A view may list "recordIds"
+to restrict the records it returns.
+"""
+
+import argparse
+import collections
+import json
+import logging
+import re
+import threading
+import time
+import typing as t
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, unquote, urlparse
+
+logger = logging.getLogger(__name__)
+
+
+# filterByFormula expressions the simulator can evaluate, as
+# (pattern, predicate factory); anything else matches every record
+FORMULAS: list[tuple[re.Pattern, t.Callable[..., t.Callable[[dict], bool]]]] = [
+    (
+        re.compile(r"IS_AFTER\(LAST_MODIFIED_TIME\(\), DATETIME_PARSE\('([^']+)'\)\)"),
+        lambda since: (
+            lambda rec: (
+                _parse_time(rec.get("lastModifiedTime", rec["createdTime"]))
+                > _parse_time(since)
+            )
+        ),
+    ),
+    (
+        re.compile(r"FIND\(RIGHT\(RECORD_ID\(\), 1\), '([^']*)'\) > 0"),
+        lambda chars: lambda rec: rec["id"][-1:] in chars,
+    ),
+]
+
+
+def _parse_time(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def _sample_value(field: dict[str, t.Any], i: int) -> t.Any:
+    """
+    A plausible cell value for record <i> of a synthetic table.
+    """
+    ftype: str = field["type"]
+    options: dict[str, t.Any] = field.get("options") or {}
+    choices = [c["name"] for c in options.get("choices", [])] or ["One"]
+
+    if ftype in ("number", "autoNumber", "count"):
+        return i
+    if ftype == "currency":
+        return round(i * 1.25, 2)
+    if ftype == "checkbox":
+        return bool(i % 2)
+    if ftype == "dateTime":
+        return f"2024-01-01T00:00:{i % 60:02d}.000Z"
+    if ftype == "email":
+        return f"user{i}@example.com"
+    if ftype == "singleSelect":
+        return choices[i % len(choices)]
+    if ftype == "multipleSelects":
+        return choices[: 1 + i % len(choices)]
+    if ftype == "multipleRecordLinks":
+        if options.get("prefersSingleRecordLink"):
+            return [f"rec{i:014d}"]
+        return [f"rec{i:014d}", f"rec{i + 1:014d}"]
+    if ftype == "multipleLookupValues":
+        return [f"lookup {i}"]
+    if ftype == "formula":
+        return f"formula {i}"
+    return f"{field['name']} {i}"
+
+
+def generate_records(table: dict[str, t.Any], count: int) -> list[dict]:
+    """
+    <count> synthetic records with a value for every field of <table>.
+    """
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    records = []
+    for i in range(count):
+        created = (start + timedelta(minutes=i)).isoformat(timespec="milliseconds")
+        records.append(
+            {
+                "id": f"rec{table['id'][3:9]}{i:08d}",
+                "createdTime": created.replace("+00:00", "Z"),
+                "fields": {f["name"]: _sample_value(f, i) for f in table["fields"]},
+            }
+        )
+    return records
+
+
+def load_fixtures(*paths: Path | str) -> dict[str, dict[str, t.Any]]:
+    """
+    Load fixture bases from JSON files, or directories of them, keyed by base ID.
+    """
+    bases: dict[str, dict[str, t.Any]] = {}
+    for path in map(Path, paths):
+        files = sorted(path.glob("*.json")) if path.is_dir() else [path]
+        for fixture in files:
+            with open(fixture, "r", encoding="utf-8") as f:
+                base = json.load(f)
+            for table in base["tables"]:
+                table.setdefault("views", [])
+                table["records"] = table.get("records", []) + generate_records(
+                    table, table.pop("generate", 0)
+                )
+            bases[base["id"]] = base
+    return bases
+
+
+class AirtableSimulator(ThreadingHTTPServer):
+    """
+    HTTP server that behaves like the parts of the Airtable API ADBE uses.
+
+    latency: seconds added to every request
+    rate_limit: requests per second allowed per base (0 for no limit)
+    retry_after: Retry-After seconds sent with a 429
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        bases: dict[str, dict[str, t.Any]],
+        address: tuple[str, int] = ("127.0.0.1", 0),
+        latency: float = 0.0,
+        rate_limit: float = 5.0,
+        retry_after: float = 1.0,
+    ):
+        super().__init__(address, _Handler)
+        self.bases = bases
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.stats: collections.Counter = collections.Counter()
+        self._requests: dict[str, collections.deque] = collections.defaultdict(
+            collections.deque
+        )
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> threading.Thread:
+        """
+        Serve requests on a background thread.
+        """
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+    def allow(self, base_id: str) -> bool:
+        """
+        Count a request against the base's one second window.
+        """
+        if not self.rate_limit:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            window = self._requests[base_id]
+            while window and now - window[0] >= 1.0:
+                window.popleft()
+            if len(window) >= self.rate_limit:
+                self.stats["rate_limited"] += 1
+                return False
+            window.append(now)
+            return True
+
+    def find_table(self, base_id: str, id_or_name: str) -> dict[str, t.Any] | None:
+        base = self.bases.get(base_id)
+        if base is None:
+            return None
+        for table in base["tables"]:
+            if id_or_name in (table["id"], table["name"]):
+                return table
+        return None
+
+
+def _select_records(table: dict[str, t.Any], params: dict[str, t.Any]) -> list[dict]:
+    records: list[dict] = table["records"]
+
+    if view_name := params.get("view"):
+        for view in table["views"]:
+            if view_name in (view["id"], view["name"]) and "recordIds" in view:
+                ids = set(view["recordIds"])
+                records = [r for r in records if r["id"] in ids]
+
+    if formula := params.get("filterByFormula"):
+        for pattern, predicate in FORMULAS:
+            if match := pattern.fullmatch(formula.strip()):
+                keep = predicate(*match.groups())
+                records = [r for r in records if keep(r)]
+                break
+        else:
+            logger.warning(f"Unsupported formula, returning all records: {formula}")
+
+    for sort in reversed(params.get("sort", [])):
+        records = sorted(
+            records,
+            key=lambda r: str(r["fields"].get(sort["field"], "")),
+            reverse=sort.get("direction") == "desc",
+        )
+
+    if max_records := params.get("maxRecords"):
+        records = records[: int(max_records)]
+
+    return records
+
+
+def _project(record: dict, table: dict[str, t.Any], params: dict[str, t.Any]) -> dict:
+    fields: dict[str, t.Any] = record["fields"]
+    if wanted := params.get("fields"):
+        by_id = {f["id"]: f["name"] for f in table["fields"]}
+        names = {by_id.get(w, w) for w in wanted}
+        fields = {k: v for k, v in fields.items() if k in names}
+    if params.get("returnFieldsByFieldId"):
+        by_name = {f["name"]: f["id"] for f in table["fields"]}
+        fields = {by_name.get(k, k): v for k, v in fields.items()}
+    return {"id": record["id"], "createdTime": record["createdTime"], "fields": fields}
+
+
+def _query_params(query: str) -> dict[str, t.Any]:
+    """
+    Convert GET query params to the shape of a listRecords POST body.
+    """
+    raw = parse_qs(query, keep_blank_values=True)
+    params: dict[str, t.Any] = {k: v[-1] for k, v in raw.items() if "[" not in k}
+    params["fields"] = raw.get("fields[]", [])
+    params["returnFieldsByFieldId"] = params.get("returnFieldsByFieldId") in (
+        "1",
+        "true",
+    )
+
+    sorts: dict[int, dict[str, str]] = collections.defaultdict(dict)
+    for key, values in raw.items():
+        if match := re.fullmatch(r"sort\[(\d+)\]\[(\w+)\]", key):
+            sorts[int(match.group(1))][match.group(2)] = values[-1]
+    params["sort"] = [sorts[i] for i in sorted(sorts)]
+    return params
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: AirtableSimulator
+
+    def log_message(self, format: str, *args: t.Any) -> None:
+        logger.debug(format % args)
+
+    def _send(self, status: int, body: t.Any, headers: dict | None = None) -> None:
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _error(self, status: int, error_type: str, message: str = "") -> None:
+        self._send(status, {"error": {"type": error_type, "message": message}})
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        self._dispatch("GET", url.path, _query_params(url.query))
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        self._dispatch("POST", urlparse(self.path).path, body)
+
+    def _dispatch(self, method: str, path: str, params: dict[str, t.Any]) -> None:
+        server = self.server
+        server.stats["requests"] += 1
+        if server.latency:
+            time.sleep(server.latency)
+
+        parts = [unquote(p) for p in path.strip("/").split("/")]
+        if parts[:1] != ["v0"]:
+            return self._error(404, "NOT_FOUND")
+        parts = parts[1:]
+
+        if parts == ["meta", "bases"]:
+            bases = [
+                {"id": b["id"], "name": b["name"], "permissionLevel": "create"}
+                for b in server.bases.values()
+            ]
+            return self._send(200, {"bases": bases})
+
+        base_id = parts[2] if parts[:2] == ["meta", "bases"] else parts[0]
+        if base_id not in server.bases:
+            return self._error(404, "NOT_FOUND", f"Base {base_id} not found")
+        if not server.allow(base_id):
+            return self._send(
+                429,
+                {"errors": [{"error": "RATE_LIMIT_REACHED"}]},
+                {"Retry-After": str(server.retry_after)},
+            )
+
+        if parts[:2] == ["meta", "bases"] and parts[3:] == ["tables"]:
+            tables = [
+                {k: v for k, v in table.items() if k != "records"}
+                for table in server.bases[base_id]["tables"]
+            ]
+            return self._send(200, {"tables": tables})
+
+        is_list = (method == "GET" and len(parts) == 2) or (
+            method == "POST" and len(parts) == 3 and parts[2] == "listRecords"
+        )
+        table = server.find_table(base_id, parts[1]) if len(parts) > 1 else None
+        if not is_list or table is None:
+            return self._error(404, "NOT_FOUND")
+
+        self._list_records(table, params)
+
+    def _list_records(self, table: dict[str, t.Any], params: dict[str, t.Any]) -> None:
+        records = _select_records(table, params)
+        page_size = min(int(params.get("pageSize") or 100), 100)
+        try:
+            start = int(params.get("offset") or 0)
+        except ValueError:
+            # Airtable's answer to an offset it no longer (or never) issued
+            return self._error(422, "LIST_RECORDS_ITERATOR_NOT_AVAILABLE")
+        page = records[start : start + page_size]
+
+        body: dict[str, t.Any] = {"records": [_project(r, table, params) for r in page]}
+        if start + page_size < len(records):
+            body["offset"] = str(start + page_size)
+
+        self.server.stats["records"] += len(page)
+        self._send(200, body)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Serve fixture bases as a local Airtable API."
+    )
+    parser.add_argument("fixtures", nargs="+", help="Fixture base files or dirs.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=5.0)
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    args = parser.parse_args()
+
+    server = AirtableSimulator(
+        load_fixtures(*args.fixtures),
+        (args.host, args.port),
+        latency=args.latency,
+        rate_limit=args.rate_limit,
+        retry_after=args.retry_after,
+    )
+    print(f"Serving {len(server.bases)} bases at {server.url}")
+    print(f"  export AIRTABLE_ENDPOINT_URL={server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"{server.stats['requests']} requests served")
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
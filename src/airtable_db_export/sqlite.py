@@ -0,0 +1,384 @@
+"""
+SQLite database backend.
+
+Implements the connection-level functions of db (create_table, load_table,
+stage_table, ...) for SQLite databases, which db uses for database files with
+a SQLite extension (see db.BACKENDS).
+
+Data files are read in Python and inserted with executemany, in one
+transaction per table, with synchronous=OFF and the WAL journal while the
+connection is open. Key indexes are dropped before a bulk load and built
+after it, which is much faster than maintaining them row by row.
+
+Array (TEXT[]) columns hold JSON array text, which SQLite's JSON functions
+can query, e.g. SELECT value FROM things, json_each(things.tags).
+"""
+
+import itertools
+import json
+import re
+import sqlite3
+import typing as t
+from contextlib import contextmanager
+from pathlib import Path
+
+from airtable_db_export import db, utils
+
+# rows inserted per executemany call
+BATCH_ROWS: int = 10_000
+
+# DuckDB's true strings, for BOOLEAN columns
+TRUE_STRINGS: frozenset[str] = frozenset({"true", "t", "1", "yes", "y"})
+
+
+@contextmanager
+def dbconn(dbfile: Path | str):
+    """
+    Connect to a SQLite database, tuned for bulk loading.
+
+    Transactions are managed explicitly. Durability is traded for load speed
+    with synchronous=OFF: the WAL journal keeps the database consistent if the
+    process dies, but a power loss can lose or corrupt the last load.
+
+    The database is switched back to the default rollback journal on close,
+    so the file can be shipped on its own, unless another connection still
+    has it open.
+    """
+    conn = sqlite3.connect(dbfile, isolation_level=None)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    # 256 MiB page cache, for building indexes after a load
+    conn.execute("PRAGMA cache_size = -262144")
+    yield conn
+    try:
+        conn.execute("PRAGMA journal_mode = DELETE")
+    except sqlite3.OperationalError:
+        pass
+    conn.close()
+
+
+@contextmanager
+def transaction(conn: sqlite3.Connection):
+    conn.execute("BEGIN")
+    try:
+        yield conn
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def translate_create(sql: str) -> str:
+    """
+    Adapt a CREATE TABLE statement written for DuckDB (see db.make_table_create)
+    to SQLite. Array types become TEXT, holding JSON arrays, and primary keys
+    and unique constraints are dropped; create_indexes builds them as unique
+    indexes instead.
+    """
+    sql = re.sub(r"\b\w+(\s*\[\])+", "TEXT", sql)
+    return re.sub(r"\s+(primary\s+key|unique)\b", "", sql, flags=re.I)
+
+
+def key_columns(schema: t.Dict[str, t.Any]) -> t.List[str]:
+    """
+    The schema's primary key and unique columns.
+    """
+    return [
+        col["sqlcolumn"]
+        for col in schema["columns"]
+        if re.search(r"\b(primary\s+key|unique)\b", col.get("extra", ""), re.I)
+    ]
+
+
+def _index_name(
+    conn: sqlite3.Connection,
+    schema: t.Dict[str, t.Any],
+    table: str,
+    column: str,
+) -> str:
+    # a staging table's indexes keep their names when it is swapped in, so
+    # alternate between two names to never clash with the live table's
+    base: str = f"{schema['sqltable']}_{column}_key"
+    names: list[str] = [base, f"{base}_2"]
+    for name in names:
+        owner = conn.execute(
+            "SELECT tbl_name FROM sqlite_master WHERE type = 'index' AND name = ?",
+            (name,),
+        ).fetchone()
+        if owner is None or owner[0] == table:
+            return name
+    return names[0]
+
+
+def create_indexes(
+    conn: sqlite3.Connection,
+    schema: t.Dict[str, t.Any],
+    table: str | None = None,
+) -> None:
+    """
+    Build a unique index on each of the schema's key columns of <table>
+    (default the schema's sqltable).
+    """
+    table = table or schema["sqltable"]
+    for column in key_columns(schema):
+        name: str = _index_name(conn, schema, table, column)
+        conn.execute(
+            f'CREATE UNIQUE INDEX IF NOT EXISTS "{name}" ON {table} ("{column}")'
+        )
+
+
+def drop_indexes(conn: sqlite3.Connection, table: str) -> None:
+    """
+    Drop the indexes created on <table> with CREATE INDEX.
+    """
+    indexes = conn.execute(f"PRAGMA index_list({table})").fetchall()
+    for _, name, _, origin, _ in indexes:
+        if origin == "c":
+            conn.execute(f'DROP INDEX "{name}"')
+
+
+def create_table(
+    conn: sqlite3.Connection,
+    schema: t.Dict[str, t.Any],
+    sql_dir: Path | str = "sql",
+) -> None:
+    """
+    Run the schema's create table file, adapted by translate_create, and
+    build its key indexes.
+    """
+    with open(f"{sql_dir}/create_{schema['sqltable']}.sql", "r", encoding="utf-8") as f:
+        sql = f.read()
+    with transaction(conn):
+        conn.execute(translate_create(sql))
+        create_indexes(conn, schema)
+
+
+def _to_bool(value: t.Any) -> bool | None:
+    if value is None or isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        return value.strip().lower() in TRUE_STRINGS
+    return bool(value)
+
+
+def _compile_row(schema: t.Dict[str, t.Any]) -> t.Callable[[dict], list]:
+    """
+    Compile the schema into a function that turns a row into the values of
+    its columns, in schema order, as SQLite stores them: arrays and objects
+    as JSON text, and BOOLEAN columns as 0 or 1.
+    """
+    dumps = utils.get_serializer()
+
+    def to_json(value: t.Any) -> t.Any:
+        return dumps(value) if isinstance(value, (list, dict)) else value
+
+    converters: list[tuple[str, t.Callable[[t.Any], t.Any]]] = [
+        (
+            col["sqlcolumn"],
+            _to_bool if col["sqltype"].upper() == "BOOLEAN" else to_json,
+        )
+        for col in schema["columns"]
+    ]
+
+    def values(row: dict) -> list:
+        return [convert(row.get(column)) for column, convert in converters]
+
+    return values
+
+
+def insert_rows(
+    conn: sqlite3.Connection,
+    schema: t.Dict[str, t.Any],
+    rows: t.Iterable[dict],
+    table: str | None = None,
+    replace: bool = False,
+    batch_rows: int = BATCH_ROWS,
+) -> int:
+    """
+    Insert <rows> into <table> (default the schema's sqltable) with
+    executemany, <batch_rows> at a time. With <replace>, rows with an existing
+    key are replaced. Call within a transaction.
+
+    Returns the number of rows inserted.
+    """
+    table = table or schema["sqltable"]
+    columns: str = ", ".join(f'"{col["sqlcolumn"]}"' for col in schema["columns"])
+    params: str = ", ".join("?" for _ in schema["columns"])
+    verb: str = "INSERT OR REPLACE" if replace else "INSERT"
+    sql: str = f"{verb} INTO {table} ({columns}) VALUES ({params})"
+
+    values = _compile_row(schema)
+    inserted: int = 0
+    rows = iter(rows)
+    while batch := [values(row) for row in itertools.islice(rows, batch_rows)]:
+        conn.executemany(sql, batch)
+        inserted += len(batch)
+    return inserted
+
+
+def read_rows(path: Path | str, fmt: str = "json") -> t.Iterator[dict]:
+    """
+    The rows of a data file in <fmt> format, compressed or not (see
+    utils.COMPRESSIONS).
+    """
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches():
+            yield from batch.to_pylist()
+        return
+
+    with utils.open_compressed(path, "rt", utils.path_compression(path)) as f:
+        if fmt == "ndjson":
+            yield from (json.loads(line) for line in f if line.strip())
+        else:
+            yield from json.load(f)
+
+
+def _bulk_load(
+    conn: sqlite3.Connection,
+    schema: t.Dict[str, t.Any],
+    rows: t.Iterable[dict],
+    table: str | None = None,
+) -> int:
+    table = table or schema["sqltable"]
+    with transaction(conn):
+        drop_indexes(conn, table)
+        inserted = insert_rows(conn, schema, rows, table)
+        create_indexes(conn, schema, table)
+    return inserted
+
+
+def load_table(
+    conn: sqlite3.Connection,
+    schema: t.Dict[str, t.Any],
+    path: Path | str,
+    fmt: str = "json",
+    replace: bool = False,
+) -> None:
+    """
+    Load one data file in <fmt> format into the schema's table, in one
+    transaction. Key indexes are rebuilt after the rows are inserted, unless
+    rows are upserted with <replace>, which needs them.
+    """
+    print(f"Loading table {schema['sqltable']} from {path}")
+    if replace:
+        with transaction(conn):
+            insert_rows(conn, schema, read_rows(path, fmt), replace=True)
+    else:
+        _bulk_load(conn, schema, read_rows(path, fmt))
+
+
+def table_count(conn: sqlite3.Connection, table: str) -> int | None:
+    """
+    Row count of <table>, or None if it does not exist.
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).fetchone()
+    if exists is None:
+        return None
+    return conn.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+
+
+def stage_table(
+    conn: sqlite3.Connection,
+    schema: t.Dict[str, t.Any],
+    path: Path | str,
+    fmt: str = "json",
+) -> str:
+    """
+    Load a data file into a new staging table next to the schema's table, to
+    be swapped in by swap_tables. Returns the staging table name.
+    """
+    staging: str = f"{schema['sqltable']}{db.STAGING_SUFFIX}"
+    print(f"Loading table {staging} from {path}")
+    conn.execute(f"DROP TABLE IF EXISTS {staging}")
+    conn.execute(translate_create(db.make_table_create(schema, table=staging)))
+    _bulk_load(conn, schema, read_rows(path, fmt), staging)
+    return staging
+
+
+def swap_tables(
+    conn: sqlite3.Connection,
+    staged: t.List[tuple[str, str]],
+) -> None:
+    """
+    Replace each (table, staging) table with its staging table, all in one
+    transaction.
+    """
+    print("Swapping in refreshed tables")
+    with transaction(conn):
+        for table, staging in staged:
+            conn.execute(f"DROP TABLE IF EXISTS {table}")
+            conn.execute(f"ALTER TABLE {staging} RENAME TO {table}")
+
+
+def drop_staging(
+    conn: sqlite3.Connection,
+    staged: t.List[tuple[str, str]],
+) -> None:
+    """
+    Drop the staging tables of a failed refresh.
+    """
+    for _, staging in staged:
+        conn.execute(f"DROP TABLE IF EXISTS {staging}")
+
+
+def load_table_pages(
+    conn: sqlite3.Connection,
+    schema: t.Dict[str, t.Any],
+    pages: t.Iterable[t.List[dict]],
+    batch_rows: int = BATCH_ROWS,
+) -> int:
+    """
+    Insert pages of transformed rows straight into the schema's table, without
+    writing a data file. Unlike DuckDB, this needs no pyarrow.
+
+    Returns the number of rows inserted.
+    """
+    rows = itertools.chain.from_iterable(pages)
+    return _bulk_load(conn, schema, rows)
+
+
+def run_migration(conn: sqlite3.Connection, stmts: t.List[str]) -> t.List[str]:
+    """
+    Run migration statements (see db.make_table_migration) in one transaction.
+    Returns the statements run.
+
+    SQLite columns have a type affinity rather than a fixed type, so column
+    type changes are skipped; existing values are kept as they are.
+    """
+    executed: list[str] = []
+    with transaction(conn):
+        for stmt in stmts:
+            if re.search(r"\bALTER\s+COLUMN\b.*\bTYPE\b", stmt, re.I):
+                continue
+            conn.execute(stmt)
+            executed.append(stmt)
+    return executed
+
+
+def delete_missing_ids(
+    conn: sqlite3.Connection,
+    schema: t.Dict[str, t.Any],
+    ids: t.Iterable[str],
+) -> int:
+    """
+    Delete rows whose id is not in <ids> from the schema's table.
+
+    Returns the number of rows deleted.
+    """
+    with transaction(conn):
+        conn.execute("CREATE TEMP TABLE adbe_seen_ids (id TEXT PRIMARY KEY)")
+        conn.executemany(
+            "INSERT OR IGNORE INTO adbe_seen_ids VALUES (?)",
+            ((record_id,) for record_id in ids),
+        )
+        deleted = conn.execute(
+            f"DELETE FROM {schema['sqltable']}\n"
+            f"WHERE id NOT IN (SELECT id FROM adbe_seen_ids)"
+        ).rowcount
+        conn.execute("DROP TABLE adbe_seen_ids")
+    return deleted
@@ -1,6 +1,15 @@
+import abc
 import csv
+import functools
+import gzip
+import io
 from collections.abc import KeysView
+import hashlib
 import json
+import os
+import queue
+import shutil
+import threading
 import typing as t
 from pathlib import Path
 
@@ -8,12 +17,15 @@ import duckdb
 import pandas as pd
 import yaml
 
+if t.TYPE_CHECKING:
+    import pyarrow as pa
+
 
 def load_config(path: Path | str) -> dict:
     """
     Load config file
     """
-    with open(path, "r") as f:
+    with open(path, "r", encoding="utf-8") as f:
         return yaml.safe_load(f)
 
 
@@ -21,14 +33,54 @@ def load_schemas(path: Path | str = "schemas.json") -> list[dict[str, t.Any]]:
     """
     Load schemas from schemas.json file
     """
-    return json.load(open(path, "r"))
+    return json.load(open(path, "r", encoding="utf-8"))
+
+
+def load_state(path: Path | str) -> dict[str, t.Any]:
+    """
+    Load a JSON state file (sync state, schema cache), or an empty state if
+    the file does not exist yet.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_state(path: Path | str, state: dict[str, t.Any]) -> None:
+    """
+    Save a JSON state file, replacing the previous file atomically.
+    """
+    save_text(path, json.dumps(state, indent=2))
+
+
+def save_text(path: Path | str, content: str) -> None:
+    """
+    Write a text file, replacing the previous file atomically.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def file_hash(path: Path | str) -> str | None:
+    """
+    SHA-256 hex digest of a file's contents, or None if it does not exist.
+    """
+    try:
+        with open(path, "rb") as f:
+            return hashlib.file_digest(f, "sha256").hexdigest()
+    except FileNotFoundError:
+        return None
 
 
 def load_dataframe(conn: duckdb.DuckDBPyConnection, path: str) -> pd.DataFrame:
     """
     Load data from Duckdb connection.
     """
-    with open(path, "r") as sql:
+    with open(path, "r", encoding="utf-8") as sql:
         stmt: str = sql.read()
         df = conn.sql(stmt).to_df()
 
@@ -39,40 +91,667 @@ def load_data(conn: duckdb.DuckDBPyConnection, path: str) -> duckdb.DuckDBPyRela
     """
     Load data from Duckdb
     """
-    with open(path, "r") as sql:
+    with open(path, "r", encoding="utf-8") as sql:
         stmt: str = sql.read()
         rel = conn.sql(stmt)
 
     return rel
 
 
-def save_table_json(data: list[dict], path: str) -> None:
+# file extension of each data file compression
+COMPRESSIONS: dict[str, str] = {
+    "gzip": ".gz",
+    "zstd": ".zst",
+}
+
+
+def path_compression(path: Path | str) -> str | None:
+    """
+    The compression of a data file, from its extension.
+    """
+    for compression, extension in COMPRESSIONS.items():
+        if str(path).endswith(extension):
+            return compression
+    return None
+
+
+def open_compressed(
+    path: Path | str,
+    mode: str = "wt",
+    compression: str | None = None,
+    **kwargs: t.Any,
+) -> t.IO:
+    """
+    Open a file, streaming it through <compression> ("gzip" or "zstd") if
+    given. Text is UTF-8. zstd requires zstandard (pip install
+    airtable-db-export[zstd]).
+    """
+    if "b" not in mode:
+        kwargs.setdefault("encoding", "utf-8")
+    if compression is None:
+        return open(path, mode.replace("t", ""), **kwargs)
+    if compression == "gzip":
+        # zlib's default level: much faster than gzip's 9, nearly as small.
+        # No timestamp in the header, so the same data always has the same
+        # file_hash (see the run manifest).
+        binary = gzip.GzipFile(path, mode.replace("t", ""), compresslevel=6, mtime=0)
+        return binary if "b" in mode else io.TextIOWrapper(binary, **kwargs)
+    if compression == "zstd":
+        try:
+            import zstandard
+        except ImportError as e:
+            raise ImportError(
+                "zstd compression requires zstandard: "
+                "pip install airtable-db-export[zstd]"
+            ) from e
+        return zstandard.open(path, mode, **kwargs)
+    raise ValueError(f"Unknown compression {compression}")
+
+
+# JSON serializers, fastest first; json (the standard library) is always there
+SERIALIZERS: tuple[str, ...] = ("orjson", "msgspec", "json")
+
+
+@functools.cache
+def get_serializer(name: str = "auto") -> t.Callable[..., str]:
+    """
+    A function serializing a value to JSON text: compact, or indented by two
+    spaces if called with indent=True. Non-ASCII text is written as is.
+
+    <name> is one of SERIALIZERS, or "auto" for the fastest one installed.
+    orjson is installed by pip install airtable-db-export[fast].
+    """
+    if name == "auto":
+        for candidate in SERIALIZERS:
+            try:
+                return get_serializer(candidate)
+            except ImportError:
+                pass
+
+    if name == "orjson":
+        try:
+            import orjson
+        except ImportError as e:
+            raise ImportError(
+                "The orjson serializer requires orjson: "
+                "pip install airtable-db-export[fast]"
+            ) from e
+
+        def dumps_orjson(value: t.Any, indent: bool = False) -> str:
+            option = orjson.OPT_INDENT_2 if indent else 0
+            return orjson.dumps(value, option=option).decode()
+
+        return dumps_orjson
+
+    if name == "msgspec":
+        try:
+            import msgspec
+        except ImportError as e:
+            raise ImportError(
+                "The msgspec serializer requires msgspec: pip install msgspec"
+            ) from e
+
+        def dumps_msgspec(value: t.Any, indent: bool = False) -> str:
+            data = msgspec.json.encode(value)
+            if indent:
+                data = msgspec.json.format(data, indent=2)
+            return data.decode()
+
+        return dumps_msgspec
+
+    if name == "json":
+
+        def dumps_json(value: t.Any, indent: bool = False) -> str:
+            if indent:
+                return json.dumps(value, indent=2, ensure_ascii=False)
+            return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+        return dumps_json
+
+    raise ValueError(f"Unknown serializer {name}")
+
+
+class TableWriter(abc.ABC):
+    """
+    Base class for incremental table writers.
+
+    Rows are written one page at a time with write(), so a table never has to
+    be held in memory in full. Output goes to <path>.tmp and is moved into place
+    on close(), so a failed download never replaces a previous good file.
+    Writers are context managers; leaving the block with an exception calls
+    abort() instead of close().
+
+    Text formats can be compressed as they are written (see COMPRESSIONS);
+    the compression's extension is added to the path.
+    """
+
+    extension: str = ""
+    compressible: bool = True
+
+    def __init__(
+        self,
+        path: Path | str,
+        schema: dict[str, t.Any] | None = None,
+        compression: str | None = None,
+    ):
+        self.path: str = self.output_path(path, compression)
+        self.schema: dict[str, t.Any] | None = schema
+        self.compression: str | None = compression if self.compressible else None
+        self.tmp_path: str = f"{self.path}.tmp"
+        self.rows_written: int = 0
+        self._file: t.IO = self._open()
+
+    @classmethod
+    def output_path(cls, path: Path | str, compression: str | None = None) -> str:
+        """
+        The file this writer class writes for <path>.
+        """
+        path = str(path)
+        if not path.endswith(cls.extension):
+            path += cls.extension
+        if compression and cls.compressible:
+            path += COMPRESSIONS[compression]
+        return path
+
+    def _open(self) -> t.IO:
+        return open_compressed(self.tmp_path, "wt", self.compression)
+
+    def __enter__(self) -> "TableWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    @abc.abstractmethod
+    def write(self, rows: t.Iterable[dict]) -> None: ...
+
+    def _finish(self) -> None:
+        """
+        Write anything needed to complete the file before it is closed.
+        """
+
+    def close(self) -> None:
+        """
+        Finish the file and move it into place.
+        """
+        self._finish()
+        self._file.close()
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self) -> None:
+        """
+        Discard the partial output, leaving any previous file untouched.
+        """
+        self._file.close()
+        Path(self.tmp_path).unlink(missing_ok=True)
+
+
+class _JSONRowsWriter(TableWriter):
+    """
+    Base class for the JSON writers, which serialize rows with <serializer>
+    (see get_serializer).
+    """
+
+    def __init__(
+        self,
+        path: Path | str,
+        schema: dict[str, t.Any] | None = None,
+        compression: str | None = None,
+        serializer: str = "auto",
+    ):
+        self.dumps: t.Callable[..., str] = get_serializer(serializer)
+        super().__init__(path, schema, compression)
+
+
+class JSONWriter(_JSONRowsWriter):
+    """
+    Write table data as a JSON array.
+
+    Output is equivalent to json.dump(data, f, indent=2, ensure_ascii=False),
+    and identical to it with the json serializer; other serializers may format
+    numbers differently.
+    """
+
+    extension = ".json"
+
+    def write(self, rows: t.Iterable[dict]) -> None:
+        # one write per page; indented JSON has no blank lines, so prefixing
+        # every line matches textwrap.indent
+        parts: list[str] = []
+        for row in rows:
+            parts.append("[\n  " if not self.rows_written else ",\n  ")
+            parts.append(self.dumps(row, indent=True).replace("\n", "\n  "))
+            self.rows_written += 1
+        self._file.write("".join(parts))
+
+    def _finish(self) -> None:
+        self._file.write("\n]" if self.rows_written else "[]")
+
+
+class NDJSONWriter(_JSONRowsWriter):
+    """
+    Write table data as compact newline-delimited JSON, one record per line.
+
+    Smaller and faster to write than JSONWriter's indented array, and DuckDB
+    can read it in parallel.
+    """
+
+    extension = ".ndjson"
+
+    def write(self, rows: t.Iterable[dict]) -> None:
+        lines: list[str] = [self.dumps(row) for row in rows]
+        if lines:
+            self._file.write("\n".join(lines) + "\n")
+            self.rows_written += len(lines)
+
+
+class CSVWriter(TableWriter):
+    """
+    Write table data as CSV. The header is taken from the first row written;
+    a table with no rows produces an empty file.
+    """
+
+    extension = ".csv"
+
+    def __init__(
+        self,
+        path: Path | str,
+        schema: dict[str, t.Any] | None = None,
+        compression: str | None = None,
+    ):
+        self._writer: csv.DictWriter | None = None
+        super().__init__(path, schema, compression)
+
+    def _open(self) -> t.IO:
+        return open_compressed(self.tmp_path, "wt", self.compression, newline="")
+
+    def write(self, rows: t.Iterable[dict]) -> None:
+        for row in rows:
+            if self._writer is None:
+                fieldnames: KeysView = row.keys()
+                self._writer = csv.DictWriter(
+                    self._file, fieldnames=fieldnames, quoting=csv.QUOTE_NONNUMERIC
+                )
+                self._writer.writeheader()
+            self._writer.writerow(row)
+            self.rows_written += 1
+
+
+def arrow_type(sqltype: str) -> "pa.DataType":
+    """
+    Arrow type for a SQL column type from schemas.json.
+    """
+    import pyarrow as pa
+
+    sqltype = sqltype.upper()
+    if sqltype.endswith("[]"):
+        return pa.list_(arrow_type(sqltype[:-2]))
+
+    return {
+        "BOOLEAN": pa.bool_(),
+        "INTEGER": pa.int64(),
+        "BIGINT": pa.int64(),
+        "FLOAT": pa.float64(),
+        "DOUBLE": pa.float64(),
+        # naive UTC, like DuckDB's TIMESTAMP
+        "TIMESTAMP": pa.timestamp("ms"),
+    }.get(sqltype, pa.string())
+
+
+def arrow_schema(schema: dict[str, t.Any]) -> "pa.Schema":
+    """
+    Arrow schema for a table, from the sqlcolumn/sqltype of its columns.
+    """
+    import pyarrow as pa
+
+    return pa.schema(
+        [(c["sqlcolumn"], arrow_type(c["sqltype"])) for c in schema["columns"]]
+    )
+
+
+def arrow_table(rows: list[dict], schema: "pa.Schema") -> "pa.Table":
+    """
+    Build a typed Arrow table from transformed rows.
+
+    Values are converted with Arrow's safe casts. Raises ValueError, naming the
+    column, for values that do not fit its type without losing data (e.g. 2.7
+    in an INTEGER column). String columns take other values as JSON text, as
+    the JSON data files load them (e.g. attachment and collaborator objects).
+    """
+    import pyarrow as pa
+
+    dumps = get_serializer()
+    errors = (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError)
+    arrays = []
+    for field in schema:
+        values = [row.get(field.name) for row in rows]
+        if pa.types.is_string(field.type):
+            values = [
+                v if v is None or isinstance(v, str) else dumps(v) for v in values
+            ]
+        try:
+            try:
+                # let Arrow infer, then cast, so lossy values are caught
+                array = pa.array(values)
+            except errors:
+                array = pa.array(values, type=field.type)
+            if pa.types.is_timestamp(field.type) and pa.types.is_string(array.type):
+                # Airtable timestamps are UTC with a "Z" suffix
+                array = array.cast(pa.timestamp(field.type.unit, tz="UTC"))
+            arrays.append(array.cast(field.type, safe=True))
+        except (*errors, TypeError) as e:
+            raise ValueError(
+                f"Column {field.name}: values do not fit {field.type}: {e}"
+            ) from e
+
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+class ParquetWriter(TableWriter):
+    """
+    Write table data as Parquet, typed from the schema's sqltype columns.
+
+    Rows are buffered into row groups of <row_group_size> so memory stays
+    bounded. Requires pyarrow (pip install airtable-db-export[parquet]).
+    Parquet is always zstd-compressed internally, so <compression> is ignored.
+    """
+
+    extension = ".parquet"
+    compressible = False
+    row_group_size: int = 10_000
+
+    def __init__(
+        self,
+        path: Path | str,
+        schema: dict[str, t.Any] | None = None,
+        compression: str | None = None,
+    ):
+        if schema is None:
+            raise ValueError("ParquetWriter requires the table schema")
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError(
+                "Parquet output requires pyarrow: "
+                "pip install airtable-db-export[parquet]"
+            ) from e
+
+        self._rows: list[dict] = []
+        self._arrow_schema = arrow_schema(schema)
+        super().__init__(path, schema, compression)
+        self._writer = pq.ParquetWriter(
+            self._file, self._arrow_schema, compression="zstd"
+        )
+
+    def _open(self) -> t.IO:
+        return open(self.tmp_path, "wb")
+
+    def _flush(self) -> None:
+        if self._rows:
+            self._writer.write_table(arrow_table(self._rows, self._arrow_schema))
+            self._rows = []
+
+    def write(self, rows: t.Iterable[dict]) -> None:
+        for row in rows:
+            self._rows.append(row)
+            self.rows_written += 1
+            if len(self._rows) >= self.row_group_size:
+                self._flush()
+
+    def _finish(self) -> None:
+        self._flush()
+        self._writer.close()
+
+    def abort(self) -> None:
+        self._rows = []
+        self._writer.close()
+        super().abort()
+
+
+def tee_pages(
+    pages: t.Iterable[t.List[dict]],
+    writer: "TableWriter | FanOutWriter",
+) -> t.Iterator[t.List[dict]]:
+    """
+    Pass pages through unchanged, writing each one to <writer> on the way.
+    """
+    for page in pages:
+        writer.write(page)
+        yield page
+
+
+WRITERS: dict[str, type[TableWriter]] = {
+    "json": JSONWriter,
+    "ndjson": NDJSONWriter,
+    "csv": CSVWriter,
+    "parquet": ParquetWriter,
+}
+
+
+def data_file(
+    data_dir: Path | str,
+    table: str,
+    fmt: str = "json",
+    compression: str | None = None,
+) -> str:
     """
-    Save table data to a JSON file.
+    Path of <table>'s data file in <fmt> format in <data_dir>.
     """
-    if not path.endswith(".json"):
-        path += ".json"
+    return WRITERS[fmt].output_path(f"{data_dir}/{table}", compression)
 
-    with open(path, "w") as f:
-        json.dump(data, f, indent=2)
 
+class PageSpool:
+    """
+    Durable on-disk record of the pages of one table download, so that a
+    failed download can continue where it stopped.
 
-def save_table_csv(data: list[dict], path: str) -> None:
+    Pages are appended to <path>/pages.ndjson, one JSON array of rows per
+    line, and synced to disk. Only then is <path>/checkpoint.json updated
+    with the number of pages, the file size and the offset to continue the
+    listing from. Anything past the checkpointed size is discarded on open.
     """
-    Save table data to a CSV file.
+
+    def __init__(self, path: Path | str):
+        self.path: Path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.pages_file: Path = self.path / "pages.ndjson"
+        self.checkpoint_file: Path = self.path / "checkpoint.json"
+        self.checkpoint: dict[str, t.Any] = load_state(self.checkpoint_file)
+
+        self._file: t.IO = open(self.pages_file, "ab")
+        # drop a page written after the last checkpoint
+        self._file.truncate(self.checkpoint.get("size", 0))
+        self._file.seek(0, os.SEEK_END)
+
+    @property
+    def offset(self) -> str | None:
+        """
+        Offset to continue the listing from, or None to start at the beginning.
+        """
+        return self.checkpoint.get("offset")
+
+    @property
+    def pages(self) -> int:
+        return self.checkpoint.get("pages", 0)
+
+    @property
+    def complete(self) -> bool:
+        """
+        Whether the last page of the listing has been saved.
+        """
+        return self.pages > 0 and self.offset is None
+
+    def __iter__(self) -> t.Iterator[list[dict]]:
+        """
+        The pages saved so far.
+        """
+        with open(self.pages_file, "rb") as f:
+            for _ in range(self.pages):
+                yield json.loads(f.readline())
+
+    def add(self, rows: list[dict], offset: str | None) -> None:
+        """
+        Save a page, and the <offset> that follows it.
+        """
+        self._file.write(get_serializer()(rows).encode())
+        self._file.write(b"\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.checkpoint = {
+            "pages": self.pages + 1,
+            "size": self._file.tell(),
+            "offset": offset,
+        }
+        save_state(self.checkpoint_file, self.checkpoint)
+
+    def reset(self) -> None:
+        """
+        Discard every saved page, to start the listing over.
+        """
+        self._file.truncate(0)
+        self._file.seek(0)
+        self.checkpoint = {}
+        save_state(self.checkpoint_file, self.checkpoint)
+
+    def close(self) -> None:
+        self._file.close()
+
+    def clear(self) -> None:
+        """
+        Delete the spool, once its pages are no longer needed.
+        """
+        self._file.close()
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+class DownloadCancelled(Exception):
+    """
+    Raised inside a table download when another table in the run has failed.
+    """
+
+
+class FanOutWriter:
+    """
+    Write the same stream of pages to several table writers.
+
+    Each writer runs on its own thread, fed by a bounded queue of pages, so a
+    slow writer does not hold up fetching the next page until its queue is
+    full. Output is only published (each writer closed) if every writer
+    succeeded; otherwise all of them are aborted.
     """
-    if not path.endswith(".csv"):
-        path += ".csv"
 
-    if not data:
-        # Create an empty CSV file if no data
-        with open(path, "w") as f:
-            pass
-        return
+    _DONE = object()
 
-    fieldnames: KeysView = data[0].keys()
+    def __init__(
+        self,
+        path: Path | str,
+        writer_classes: t.Sequence[type[TableWriter]],
+        schema: dict[str, t.Any] | None = None,
+        max_pages: int = 4,
+        compression: str | None = None,
+    ):
+        self.writers: list[TableWriter] = []
+        try:
+            for writer_cls in writer_classes:
+                self.writers.append(writer_cls(path, schema, compression))
+        except BaseException:
+            for writer in self.writers:
+                writer.abort()
+            raise
 
-    with open(path, "w", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames, quoting=csv.QUOTE_NONNUMERIC)
-        writer.writeheader()
-        writer.writerows(data)
+        self.errors: list[BaseException] = []
+        self._queues: list[queue.Queue] = [
+            queue.Queue(maxsize=max_pages) for _ in self.writers
+        ]
+        self._threads: list[threading.Thread] = [
+            threading.Thread(target=self._run, args=(writer, q), daemon=True)
+            for writer, q in zip(self.writers, self._queues)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _run(self, writer: TableWriter, pages: queue.Queue) -> None:
+        failed = False
+        while (page := pages.get()) is not self._DONE:
+            # keep draining after a failure so the producer never blocks
+            if failed:
+                continue
+            try:
+                writer.write(page)
+            except BaseException as e:
+                failed = True
+                self.errors.append(e)
+
+    def __enter__(self) -> "FanOutWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write(self, rows: t.List[dict]) -> None:
+        if self.errors:
+            raise self.errors[0]
+        for pages in self._queues:
+            pages.put(rows)
+
+    def _join(self) -> None:
+        for pages in self._queues:
+            pages.put(self._DONE)
+        for thread in self._threads:
+            thread.join()
+
+    def close(self) -> None:
+        """
+        Wait for all writers to finish, then publish their files.
+        """
+        self._join()
+        if self.errors:
+            self._abort_writers()
+            raise self.errors[0]
+        for writer in self.writers:
+            writer.close()
+
+    def abort(self) -> None:
+        """
+        Wait for all writers to stop, then discard their output.
+        """
+        self._join()
+        self._abort_writers()
+
+    def _abort_writers(self) -> None:
+        for writer in self.writers:
+            writer.abort()
+
+
+def save_table_json(
+    data: list[dict], path: str, compression: str | None = None
+) -> None:
+    """
+    Save table data to a JSON file, optionally compressed.
+    """
+    with JSONWriter(path, compression=compression) as writer:
+        writer.write(data)
+
+
+def save_table_ndjson(
+    data: list[dict], path: str, compression: str | None = None
+) -> None:
+    """
+    Save table data to a newline-delimited JSON file, optionally compressed.
+    """
+    with NDJSONWriter(path, compression=compression) as writer:
+        writer.write(data)
+
+
+def save_table_csv(data: list[dict], path: str, compression: str | None = None) -> None:
+    """
+    Save table data to a CSV file, optionally compressed.
+    """
+    with CSVWriter(path, compression=compression) as writer:
+        writer.write(data)
@@ -3,8 +3,15 @@
 import pytest
 from pathlib import Path
 import json
+from pyairtable import Api
 from pyairtable.models import schema as schemas
 
+from airtable_db_export.fake import FakeApi
+from airtable_db_export.simulator import AirtableSimulator, load_fixtures
+
+# the base in tests/sample_bases
+BASE_ID = "appSimulated00001"
+
 
 def load_sample_data(path: Path | str):
     path: Path = Path(path)
@@ -48,3 +55,105 @@ def load_field():
         return schemas.parse_field_schema(sample_data[fixt])
 
     return _load_field
+
+
+@pytest.fixture
+def sample_schema():
+    return {
+        "base": "app123",
+        "basename": "Test Base",
+        "airtable": "Things",
+        "sqltable": "things",
+        "columns": [
+            {
+                "field": None,
+                "type": None,
+                "sqlcolumn": "id",
+                "sqltype": "varchar",
+                "extra": "primary key",
+            },
+            {
+                "field": "Name",
+                "type": "singleLineText",
+                "sqlcolumn": "name",
+                "sqltype": "VARCHAR",
+            },
+            {
+                "field": "Done",
+                "type": "formula",
+                "sqlcolumn": "done",
+                "sqltype": "BOOLEAN",
+            },
+            {
+                "field": "Owner",
+                "type": "multipleRecordLinks",
+                "sqlcolumn": "owner_id",
+                "sqltype": "VARCHAR",
+            },
+            {
+                "field": "Tags",
+                "type": "multipleSelects",
+                "sqlcolumn": "tags",
+                "sqltype": "TEXT[]",
+            },
+            {
+                "field": "Links",
+                "type": "multipleRecordLinks",
+                "sqlcolumn": "links_ids",
+                "sqltype": "TEXT[]",
+            },
+        ],
+    }
+
+
+@pytest.fixture
+def sample_records():
+    return [
+        {
+            "id": f"rec{i:05d}",
+            "createdTime": "2024-01-01T00:00:00.000Z",
+            "fields": {
+                "Name": f"Thing {i}",
+                "Done": "TRUE" if i % 2 else "FALSE",
+                "Owner": [f"recOwner{i}"],
+                "Tags": ["a", "b"],
+                "Links": [f"recL{i}", f"recM{i}"],
+            },
+        }
+        for i in range(250)
+    ]
+
+
+@pytest.fixture
+def fake_api(sample_schema, sample_records):
+    api = FakeApi()
+    api.add_table(sample_schema, sample_records)
+    return api
+
+
+@pytest.fixture
+def make_schemas_file(tmp_path):
+    """
+    Factory writing a list of schemas to tmp_path/schemas.json.
+    """
+
+    def _make_schemas_file(schemas: list[dict]) -> Path:
+        path = tmp_path / "schemas.json"
+        path.write_text(json.dumps(schemas))
+        return path
+
+    return _make_schemas_file
+
+
+@pytest.fixture
+def simulator():
+    server = AirtableSimulator(load_fixtures("tests/sample_bases"), rate_limit=0)
+    server.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def sim_api(simulator):
+    return Api("x", endpoint_url=simulator.url)
@@ -0,0 +1,95 @@
+import json
+
+import pytest
+
+from airtable_db_export import aio, at, main, utils
+from tests.conftest import BASE_ID
+
+pytest.importorskip("httpx")
+
+
+def test_list_records_body():
+    options = {
+        "view": "Grid view",
+        "formula": "{Done}",
+        "sort": ["-Name", "Score"],
+        "max_records": 10,
+        "fields": ["fldName"],
+        "use_field_ids": True,
+    }
+    assert aio.list_records_body(options) == {
+        "pageSize": 100,
+        "view": "Grid view",
+        "filterByFormula": "{Done}",
+        "maxRecords": 10,
+        "fields": ["fldName"],
+        "returnFieldsByFieldId": True,
+        "sort": [
+            {"field": "Name", "direction": "desc"},
+            {"field": "Score", "direction": "asc"},
+        ],
+    }
+
+
+def test_load_airtable_async_matches_sync(sim_api):
+    tconf = {"base": BASE_ID, "airtable": "Contacts", "sort": ["-Name"]}
+    schema = at.make_sql_schema(sim_api, tconf)
+
+    rows = at.load_airtable(sim_api, schema, engine="async")
+    assert rows == at.load_airtable(sim_api, schema)
+    assert len(rows) == 250
+
+
+def test_load_airtable_async_sharded(simulator, sim_api):
+    schema = at.make_sql_schema(sim_api, {"base": BASE_ID, "airtable": "Contacts"})
+    rows = at.load_airtable(sim_api, schema)
+    simulator.stats.clear()
+
+    sharded = at.load_airtable(sim_api, {**schema, "shards": 4}, engine="async")
+    assert sharded == rows
+    # one listing per shard
+    assert simulator.stats["records"] == 250
+    assert simulator.stats["requests"] >= 4
+
+
+def test_download_data_async(simulator, sim_api, tmp_path):
+    conf = {
+        "tables": [
+            {"base": BASE_ID, "airtable": "Contacts"},
+            {"base": BASE_ID, "airtable": "Companies"},
+        ]
+    }
+    schemas_file = tmp_path / "schemas.json"
+    at.make_schema_json(sim_api, conf, schemas_file, engine="async")
+    assert simulator.stats["requests"] == 1
+
+    main._download_data(
+        sim_api, schemas_file, tmp_path, [utils.NDJSONWriter], jobs=4, engine="async"
+    )
+    contacts = (tmp_path / "contacts.ndjson").read_text().splitlines()
+    assert len(contacts) == 250
+    assert json.loads(contacts[0])["id"] == "recContac00000000"
+    assert len((tmp_path / "companies.ndjson").read_text().splitlines()) == 2
+
+
+def test_pipeline_all_async_client_failure(
+    tmp_path, fake_api, sample_schema, make_schemas_file, monkeypatch
+):
+    def from_api(api_client, **kwargs):
+        raise ImportError("no httpx")
+
+    monkeypatch.setattr(aio.AsyncAirtable, "from_api", from_api)
+    # more tables than the pipeline lets wait, so a missed report would hang
+    schemas = [{**sample_schema, "sqltable": f"things{i}"} for i in range(4)]
+    schemas_file = make_schemas_file(schemas)
+
+    with pytest.raises(ImportError, match="no httpx"):
+        main._pipeline_all(
+            fake_api,
+            schemas_file,
+            tmp_path,
+            tmp_path,
+            tmp_path / "test.sqlite",
+            jobs=2,
+            engine="async",
+        )
@@ -91,3 +91,65 @@ def test_sql_col_and_types_lookups(load_field, col_config, fixture, field_name,
 
     sqlcol, sqltype, user_specified = at.get_sqlcol_and_type(col_map, lookup_field)
     assert result == [sqlcol, sqltype, user_specified]
+
+
+def test_iter_airtable_pages(fake_api, sample_schema):
+    pages = list(at.iter_airtable(fake_api, sample_schema))
+
+    assert [len(p) for p in pages] == [100, 100, 50]
+    first = pages[0][1]
+    assert first == {
+        "id": "rec00001",
+        "name": "Thing 1",
+        "done": True,
+        "owner_id": "recOwner1",
+        "tags": ["a", "b"],
+        "links_ids": ["recL1", "recM1"],
+    }
+
+
+def test_load_airtable_matches_iter(fake_api, sample_schema):
+    rows = at.load_airtable(fake_api, sample_schema)
+    pages = at.iter_airtable(fake_api, sample_schema)
+
+    assert rows == [row for page in pages for row in page]
+
+
+def test_iter_airtable_projects_fields(fake_api, sample_schema):
+    table = fake_api.table("app123", "Things")
+
+    list(at.iter_airtable(fake_api, sample_schema))
+    assert "fields" not in table.calls[-1]
+
+    sample_schema["all_columns"] = False
+    list(at.iter_airtable(fake_api, sample_schema))
+    assert table.calls[-1]["fields"] == ["Name", "Done", "Owner", "Tags", "Links"]
+
+
+def test_iter_airtable_row_options(fake_api, sample_schema):
+    table = fake_api.table("app123", "Things")
+    sample_schema.update(view="Active", filter="{Done}", sort=["-Name"], max_records=10)
+
+    list(at.iter_airtable(fake_api, sample_schema))
+    assert table.calls[-1] == {
+        "view": "Active",
+        "formula": "{Done}",
+        "sort": ["-Name"],
+        "max_records": 10,
+    }
+
+    # a formula option must match as well as the configured filter
+    list(at.iter_airtable(fake_api, sample_schema, formula="{Tags}"))
+    assert table.calls[-1]["formula"] == "AND({Done}, {Tags})"
+
+    list(at.iter_record_ids(fake_api, sample_schema))
+    assert table.calls[-1]["formula"] == "{Done}"
+
+
+@pytest.mark.parametrize("shards", [2, 3, 8])
+def test_shard_formulas_partition_record_ids(shards):
+    formulas = at.shard_formulas(shards)
+    chars = [f.split("'")[1] for f in formulas]
+
+    assert len(formulas) == shards
+    assert sorted("".join(chars)) == sorted(at.RECORD_ID_CHARS)
@@ -0,0 +1,378 @@
+import json
+import sqlite3
+from contextlib import closing
+
+import duckdb
+import pytest
+
+from airtable_db_export import at, db, main, utils
+
+
+def create_table(db_file, schema):
+    with db.dbconn(db_file) as conn:
+        conn.sql(db.make_table_create(schema))
+
+
+def test_sync_upserts_and_tracks_watermark(
+    tmp_path, fake_api, sample_schema, make_schemas_file
+):
+    db_file = tmp_path / "test.duckdb"
+    state_file = tmp_path / "state.json"
+    schemas_file = make_schemas_file([sample_schema])
+    create_table(db_file, sample_schema)
+    table = fake_api.table("app123", "Things")
+
+    main._sync(fake_api, schemas_file, tmp_path, db_file, state_file)
+    assert "formula" not in table.calls[-1]
+    watermark = json.loads(state_file.read_text())["things"]["watermark"]
+
+    # the second sync only asks for modified records and upserts them
+    table.records[0]["fields"]["Name"] = "Renamed"
+    main._sync(fake_api, schemas_file, tmp_path, db_file, state_file)
+    assert watermark in table.calls[-1]["formula"]
+
+    with duckdb.connect(db_file) as conn:
+        assert conn.sql("SELECT count(*) FROM things").fetchone() == (250,)
+        name = conn.sql("SELECT name FROM things WHERE id = 'rec00000'").fetchone()
+    assert name == ("Renamed",)
+    assert not list(tmp_path.glob("*.sync.json"))
+
+
+def test_delete_missing(tmp_path, fake_api, sample_schema, make_schemas_file):
+    db_file = tmp_path / "test.duckdb"
+    schemas_file = make_schemas_file([sample_schema])
+    create_table(db_file, sample_schema)
+    main._sync(fake_api, schemas_file, tmp_path, db_file, tmp_path / "state.json")
+
+    table = fake_api.table("app123", "Things")
+    del table.records[10:20]
+    main._delete_missing(fake_api, schemas_file, db_file)
+
+    assert table.calls[-1]["fields"] == ["Name"]
+    with duckdb.connect(db_file) as conn:
+        assert conn.sql("SELECT count(*) FROM things").fetchone() == (240,)
+        assert conn.sql(
+            "SELECT count(*) FROM things WHERE id = 'rec00010'"
+        ).fetchone() == (0,)
+
+
+@pytest.mark.parametrize("fmt", ["json", "ndjson", "parquet"])
+def test_load_db_formats(tmp_path, fake_api, sample_schema, fmt):
+    if fmt == "parquet":
+        pytest.importorskip("pyarrow")
+    db_file = tmp_path / "test.duckdb"
+    create_table(db_file, sample_schema)
+
+    writer_cls = utils.WRITERS[fmt]
+    with writer_cls(tmp_path / "things", sample_schema) as writer:
+        for page in at.iter_airtable(fake_api, sample_schema):
+            writer.write(page)
+
+    db.load_db(db_file, [sample_schema], tmp_path, fmt)
+
+    with duckdb.connect(db_file) as conn:
+        row = conn.sql(
+            "SELECT count(*), count_if(done), max(len(links_ids)) FROM things"
+        ).fetchone()
+    assert row == (250, 125, 2)
+
+
+@pytest.mark.parametrize("fmt", ["json", "ndjson"])
+def test_load_db_compressed(tmp_path, fake_api, sample_schema, fmt):
+    db_file = tmp_path / "test.duckdb"
+    create_table(db_file, sample_schema)
+
+    writer_cls = utils.WRITERS[fmt]
+    with writer_cls(tmp_path / "things", sample_schema, "gzip") as writer:
+        for page in at.iter_airtable(fake_api, sample_schema):
+            writer.write(page)
+    assert (tmp_path / f"things.{fmt}.gz").exists()
+
+    db.load_db(db_file, [sample_schema], tmp_path, fmt, compression="gzip")
+
+    with duckdb.connect(db_file) as conn:
+        assert conn.sql("SELECT count(*) FROM things").fetchone() == (250,)
+
+
+def test_load_db_uses_schema_columns(tmp_path, sample_schema):
+    """
+    Columns are matched by name and typed from the schema, even when the
+    file's key order differs and early rows are all null.
+    """
+    db_file = tmp_path / "test.duckdb"
+    create_table(db_file, sample_schema)
+    columns = [c["sqlcolumn"] for c in sample_schema["columns"]]
+    rows = [dict.fromkeys(reversed(columns)) | {"id": f"rec{i}"} for i in range(50)]
+    rows.append(rows[0] | {"id": "recLast", "tags": ["x"], "done": True})
+    (tmp_path / "things.json").write_text(json.dumps(rows))
+
+    sql = db.make_table_insert(sample_schema, tmp_path / "things.json")
+    assert "columns={" in sql
+
+    db.load_db(db_file, [sample_schema], tmp_path)
+
+    with duckdb.connect(db_file) as conn:
+        row = conn.sql("SELECT tags, done FROM things WHERE id = 'recLast'").fetchone()
+    assert row == (["x"], True)
+
+
+def test_load_direct(tmp_path, fake_api, sample_schema, make_schemas_file):
+    pytest.importorskip("pyarrow")
+    db_file = tmp_path / "test.duckdb"
+    schemas_file = make_schemas_file([sample_schema])
+    create_table(db_file, sample_schema)
+
+    main._load_direct(
+        fake_api, schemas_file, db_file, tmp_path, archive_classes=[utils.NDJSONWriter]
+    )
+
+    with duckdb.connect(db_file) as conn:
+        row = conn.sql("SELECT count(*), count_if(done) FROM things").fetchone()
+    assert row == (250, 125)
+    assert len((tmp_path / "things.ndjson").read_text().splitlines()) == 250
+    assert not (tmp_path / "things.json").exists()
+
+
+def write_rows(tmp_path, rows):
+    (tmp_path / "things.json").write_text(json.dumps(rows))
+
+
+def test_refresh_db_swaps_tables(tmp_path, sample_schema):
+    db_file = tmp_path / "test.duckdb"
+    create_table(db_file, sample_schema)
+    write_rows(tmp_path, [{"id": "rec1", "name": "old"}])
+    db.load_db(db_file, [sample_schema], tmp_path)
+
+    # a plain reload would fail on the primary key
+    write_rows(tmp_path, [{"id": "rec1", "name": "new"}, {"id": "rec2"}])
+    db.refresh_db(db_file, [sample_schema], tmp_path)
+
+    with duckdb.connect(db_file) as conn:
+        assert conn.sql("SELECT name FROM things ORDER BY id").fetchall() == [
+            ("new",),
+            (None,),
+        ]
+        tables = conn.sql("SELECT table_name FROM duckdb_tables()").fetchall()
+    assert tables == [("things",)]
+
+
+def test_refresh_db_failure_keeps_data(tmp_path, sample_schema):
+    db_file = tmp_path / "test.duckdb"
+    create_table(db_file, sample_schema)
+    write_rows(tmp_path, [{"id": "rec1", "name": "old"}])
+    db.load_db(db_file, [sample_schema], tmp_path)
+
+    # duplicate ids fail the staging load
+    write_rows(tmp_path, [{"id": "rec1"}, {"id": "rec1"}])
+    with pytest.raises(duckdb.ConstraintException):
+        db.refresh_db(db_file, [sample_schema], tmp_path)
+
+    with duckdb.connect(db_file) as conn:
+        assert conn.sql("SELECT name FROM things").fetchall() == [("old",)]
+        tables = conn.sql("SELECT table_name FROM duckdb_tables()").fetchall()
+    assert tables == [("things",)]
+
+
+def test_make_table_migration(sample_schema):
+    new = json.loads(json.dumps(sample_schema))
+    new["columns"][1]["sqlcolumn"] = "title"
+    new["columns"][2]["sqltype"] = "VARCHAR"
+    del new["columns"][3]
+    new["columns"].append(
+        {"field": "Score", "type": "number", "sqlcolumn": "score", "sqltype": "INTEGER"}
+    )
+
+    assert db.make_table_migration(sample_schema, new) == [
+        'ALTER TABLE things DROP COLUMN "owner_id";',
+        'ALTER TABLE things RENAME COLUMN "name" TO "title";',
+        'ALTER TABLE things ALTER COLUMN "done" TYPE VARCHAR;',
+        'ALTER TABLE things ADD COLUMN "score" INTEGER;',
+    ]
+
+
+def test_make_table_migration_field_ids(sample_schema):
+    old = json.loads(json.dumps(sample_schema))
+    for i, col in enumerate(old["columns"]):
+        col["field_id"] = col["field"] and f"fld{i}"
+    new = json.loads(json.dumps(old))
+    new["sqltable"] = "items"
+    new["columns"][1].update(field="Title", sqlcolumn="title")
+
+    assert db.make_table_migration(old, new) == [
+        "ALTER TABLE things RENAME TO items;",
+        'ALTER TABLE items RENAME COLUMN "name" TO "title";',
+    ]
+
+
+def test_match_schemas_same_airtable_table(sample_schema):
+    other = {**sample_schema, "sqltable": "others", "filter": "{Done}"}
+    renamed = {**sample_schema, "sqltable": "items"}
+
+    # two SQL tables from one Airtable table are matched by name
+    pairs = db.match_schemas([sample_schema, other], [sample_schema, other])
+    assert [(o["sqltable"], n["sqltable"]) for o, n in pairs] == [
+        ("things", "things"),
+        ("others", "others"),
+    ]
+    assert db.migrate_db("unused", [sample_schema, other], [sample_schema, other]) == []
+
+    # a rename is only inferred one-to-one
+    pairs = db.match_schemas([sample_schema, other], [renamed, other])
+    assert [(o["sqltable"], n["sqltable"]) for o, n in pairs] == [
+        ("others", "others"),
+        ("things", "items"),
+    ]
+    pairs = db.match_schemas(
+        [sample_schema, other], [renamed, {**other, "sqltable": "b"}]
+    )
+    assert [(o["sqltable"], n["sqltable"]) for o, n in pairs] == []
+
+
+def test_create_db_migrates(tmp_path, sample_schema, make_schemas_file):
+    db_file = tmp_path / "test.duckdb"
+    sql_dir = tmp_path / "sql"
+    sql_dir.mkdir()
+    schemas_file = make_schemas_file([sample_schema])
+
+    db.make_create_files([sample_schema], sql_dir)
+    main._create_db(schemas_file, db_file, sql_dir)
+    with duckdb.connect(db_file) as conn:
+        conn.sql("INSERT INTO things (id, name) VALUES ('rec1', 'One')")
+
+    sample_schema["columns"][1]["sqlcolumn"] = "title"
+    sample_schema["columns"].append(
+        {"field": "Score", "type": "number", "sqlcolumn": "score", "sqltype": "INTEGER"}
+    )
+    schemas_file.write_text(json.dumps([sample_schema]))
+    assert main._migrate_db(schemas_file, db_file, dry_run=True) == [
+        'ALTER TABLE things RENAME COLUMN "name" TO "title";',
+        'ALTER TABLE things ADD COLUMN "score" INTEGER;',
+    ]
+
+    db.make_create_files([sample_schema], sql_dir)
+    main._create_db(schemas_file, db_file, sql_dir)
+    with duckdb.connect(db_file) as conn:
+        assert conn.sql("SELECT id, title, score FROM things").fetchall() == [
+            ("rec1", "One", None)
+        ]
+
+    # nothing left to migrate
+    assert main._migrate_db(schemas_file, db_file) == []
+
+
+def test_pipeline_all(tmp_path, fake_api, sample_schema, capsys, make_schemas_file):
+    db_file = tmp_path / "test.duckdb"
+    sql_dir = tmp_path / "sql"
+    sql_dir.mkdir()
+    other = {**sample_schema, "sqltable": "others"}
+    schemas_file = make_schemas_file([sample_schema, other])
+    db.make_create_files([sample_schema, other], sql_dir)
+
+    manifest: dict = {}
+    main._pipeline_all(
+        fake_api, schemas_file, tmp_path, sql_dir, db_file, jobs=2, manifest=manifest
+    )
+    assert manifest["tables"]["things"]["rows"] == 250
+    with duckdb.connect(db_file) as conn:
+        assert conn.sql("SELECT count(*) FROM things").fetchone() == (250,)
+        assert conn.sql("SELECT count(*) FROM others").fetchone() == (250,)
+
+    # a refresh with unchanged data loads nothing
+    main._pipeline_all(
+        fake_api,
+        schemas_file,
+        tmp_path,
+        sql_dir,
+        db_file,
+        refresh=True,
+        manifest=manifest,
+    )
+    assert "Table things unchanged, skipping load" in capsys.readouterr().out
+
+
+def test_pipeline_all_download_failure(
+    tmp_path, fake_api, sample_schema, make_schemas_file
+):
+    db_file = tmp_path / "test.duckdb"
+    sql_dir = tmp_path / "sql"
+    sql_dir.mkdir()
+    missing = {**sample_schema, "airtable": "Missing", "sqltable": "missing"}
+    schemas_file = make_schemas_file([sample_schema, missing])
+    db.make_create_files([sample_schema, missing], sql_dir)
+
+    with pytest.raises(KeyError):
+        main._pipeline_all(
+            fake_api, schemas_file, tmp_path, sql_dir, db_file, refresh=True
+        )
+
+    with duckdb.connect(db_file) as conn:
+        tables = conn.sql("SELECT table_name FROM duckdb_tables()").fetchall()
+    assert ("things__adbe_staging",) not in tables
+
+
+def make_sqlite_db(tmp_path, schema):
+    db_file = tmp_path / "test.sqlite"
+    sql_dir = tmp_path / "sql"
+    sql_dir.mkdir(exist_ok=True)
+    db.make_create_files([schema], sql_dir)
+    db.bootstrap_db(db_file, [schema], sql_dir)
+    return db_file
+
+
+@pytest.mark.parametrize("fmt", ["json", "ndjson"])
+def test_sqlite_load_db(tmp_path, fake_api, sample_schema, fmt):
+    db_file = make_sqlite_db(tmp_path, sample_schema)
+    with utils.WRITERS[fmt](tmp_path / "things", sample_schema, "gzip") as writer:
+        for page in at.iter_airtable(fake_api, sample_schema):
+            writer.write(page)
+
+    db.load_db(db_file, [sample_schema], tmp_path, fmt, compression="gzip")
+
+    with closing(sqlite3.connect(db_file)) as conn:
+        row = conn.execute(
+            "SELECT count(*), sum(done), max(json_array_length(links_ids)) FROM things"
+        ).fetchone()
+        assert row == (250, 125, 2)
+        indexes = conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")
+        assert indexes.fetchall() == [("things_id_key",)]
+        assert conn.execute("PRAGMA journal_mode").fetchone() == ("delete",)
+    assert db.table_counts(db_file, ["things", "missing"]) == {
+        "things": 250,
+        "missing": None,
+    }
+
+
+def test_sqlite_refresh_upsert_and_delete(tmp_path, sample_schema):
+    db_file = make_sqlite_db(tmp_path, sample_schema)
+    write_rows(tmp_path, [{"id": "rec1", "name": "old"}])
+    db.load_db(db_file, [sample_schema], tmp_path)
+
+    # each refresh swaps in a staging table with its own id index
+    for name in ["new", "newer"]:
+        write_rows(tmp_path, [{"id": "rec1", "name": name}, {"id": "rec2"}])
+        db.refresh_db(db_file, [sample_schema], tmp_path)
+
+    # duplicate ids fail the staging load and leave the live table as is
+    write_rows(tmp_path, [{"id": "rec1"}, {"id": "rec1"}])
+    with pytest.raises(sqlite3.IntegrityError):
+        db.refresh_db(db_file, [sample_schema], tmp_path)
+
+    write_rows(tmp_path, [{"id": "rec2", "name": "upserted"}, {"id": "rec3"}])
+    db.upsert_table(db_file, sample_schema, tmp_path / "things.json")
+    assert db.delete_missing(db_file, sample_schema, ["rec2", "rec3"]) == 1
+
+    with closing(sqlite3.connect(db_file)) as conn:
+        rows = conn.execute("SELECT id, name FROM things ORDER BY id").fetchall()
+        tables = conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table'"
+        ).fetchall()
+    assert rows == [("rec2", "upserted"), ("rec3", None)]
+    assert tables == [("things",)]
+
+
+def test_sqlite_load_direct(tmp_path, fake_api, sample_schema):
+    db_file = make_sqlite_db(tmp_path, sample_schema)
+    with db.dbconn(db_file) as conn:
+        pages = at.iter_airtable(fake_api, sample_schema)
+        assert db.load_table_pages(conn, sample_schema, pages) == 250
+        assert db.table_count(conn, "things") == 250
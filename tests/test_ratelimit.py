@@ -0,0 +1,156 @@
+import json
+
+import pytest
+import requests
+from requests.adapters import HTTPAdapter
+
+from airtable_db_export import main, ratelimit, utils
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def test_bucket_spaces_requests(clock):
+    bucket = ratelimit.TokenBucket(5.0, clock=clock, sleep=clock.sleep)
+    for _ in range(11):
+        bucket.acquire()
+
+    # one token up front, then one every 1/5 second
+    assert clock.now == pytest.approx(2.0)
+
+
+def test_bucket_penalize_and_recover(clock):
+    bucket = ratelimit.TokenBucket(5.0, increase=0.5, clock=clock, sleep=clock.sleep)
+    bucket.acquire()
+    bucket.penalize(retry_after=30)
+    assert bucket.rate == 2.5
+
+    bucket.acquire()
+    assert clock.now >= 30
+
+    for _ in range(10):
+        bucket.reward()
+    assert bucket.rate == 5.0
+
+
+def test_limiter_buckets_per_base():
+    limiter = ratelimit.RateLimiter()
+    assert limiter.bucket("app1") is limiter.bucket("app1")
+    assert limiter.bucket("app1") is not limiter.bucket("app2")
+
+
+@pytest.mark.parametrize(
+    "url,base_id",
+    [
+        ("https://api.airtable.com/v0/appABC123/Table", "appABC123"),
+        ("https://api.airtable.com/v0/meta/bases/appABC123/tables", "appABC123"),
+        ("https://api.airtable.com/v0/meta/bases", None),
+    ],
+)
+def test_base_id_for_url(url, base_id):
+    assert ratelimit.base_id_for_url(url) == base_id
+
+
+def make_response(status: int, headers: dict | None = None) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers or {})
+    return response
+
+
+@pytest.fixture
+def adapter(monkeypatch, clock):
+    limiter = ratelimit.RateLimiter(clock=clock, sleep=clock.sleep)
+    adapter = ratelimit.RateLimitedAdapter(limiter, max_attempts=3)
+    adapter.responses = []
+
+    def fake_send(self, request, **kwargs):
+        return adapter.responses.pop(0)
+
+    monkeypatch.setattr(HTTPAdapter, "send", fake_send)
+    return adapter
+
+
+def prepared(url: str = "https://api.airtable.com/v0/appABC123/Table"):
+    return requests.Request("GET", url).prepare()
+
+
+def test_adapter_retries_after_429(adapter, clock):
+    adapter.responses = [make_response(429, {"Retry-After": "2"}), make_response(200)]
+
+    response = adapter.send(prepared())
+
+    assert response.status_code == 200
+    assert adapter.responses == []
+    assert clock.now >= 2
+    assert adapter.limiter.bucket("appABC123").rate < ratelimit.AIRTABLE_RATE_LIMIT
+
+
+def test_adapter_gives_up_after_max_attempts(adapter, clock):
+    adapter.responses = [make_response(429, {"Retry-After": "1"}) for _ in range(3)]
+
+    response = adapter.send(prepared())
+
+    assert response.status_code == 429
+    assert adapter.responses == []
+    # no pause after the final attempt
+    assert adapter.limiter.bucket("appABC123").paused_until <= clock.now + 1
+
+
+@pytest.mark.parametrize(
+    "value,expected",
+    [
+        (None, ratelimit.AIRTABLE_RETRY_AFTER),
+        ("5", 5.0),
+        ("garbage", ratelimit.AIRTABLE_RETRY_AFTER),
+        ("Wed, 21 Oct 2015 07:28:00 GMT", 0.0),
+    ],
+)
+def test_parse_retry_after(value, expected):
+    assert ratelimit.parse_retry_after(value) == expected
+
+
+def test_rate_limit_reuses_mounted_limiter(fake_api):
+    limiter = ratelimit.rate_limit(fake_api)
+    assert ratelimit.rate_limit(fake_api) is limiter
+
+
+def test_download_data_jobs(
+    tmp_path, fake_api, sample_schema, sample_records, make_schemas_file
+):
+    other = {**sample_schema, "airtable": "Others", "sqltable": "others"}
+    fake_api.add_table(other, sample_records[:10])
+    schemas_file = make_schemas_file([sample_schema, other])
+
+    main._download_data(fake_api, schemas_file, tmp_path, [utils.JSONWriter], jobs=2)
+
+    assert len(json.loads((tmp_path / "things.json").read_text())) == 250
+    assert len(json.loads((tmp_path / "others.json").read_text())) == 10
+
+
+def test_download_data_jobs_failure(
+    tmp_path, fake_api, sample_schema, make_schemas_file
+):
+    broken = {**sample_schema, "airtable": "Missing", "sqltable": "missing"}
+    schemas_file = make_schemas_file([broken, sample_schema])
+
+    with pytest.raises(KeyError):
+        main._download_data(
+            fake_api, schemas_file, tmp_path, [utils.JSONWriter], jobs=2
+        )
+
+    assert not (tmp_path / "missing.json").exists()
+    assert not list(tmp_path.glob("*.tmp"))
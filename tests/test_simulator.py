@@ -0,0 +1,364 @@
+import json
+
+import pytest
+import requests
+from click.testing import CliRunner
+
+from airtable_db_export import at, main, utils
+from airtable_db_export.main import cli
+from tests.conftest import BASE_ID
+
+
+def test_list_records_pages(simulator, sim_api):
+    table = sim_api.table(BASE_ID, "Contacts")
+    pages = list(table.iterate(page_size=100))
+
+    assert [len(p) for p in pages] == [100, 100, 50]
+    assert len({r["id"] for p in pages for r in p}) == 250
+    assert simulator.stats["records"] == 250
+
+
+def test_list_records_options(sim_api):
+    table = sim_api.table(BASE_ID, "Contacts")
+
+    records = table.all(fields=["Name"], max_records=5)
+    assert len(records) == 5
+    assert all(list(r["fields"]) == ["Name"] for r in records)
+
+    records = table.all(fields=["fldName0000000001"], use_field_ids=True)
+    assert list(records[0]["fields"]) == ["fldName0000000001"]
+
+    # long formulas make pyairtable fall back to POST listRecords
+    records = table.all(
+        formula=at.modified_since_formula("2024-01-01T02:00:00Z") + " " * 20_000
+    )
+    assert len(records) == 250 - 121
+
+
+def test_modified_since_formula(sim_api):
+    table = sim_api.table(BASE_ID, "Companies")
+    records = table.all(formula=at.modified_since_formula("2024-03-01T00:00:00Z"))
+    assert [r["fields"]["Name"] for r in records] == ["Acme"]
+
+
+def test_schema(sim_api):
+    schema = at.make_sql_schema(sim_api, {"base": BASE_ID, "airtable": "Contacts"})
+    columns = [c["sqlcolumn"] for c in schema["columns"]]
+
+    assert schema["primary_field"] == "Name"
+    assert columns == [
+        "id",
+        "name",
+        "email",
+        "notes",
+        "active",
+        "score",
+        "last_seen",
+        "status",
+        "tags",
+        "company_id",
+    ]
+
+
+def test_rate_limited(simulator, sim_api):
+    simulator.rate_limit = 1
+    simulator.retry_after = 7
+
+    session = requests.Session()
+    url = f"{simulator.url}/v0/{BASE_ID}/Contacts"
+    assert session.get(url).status_code == 200
+    response = session.get(url)
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "7"
+    assert simulator.stats["rate_limited"] == 1
+
+
+@pytest.fixture
+def sim_config(simulator, tmp_path, monkeypatch):
+    monkeypatch.setenv("AIRTABLE_ENDPOINT_URL", simulator.url)
+    config = tmp_path / "config.yml"
+    config.write_text(
+        json.dumps(
+            {
+                "base_dir": str(tmp_path),
+                "tables": [
+                    {"base": BASE_ID, "airtable": "Contacts"},
+                    {"base": BASE_ID, "airtable": "Companies"},
+                ],
+            }
+        )
+    )
+    return config
+
+
+def test_cli_all(sim_config, tmp_path):
+    """
+    The full pipeline against the simulator.
+    """
+    result = CliRunner().invoke(cli, ["-c", str(sim_config), "all", "-j", "2"])
+    assert result.exit_code == 0, result.output
+
+    import duckdb
+
+    conn = duckdb.connect(str(tmp_path / "airtable.duckdb"))
+    assert conn.sql("SELECT count(*) FROM contacts").fetchone() == (250,)
+    assert conn.sql("SELECT count(*) FROM companies").fetchone() == (2,)
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        ["--direct", "--refresh"],
+        ["--direct", "--resumable"],
+        ["--engine", "async", "--resumable"],
+    ],
+)
+def test_cli_all_rejects_options_early(simulator, sim_config, tmp_path, options):
+    result = CliRunner().invoke(cli, ["-c", str(sim_config), "all", *options])
+    assert result.exit_code == 2
+    assert "cannot be used with" in result.output
+    # nothing fetched or written
+    assert simulator.stats["requests"] == 0
+    assert not (tmp_path / "schemas.json").exists()
+
+
+def test_cli_all_gzip_skips_unchanged(sim_config, tmp_path):
+    args = ["-c", str(sim_config), "all", "--compression", "gzip"]
+    result = CliRunner().invoke(cli, args)
+    assert result.exit_code == 0, result.output
+
+    # the same data compresses to the same file, so nothing is loaded twice
+    result = CliRunner().invoke(cli, args)
+    assert result.exit_code == 0, result.output
+    assert "Table contacts unchanged, skipping load" in result.output
+    assert "Table companies unchanged, skipping load" in result.output
+
+
+def test_cli_all_skips_unchanged(simulator, sim_config, tmp_path):
+    args = ["-c", str(sim_config), "all", "--refresh"]
+    result = CliRunner().invoke(cli, args)
+    assert result.exit_code == 0, result.output
+    assert "skipping" not in result.output
+
+    result = CliRunner().invoke(cli, args)
+    assert result.exit_code == 0, result.output
+    assert "Schema mappings unchanged, skipping CREATE DDL" in result.output
+    assert "Table contacts unchanged, skipping load" in result.output
+    assert "Table companies unchanged, skipping load" in result.output
+
+    simulator.find_table(BASE_ID, "Companies")["records"].pop()
+    result = CliRunner().invoke(cli, args)
+    assert result.exit_code == 0, result.output
+    assert "Table contacts unchanged, skipping load" in result.output
+    assert "Table companies unchanged" not in result.output
+
+    import duckdb
+
+    with duckdb.connect(str(tmp_path / "airtable.duckdb")) as conn:
+        assert conn.sql("SELECT count(*) FROM companies").fetchone() == (1,)
+        conn.sql("DELETE FROM contacts")
+
+    # the table was emptied behind the manifest's back
+    result = CliRunner().invoke(cli, args)
+    assert "Table contacts unchanged" not in result.output
+
+    result = CliRunner().invoke(cli, args + ["--force"])
+    assert "skipping" not in result.output
+
+
+def test_schema_json_fetches_each_base_once(simulator, sim_api, tmp_path):
+    conf = {
+        "tables": [
+            {"base": BASE_ID, "airtable": "Contacts"},
+            {"base": BASE_ID, "airtable": "Companies"},
+        ]
+    }
+    path = tmp_path / "schemas.json"
+    cache_file = tmp_path / "schema_cache.json"
+
+    at.make_schema_json(sim_api, conf, path, cache_file, ttl=60)
+    assert simulator.stats["requests"] == 1
+    assert [s["sqltable"] for s in json.loads(path.read_text())] == [
+        "contacts",
+        "companies",
+    ]
+
+    # fresh cache: no metadata requests, and the unchanged file is left alone
+    mtime = path.stat().st_mtime_ns
+    at.make_schema_json(sim_api, conf, path, cache_file, ttl=60)
+    assert simulator.stats["requests"] == 1
+    assert path.stat().st_mtime_ns == mtime
+
+    # expired cache
+    at.make_schema_json(sim_api, conf, path, cache_file, ttl=0)
+    assert simulator.stats["requests"] == 2
+
+
+@pytest.fixture
+def two_bases(simulator):
+    other = json.loads(json.dumps(simulator.bases[BASE_ID]))
+    other["id"] = "appSimulated00002"
+    simulator.bases[other["id"]] = other
+    return simulator
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_archive_schemas(two_bases, sim_api, tmp_path, jobs):
+    path = tmp_path / "reference_schemas.json"
+    at.archive_schemas(sim_api, path, jobs=jobs)
+
+    expected = {
+        base.id: base.schema().model_dump() for base in sim_api.bases(force=True)
+    }
+    if jobs == 1:
+        assert path.read_text() == json.dumps(expected, indent=2)
+    assert json.loads(path.read_text()) == expected
+    assert not (tmp_path / "reference_schemas.json.tmp").exists()
+
+
+def test_archive_schemas_per_base(two_bases, sim_api, tmp_path):
+    out_dir = tmp_path / "reference_schemas"
+    at.archive_schemas(sim_api, out_dir, jobs=2, per_base=True, max_age=60)
+    assert sorted(p.name for p in out_dir.iterdir()) == [
+        "appSimulated00001.json",
+        "appSimulated00002.json",
+        "index.json",
+    ]
+    fetched = two_bases.stats["requests"]
+
+    # recently fetched bases are skipped
+    at.archive_schemas(sim_api, out_dir, per_base=True, max_age=60)
+    assert two_bases.stats["requests"] == fetched
+
+    # unchanged schemas are not rewritten
+    mtime = (out_dir / "appSimulated00001.json").stat().st_mtime_ns
+    two_bases.bases["appSimulated00002"]["tables"].pop()
+    at.archive_schemas(sim_api, out_dir, per_base=True, max_age=0)
+    assert (out_dir / "appSimulated00001.json").stat().st_mtime_ns == mtime
+    changed = json.loads((out_dir / "appSimulated00002.json").read_text())
+    assert [table["name"] for table in changed["tables"]] == ["Contacts"]
+
+
+def test_iter_airtable_by_field_id(simulator, sim_api):
+    tconf = {
+        "base": BASE_ID,
+        "airtable": "Contacts",
+        "all_columns": False,
+        "use_field_ids": True,
+        "columns": {"Email": "email"},
+    }
+    schema = at.make_sql_schema(sim_api, tconf)
+    assert at.projection_options(schema) == {
+        "use_field_ids": True,
+        "fields": ["fldName0000000001", "fldEmail000000001"],
+    }
+
+    rows = [row for page in at.iter_airtable(sim_api, schema) for row in page]
+    assert len(rows) == 250
+    assert rows[3] == {
+        "id": "recContac00000003",
+        "name": "Name 3",
+        "email": "user3@example.com",
+    }
+
+
+def test_make_sql_schema_row_options(sim_api):
+    tconf = {
+        "base": BASE_ID,
+        "airtable": "Contacts",
+        "sort": ["-Name"],
+        "max_records": 3,
+    }
+    schema = at.make_sql_schema(sim_api, tconf)
+    assert at.row_options(schema) == {"sort": ["-Name"], "max_records": 3}
+
+    rows = [row for page in at.iter_airtable(sim_api, schema) for row in page]
+    assert [row["name"] for row in rows] == ["Name 99", "Name 98", "Name 97"]
+
+
+def test_iter_airtable_sharded(simulator, sim_api):
+    schema = at.make_sql_schema(sim_api, {"base": BASE_ID, "airtable": "Contacts"})
+    rows = [row for page in at.iter_airtable(sim_api, schema) for row in page]
+
+    pages = at.iter_airtable(sim_api, {**schema, "shards": 4})
+    sharded = [row for page in pages for row in page]
+    assert sharded == rows
+    # one listing per shard, each paged separately
+    assert simulator.stats["records"] == 2 * 250
+
+
+@pytest.fixture
+def sim_schemas_file(sim_api, tmp_path):
+    conf = {
+        "tables": [
+            {"base": BASE_ID, "airtable": "Companies"},
+            {"base": BASE_ID, "airtable": "Contacts"},
+        ]
+    }
+    schemas_file = tmp_path / "schemas.json"
+    at.make_schema_json(sim_api, conf, schemas_file)
+    return schemas_file
+
+
+def test_download_resumes(
+    simulator, sim_api, sim_schemas_file, tmp_path, monkeypatch, capsys
+):
+    spool_dir = tmp_path / ".spool"
+    iter_offsets = at.iter_airtable_offsets
+
+    def fail_after_two_pages(*args, **kwargs):
+        for i, page in enumerate(iter_offsets(*args, **kwargs)):
+            if i == 2:
+                raise requests.ConnectionError("network blip")
+            yield page
+
+    monkeypatch.setattr(at, "iter_airtable_offsets", fail_after_two_pages)
+    with pytest.raises(requests.ConnectionError):
+        main._download_data(
+            sim_api,
+            sim_schemas_file,
+            tmp_path,
+            [utils.NDJSONWriter],
+            spool_dir=spool_dir,
+        )
+    assert json.loads((spool_dir / "run.json").read_text()) == {
+        "finished": ["companies"]
+    }
+    assert not (tmp_path / "contacts.ndjson").exists()
+
+    assert len((tmp_path / "companies.ndjson").read_text().splitlines()) == 2
+
+    monkeypatch.setattr(at, "iter_airtable_offsets", iter_offsets)
+    simulator.stats.clear()
+    capsys.readouterr()
+    main._download_data(
+        sim_api, sim_schemas_file, tmp_path, [utils.NDJSONWriter], spool_dir=spool_dir
+    )
+
+    # companies is skipped, and only the last page of contacts is fetched again
+    out = capsys.readouterr().out
+    assert "Table companies already downloaded in this run, skipping" in out
+    assert simulator.stats["records"] == 50
+    assert len((tmp_path / "companies.ndjson").read_text().splitlines()) == 2
+    lines = (tmp_path / "contacts.ndjson").read_text().splitlines()
+    assert [json.loads(line)["id"] for line in lines] == [
+        f"recContac{i:08d}" for i in range(250)
+    ]
+    assert list(spool_dir.iterdir()) == []
+
+
+def test_download_expired_offset(simulator, sim_api, sim_schemas_file, tmp_path):
+    schema = utils.load_schemas(sim_schemas_file)[1]
+    spool = utils.PageSpool(tmp_path / ".spool" / "contacts")
+    spool.add([{"id": "recStale"}], "itrExpired")
+    spool.close()
+
+    main._download_table(
+        sim_api, schema, tmp_path, [utils.NDJSONWriter], spool_dir=tmp_path / ".spool"
+    )
+
+    lines = (tmp_path / "contacts.ndjson").read_text().splitlines()
+    assert len(lines) == 250
+    assert "recStale" not in lines[0]
+    assert not (tmp_path / ".spool" / "contacts").exists()
@@ -1,4 +1,8 @@
+import csv
+import json
+
 import pytest
+from airtable_db_export import utils
 from airtable_db_export.utils import load_config
 
 
@@ -14,3 +18,178 @@ def test_load_config(test_config_file):
         "column_filters",
     ]:
         assert k in config.keys()
+
+
+ROWS_SCHEMA = {
+    "columns": [
+        {"sqlcolumn": "id", "sqltype": "VARCHAR"},
+        {"sqlcolumn": "name", "sqltype": "VARCHAR"},
+        {"sqlcolumn": "count", "sqltype": "INTEGER"},
+        {"sqlcolumn": "tags", "sqltype": "TEXT[]"},
+    ]
+}
+
+ROWS = [
+    {"id": "rec1", "name": "One", "count": 1, "tags": ["a", "b"]},
+    {"id": "rec2", "name": "Two", "count": 2, "tags": []},
+]
+
+
+@pytest.mark.parametrize("rows", [ROWS, []])
+def test_json_writer_matches_json_dump(tmp_path, rows):
+    path = tmp_path / "table"
+    with utils.JSONWriter(path, serializer="json") as writer:
+        for row in rows:
+            writer.write([row])
+
+    with open(f"{path}.json") as f:
+        assert f.read() == json.dumps(rows, indent=2)
+
+
+def test_ndjson_writer(tmp_path):
+    path = tmp_path / "table"
+    utils.save_table_ndjson(ROWS, str(path))
+
+    with open(f"{path}.ndjson") as f:
+        assert [json.loads(line) for line in f] == ROWS
+
+
+@pytest.mark.parametrize("serializer", utils.SERIALIZERS)
+def test_serializers(tmp_path, serializer):
+    pytest.importorskip(serializer)
+    rows = ROWS + [{"id": "rec3", "name": "Drei \u00fc", "count": 2.5, "tags": None}]
+    dumps = utils.get_serializer(serializer)
+    assert dumps(rows) == json.dumps(rows, separators=(",", ":"), ensure_ascii=False)
+    assert dumps(rows, indent=True) == json.dumps(rows, indent=2, ensure_ascii=False)
+
+    with utils.NDJSONWriter(tmp_path / "table", serializer=serializer) as writer:
+        writer.write(rows[:1])
+        writer.write([])
+        writer.write(rows[1:])
+    # UTF-8 whatever the locale
+    lines = (tmp_path / "table.ndjson").read_bytes().decode("utf-8").splitlines()
+    assert lines[0] == '{"id":"rec1","name":"One","count":1,"tags":["a","b"]}'
+    assert [json.loads(line) for line in lines] == rows
+    assert writer.rows_written == 3
+
+    with utils.JSONWriter(tmp_path / "table", serializer=serializer) as writer:
+        writer.write(rows[:1])
+        writer.write([])
+        writer.write(rows[1:])
+    assert json.loads((tmp_path / "table.json").read_text()) == rows
+
+
+def test_csv_writer_pages(tmp_path):
+    path = tmp_path / "table"
+    with utils.CSVWriter(path) as writer:
+        writer.write(ROWS[:1])
+        writer.write(ROWS[1:])
+
+    with open(f"{path}.csv") as f:
+        rows = list(csv.DictReader(f))
+    assert [r["id"] for r in rows] == ["rec1", "rec2"]
+
+
+def test_csv_writer_empty(tmp_path):
+    path = tmp_path / "table"
+    utils.save_table_csv([], str(path))
+
+    assert (tmp_path / "table.csv").read_text() == ""
+
+
+@pytest.mark.parametrize("writer_cls", list(utils.WRITERS.values()))
+def test_writer_error_keeps_previous_file(tmp_path, writer_cls):
+    path = tmp_path / f"table{writer_cls.extension}"
+    path.write_text("previous")
+
+    with pytest.raises(RuntimeError):
+        with writer_cls(tmp_path / "table", ROWS_SCHEMA) as writer:
+            writer.write(ROWS[:1])
+            raise RuntimeError("network error")
+
+    assert path.read_text() == "previous"
+    assert not (tmp_path / f"table{writer_cls.extension}.tmp").exists()
+
+
+@pytest.mark.parametrize("compression", ["gzip", "zstd"])
+@pytest.mark.parametrize("writer_cls", [utils.JSONWriter, utils.NDJSONWriter])
+def test_writer_compression(tmp_path, writer_cls, compression):
+    if compression == "zstd":
+        pytest.importorskip("zstandard")
+    rows = [{"id": f"rec{i}", "name": f"Row {i}"} for i in range(100)]
+    with writer_cls(tmp_path / "things", compression=compression) as writer:
+        writer.write(rows)
+
+    path = utils.data_file(tmp_path, "things", writer_cls.extension[1:], compression)
+    assert writer.path == path
+    assert path.endswith(utils.COMPRESSIONS[compression])
+    with utils.open_compressed(path, "rt", compression) as f:
+        text = f.read()
+    if writer_cls is utils.NDJSONWriter:
+        assert [json.loads(line) for line in text.splitlines()] == rows
+    else:
+        assert json.loads(text) == rows
+
+
+def test_fan_out_writer(tmp_path):
+    path = tmp_path / "table"
+    with utils.FanOutWriter(path, [utils.JSONWriter, utils.CSVWriter]) as writer:
+        writer.write(ROWS[:1])
+        writer.write(ROWS[1:])
+
+    assert json.loads((tmp_path / "table.json").read_text()) == ROWS
+    with open(tmp_path / "table.csv") as f:
+        assert len(list(csv.DictReader(f))) == 2
+
+
+def test_fan_out_writer_failure_publishes_nothing(tmp_path):
+    class BrokenWriter(utils.NDJSONWriter):
+        def write(self, rows):
+            raise OSError("disk full")
+
+    path = tmp_path / "table"
+    with pytest.raises(OSError):
+        with utils.FanOutWriter(path, [utils.JSONWriter, BrokenWriter]) as writer:
+            writer.write(ROWS)
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_arrow_table_timestamps():
+    pa = pytest.importorskip("pyarrow")
+    schema = {"columns": [{"sqlcolumn": "at", "sqltype": "TIMESTAMP"}]}
+    arrow_schema = utils.arrow_schema(schema)
+
+    table = utils.arrow_table(
+        [{"at": "2024-01-01T05:00:00.000Z"}, {"at": None}], arrow_schema
+    )
+
+    assert table.schema.field("at").type == pa.timestamp("ms")
+    assert str(table.column("at")[0]) == "2024-01-01 05:00:00"
+
+
+def test_arrow_table_rejects_lossy_values():
+    pytest.importorskip("pyarrow")
+    schema = {"columns": [{"sqlcolumn": "count", "sqltype": "INTEGER"}]}
+    arrow_schema = utils.arrow_schema(schema)
+
+    table = utils.arrow_table([{"count": 1}, {"count": 2.0}], arrow_schema)
+    assert table.column("count").to_pylist() == [1, 2]
+
+    with pytest.raises(ValueError, match="Column count"):
+        utils.arrow_table([{"count": 1}, {"count": 2.7}], arrow_schema)
+
+
+def test_arrow_table_json_encodes_objects_in_strings():
+    pytest.importorskip("pyarrow")
+    schema = {"columns": [{"sqlcolumn": "owner", "sqltype": "VARCHAR"}]}
+    arrow_schema = utils.arrow_schema(schema)
+
+    rows = [{"owner": {"id": "usr1", "name": "Ann"}}, {"owner": ["a"]}, {}]
+    table = utils.arrow_table(rows, arrow_schema)
+    values = table.column("owner").to_pylist()
+    assert [json.loads(v) if v else v for v in values] == [
+        {"id": "usr1", "name": "Ann"},
+        ["a"],
+        None,
+    ]